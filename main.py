@@ -1,9 +1,180 @@
-from cadetrdm import process_example, Options
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from cadetrdm import process_example, Options, ProjectRepo
+from cadetrdm.logging import OutputLog
+from cadetrdm.tools.process_example import remove_non_jupytext_files
+from cadetrdm.wrapper import tracks_results
+
+
+def set_output_environment(repo: ProjectRepo) -> None:
+    """
+    Pass the output directories of this and the previous run to the notebooks.
+
+    cadet-rdm creates every output branch from the output main branch, so the results
+    of earlier runs are not in the working tree. The last output branch is taken from
+    the log of the main branch and copied into the cadet-rdm cache, where
+    `ResultStore` looks up which chunks are unchanged.
+    """
+    os.environ["SMB_OUTPUT_DIRECTORY"] = str(repo.output_path)
+    os.environ.pop("SMB_PREVIOUS_OUTPUT", None)
+
+    main_cache = repo.copy_data_to_cache(repo.output_repo.main_branch)
+    branches = list(OutputLog(main_cache / "log.tsv").entries)
+    if branches:
+        os.environ["SMB_PREVIOUS_OUTPUT"] = str(repo.input_data(branches[-1]))
+
+
+def copy_resources(source_directory: Path, output_directory: Path) -> None:
+    """
+    Copy the resource directories of the source tree, e.g. `figures`.
+
+    The serial `process_example` copies the complete source tree, such that relative
+    paths like `./figures/*.jpg` in the notebooks resolve in the output. Python
+    packages and hidden or cache directories are skipped.
+    """
+    for path in source_directory.iterdir():
+        if (
+            not path.is_dir()
+            or path.name.startswith((".", "__"))
+            or (path / "__init__.py").exists()
+        ):
+            continue
+        shutil.copytree(path, output_directory / path.name, dirs_exist_ok=True)
+
+
+def run_notebook(
+    source_file: Path,
+    source_directory: Path,
+    output_directory: Path,
+    n_threads: Optional[int] = None,
+) -> dict:
+    """
+    Execute a jupytext notebook in its own process and capture its output.
+
+    The executed notebook, stdout, stderr and the phase profile are written to
+    `output_directory`, which is also the working directory of the notebook. The
+    resources of the source tree are copied there first. If given, `n_threads`
+    limits the number of cores the CADET simulations of the notebook use.
+    """
+    output_directory.mkdir(parents=True, exist_ok=True)
+    copy_resources(source_directory, output_directory)
+
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(source_directory), env.get("PYTHONPATH")])
+    )
+    env["SMB_PROFILE_DIRECTORY"] = str(output_directory / "profiles")
+    if n_threads is not None:
+        env["SMB_N_THREADS"] = str(n_threads)
+
+    command = [
+        sys.executable,
+        "-m",
+        "jupytext",
+        "--output",
+        str(output_directory / f"{source_file.stem}.ipynb"),
+        "--execute",
+        "--run-path",
+        str(output_directory),
+        str(source_file),
+    ]
+
+    start = time.perf_counter()
+    with open(output_directory / "stdout.txt", "w") as stdout, open(
+        output_directory / "stderr.txt", "w"
+    ) as stderr:
+        return_code = subprocess.run(
+            command, stdout=stdout, stderr=stderr, env=env
+        ).returncode
+
+    return {
+        "notebook": source_file.name,
+        "status": "ok" if return_code == 0 else "failed",
+        "return_code": return_code,
+        "wall_time": time.perf_counter() - start,
+    }
+
+
+@tracks_results
+def process_example_serial(repo: ProjectRepo, options: Options) -> None:
+    """Execute all notebooks one after another with `process_example` of cadet-rdm."""
+    set_output_environment(repo)
+    process_example.__wrapped__(repo, options)
+
+
+@tracks_results
+def process_example_parallel(repo: ProjectRepo, options: Options) -> list[dict]:
+    """
+    Execute all notebooks of the source directory concurrently.
+
+    Every notebook runs in a separate process and writes to its own subdirectory
+    of the output. The cores are divided among the notebooks. A failing notebook
+    does not stop the others; the results of all notebooks are committed to the
+    output repository together.
+    """
+    set_output_environment(repo)
+    source_directory = repo.path / options.source_directory
+    output_directory = repo.output_path / options.source_directory
+
+    source_files = remove_non_jupytext_files(sorted(source_directory.glob("*.py")))
+    if not source_files:
+        raise FileNotFoundError(f"No jupytext notebooks found in {source_directory}.")
+    n_threads = max((os.cpu_count() or 1) // len(source_files), 1)
+
+    with ThreadPoolExecutor(max_workers=len(source_files)) as executor:
+        summary = list(
+            executor.map(
+                lambda file: run_notebook(
+                    file, source_directory, output_directory / file.stem, n_threads
+                ),
+                source_files,
+            )
+        )
+
+    with open(output_directory / "run_summary.json", "w") as file:
+        json.dump(summary, file, indent=2)
+
+    for result in summary:
+        print(
+            f"{result['status']:>6} {result['wall_time']:8.1f} s  {result['notebook']}"
+        )
+
+    return summary
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Execute the notebooks concurrently, each in its own process.",
+    )
+    args, _ = parser.parse_known_args()
+
+    # Phase profiles of the notebooks are stored next to the results.
+    os.environ.setdefault(
+        "SMB_PROFILE_DIRECTORY",
+        str(Path(__file__).resolve().parent / "output" / "profiles"),
+    )
+
     options = Options()
     options.commit_message = "Run large optimizations"
     options.debug = False
     options.push = False
     options.source_directory = "src"
-    process_example(options)
+
+    if args.parallel:
+        _, summary = process_example_parallel(options)
+        if any(result["status"] != "ok" for result in summary):
+            sys.exit(1)
+    else:
+        process_example_serial(options)
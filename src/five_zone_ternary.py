@@ -37,6 +37,11 @@
 
 # %% [markdown]
 # ## Setup
+# As in the four-zone case study, a `PhaseProfiler` records the wall time, CPU time and peak memory of every following cell of this notebook.
+
+# %%
+from smb_tools import PhaseProfiler
+profiler = PhaseProfiler("five_zone_ternary").track_cells()
 
 # %%
 import numpy as np
@@ -156,12 +161,16 @@ process = builder.build_process()
 
 # %% [markdown]
 # ### Process
+# As in the four-zone case study, `CachedCadet` loads the results from disk if the same simulation was run before.
+# CADET is called through its command line interface (`use_dll = False`), since only this interface returns the solver statistics that are recorded in the profile of this notebook.
+# CADET evaluates the residual and Jacobian of the columns in parallel with `nthreads` threads. `default_n_threads` uses all cores, or the share assigned by `main.py` when the notebooks run in parallel. The number of threads does not change the results or the cache key.
 
 # %%
-from CADETProcess.simulator import Cadet
-process_simulator = Cadet()
+from smb_tools import CachedCadet, default_n_threads
+process_simulator = CachedCadet()
+process_simulator.solver_parameters.nthreads = default_n_threads()
 process_simulator.n_cycles = 41 
-process_simulator.use_dll = True
+process_simulator.use_dll = False
 process_simulator.time_integrator_parameters.abstol = 1e-10
 process_simulator.time_integrator_parameters.reltol = 1e-6  
 process_simulator.time_integrator_parameters.init_step_size = 1e-14
@@ -190,26 +199,17 @@ ext_2 = np.multiply(ext2_mM, molar_mass) * 1e-3
 # %% [markdown]
 # ### Concentrations at the outlet ports
 #
-# To compare the simulation results to those of Mun ([Fig. 11 a, b, c](https://www.sciencedirect.com/science/article/pii/S002196731101363X?via%3Dihub#fig0055)), the concentration of every component is averaged over one switching period. This results in a new average every 324s. As there are 5 columns that switch a total of 41 times, this results in 205 total average concentrations for every component. Dividing the total simulation time by the switch time yields the same number of 205 steps for `n_averages`. The averaging is done for the **raffinate**, **extract 1** and **extract 2** ports.
+# To compare the simulation results to those of Mun ([Fig. 11 a, b, c](https://www.sciencedirect.com/science/article/pii/S002196731101363X?via%3Dihub#fig0055)), the concentration of every component is averaged over one switching period. This results in a new average every 324s. As there are 5 columns that switch a total of 41 times, this results in 205 total average concentrations for every component. Dividing the total simulation time by the switch time yields the same number of 205 steps for `n_averages`. The averages are computed with `period_statistics` from `smb_tools`, which integrates the outlet concentrations over each switching period using the time points of the solution, independent of the output resolution. The averaging is done for the **raffinate**, **extract 1** and **extract 2** ports.
 
 # %%
-n_averages = int(len(raff) // builder.switch_time)  
-
-raff_average = (
-    raff[: int(n_averages * builder.switch_time)]
-    .reshape(n_averages, int(builder.switch_time), raff.shape[1])
-    .mean(axis=1)
-)
-ext1_average = (
-    ext_1[: int(n_averages * builder.switch_time)]
-    .reshape(n_averages, int(builder.switch_time), raff.shape[1])
-    .mean(axis=1)
-)
-ext2_average = (
-    ext_2[: int(n_averages * builder.switch_time)]
-    .reshape(n_averages, int(builder.switch_time), raff.shape[1])
-    .mean(axis=1)
-)
+from smb_tools import period_statistics
+
+statistics = period_statistics(simulation_results, builder)
+n_averages = statistics.n_periods
+
+raff_average = np.multiply(statistics.mean["raffinate"], molar_mass) * 1e-3
+ext1_average = np.multiply(statistics.mean["extract_1"], molar_mass) * 1e-3
+ext2_average = np.multiply(statistics.mean["extract_2"], molar_mass) * 1e-3
 
 # %%
 import matplotlib.pyplot as plt
@@ -249,6 +249,8 @@ plt.show()
 # %%
 # Axial concentrations
 from CADETProcess.modelBuilder.carouselBuilder import CarouselSolutionBulk
+from smb_tools import axial_snapshots
+
 axial_conc = CarouselSolutionBulk(builder, simulation_results)
 
 plotting_time = [200.01*builder.switch_time, 200.99*builder.switch_time,] 
@@ -256,15 +258,9 @@ n_cols = axial_conc.builder.n_columns
 x = axial_conc.axial_coordinates
 
 # Conversion of axial concentration plot from mM to g/L
-for t in plotting_time:
-    t_i = np.where(t <= axial_conc.time)[0][0]
-    
-    y_min_data = 0
-    y_max_data = 0
-    zone_counter = 0
-    column_counter = 0
-    _lines = []
-    
+snapshots = axial_snapshots(axial_conc, plotting_time, scale=np.multiply(molar_mass, 1e-3))
+
+for t, snapshot in zip(plotting_time, snapshots):
     fig, axs = plt.subplots(
     ncols=n_cols,
     figsize=(n_cols*4, 6),
@@ -272,22 +268,39 @@ for t in plotting_time:
     sharey='row')
 
     for position, ax in enumerate(axs):
-        col_index = axial_conc.builder.column_indices_at_time(t, position) 
-        y_data = axial_conc.solution[f'column_{col_index}'].bulk.solution[t_i, :]
-        y = np.multiply(y_data, molar_mass) * 1e-3
-        y_min_data = min(y_min_data, min(0, np.min(y)))
-        y_max_data = max(y_max_data, 1.1*np.max(y))
+        y = snapshot[position]
         if position == 0:
             ax.set_ylabel("c [g/L]")
         if position == 2:
             ax.set_xlabel(f'axial coordinates at {t/builder.switch_time} steps')
-        l = ax.plot(x, y)
-      
-        _lines.append(l)
-    
-        zone = axial_conc.builder.zones[zone_counter]
+        ax.plot(x, y)
+
+        zone = axial_conc.builder.zones[position]
         ax.set_title(f'{zone.name}')
         plt.tight_layout()
-        
-        zone_counter += 1
-        column_counter = 0
+
+# %% [markdown]
+# ### Storage
+# The outlet profiles and bulk concentrations are written to a `ResultStore` in the output directory as float32, compressed chunks, which are tracked with Git LFS. LFS stores every chunk only once, so chunks that did not change since the previous run add no data to the output repository. When run through `main.py`, the report counts these new chunks against the output of the previous run. `store.read("five_zone_ternary")` returns the arrays.
+
+# %%
+from smb_tools import ResultStore, previous_store_directory, save_simulation_results
+store = ResultStore("results", previous_store_directory("results"))
+report = save_simulation_results(store, "five_zone_ternary", simulation_results, builder)
+print(f"{report.stored_bytes / 1e6:.1f} MB stored, {report.new_bytes / 1e6:.1f} MB new")
+
+# %% [markdown]
+# ### Consistency
+# The benchmarks, sweeps and optimizations of `smb_tools` build this process with the factory `five_zone_ternary`. `check_case_study` raises an error if the process of this notebook differs from it.
+
+# %%
+from smb_tools import check_case_study
+check_case_study(process, "five_zone_ternary")
+
+# %% [markdown]
+# ### Profile
+
+# %%
+profiler.record_simulation(simulation_results, process_simulator)
+profiler.write()
+print(profiler.summary())
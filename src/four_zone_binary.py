@@ -42,6 +42,11 @@
 
 # %% [markdown]
 # ## Setup
+# The `PhaseProfiler` from `smb_tools` records the wall time, CPU time and peak memory of every following cell of this notebook. The profile and the solver statistics of the simulation are written to the output repository at the end of the notebook.
+
+# %%
+from smb_tools import PhaseProfiler
+profiler = PhaseProfiler("four_zone_binary").track_cells()
 
 # %%
 import numpy as np
@@ -157,12 +162,16 @@ process = builder.build_process()
 # %% [markdown]
 # ### Process
 # The SMB process is simulated for 13 `cycles`. During this period, the **column switching** will have been performed 104 times and every column will have been at every possible position within the four zones 12 times. The `time integrator parameters` are set according to [4. Case Studies, He et al.](https://www.sciencedirect.com/science/article/pii/S0098135417304520#sec0020), with the relative tolerance `reltol` set to a sensible value.
+# The `CachedCadet` simulator from `smb_tools` stores the results on disk, keyed by a hash of the complete simulation configuration. If neither the process nor the simulator settings change, the results are loaded instead of re-running the simulation.
+# CADET is called through its command line interface (`use_dll = False`), since only this interface returns the solver statistics that are recorded in the profile of this notebook.
+# CADET evaluates the residual and Jacobian of the columns in parallel with `nthreads` threads. `default_n_threads` uses all cores, or the share assigned by `main.py` when the notebooks run in parallel. The number of threads does not change the results or the cache key.
 
 # %%
-from CADETProcess.simulator import Cadet
-process_simulator = Cadet()
+from smb_tools import CachedCadet, default_n_threads
+process_simulator = CachedCadet()
+process_simulator.solver_parameters.nthreads = default_n_threads()
 process_simulator.n_cycles = 13
-process_simulator.use_dll = True
+process_simulator.use_dll = False
 
 process_simulator.time_integrator_parameters.abstol = 1e-10
 process_simulator.time_integrator_parameters.reltol = 1e-6 
@@ -236,3 +245,29 @@ from CADETProcess.modelBuilder.carouselBuilder import CarouselSolutionBulk
 axial_conc = CarouselSolutionBulk(builder, simulation_results)
 axial_conc.plot_at_time(t = 104 * builder.switch_time - 1)
 axial_conc.plot_at_time(t = 104 * builder.switch_time)
+
+# %% [markdown]
+# ### Storage
+# The outlet profiles and bulk concentrations are written to a `ResultStore` in the output directory as float32, compressed chunks, which are tracked with Git LFS. LFS stores every chunk only once, so chunks that did not change since the previous run add no data to the output repository. When run through `main.py`, the report counts these new chunks against the output of the previous run. `store.read("four_zone_binary")` returns the arrays.
+
+# %%
+from smb_tools import ResultStore, previous_store_directory, save_simulation_results
+store = ResultStore("results", previous_store_directory("results"))
+report = save_simulation_results(store, "four_zone_binary", simulation_results, builder)
+print(f"{report.stored_bytes / 1e6:.1f} MB stored, {report.new_bytes / 1e6:.1f} MB new")
+
+# %% [markdown]
+# ### Consistency
+# The benchmarks, sweeps and optimizations of `smb_tools` build this process with the factory `four_zone_binary`. `check_case_study` raises an error if the process of this notebook differs from it.
+
+# %%
+from smb_tools import check_case_study
+check_case_study(process, "four_zone_binary")
+
+# %% [markdown]
+# ### Profile
+
+# %%
+profiler.record_simulation(simulation_results, process_simulator)
+profiler.write()
+print(profiler.summary())
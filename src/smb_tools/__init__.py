@@ -0,0 +1,230 @@
+"""
+Tools for simulating the carousel (SMB) case studies of this repository.
+
+The modules build on the `CarouselBuilder` and `Cadet` simulator of CADET-Process
+and are imported by the case study notebooks in `src`.
+"""
+
+from .carousel import ZoneLayout, position_zones, zone_layouts
+from .cache import CachedCadet, config_hash, default_cache_directory
+from .case_studies import (
+    CASE_STUDIES,
+    PRODUCT_TARGETS,
+    SPLIT_FRACTIONS,
+    check_case_study,
+    create_simulator,
+    default_n_threads,
+    five_zone_ternary,
+    four_zone_binary,
+)
+from .convergence import (
+    ConvergenceLevel,
+    ConvergenceStudy,
+    evaluate_level,
+    grid_convergence,
+    richardson_extrapolation,
+)
+from .checkpoint import (
+    Checkpoint,
+    CheckpointStore,
+    carousel_topology,
+    operating_point,
+    topology_key,
+)
+from .lazy_results import LazyArray, LazyResults, LazySolution, save_results
+from .ensemble import (
+    EnsembleStatistics,
+    EnsembleSummary,
+    UncertainParameter,
+    apply_parameters,
+    default_uncertainties,
+    evaluate_member,
+    run_ensemble,
+    sample_parameters,
+)
+from .kpi import carousel_kpis, feed_mass_flow, integrate_window, outlet_flow_rates
+from .multifidelity import (
+    MultiFidelityReport,
+    coarse_copy,
+    compare_results,
+    simulate_multifidelity,
+)
+from .optimizer import (
+    CarouselOptimizer,
+    Evaluation,
+    OptimizationResult,
+    evaluate_candidate,
+)
+from .periods import PeriodStatistics, period_integrals, period_statistics
+from .profiling import PhaseProfiler, default_profile_directory
+from .diagnostics import peak_rss, solver_statistics
+from .recording import RecordedResults, RecordingPolicy, simulate_recorded
+from .single_column import SingleColumnResults, SingleColumnSolver
+from .snapshots import axial_snapshots, bulk_snapshots, position_column_map
+from .stationarity import (
+    CSSReport,
+    boundary_state_differences,
+    period_differences,
+    simulate_to_css,
+    switch_period_profiles,
+)
+from .surrogate import (
+    PODSurrogate,
+    SurrogatePrediction,
+    collect_snapshots,
+    css_snapshot,
+    evaluate_snapshot,
+    training_design,
+)
+from .sweep import (
+    SweepSummary,
+    evaluate_point,
+    load_sweep,
+    parameter_grid,
+    run_sweep,
+)
+from .triangle import (
+    complete_separation,
+    feasible_points,
+    flow_rate_ratios,
+    henry_coefficients,
+    prune_points,
+    zone_flow_rates,
+)
+from .sensitivity import (
+    add_binding_sensitivities,
+    add_column_sensitivity,
+    kpi_gradients,
+    operating_kpi_gradients,
+    period_kpi_gradients,
+)
+from .stepper import CarouselStepper, SwitchPeriod, perturbed_plant
+from .storage import (
+    ResultStore,
+    WriteReport,
+    previous_store_directory,
+    save_simulation_results,
+    simulation_arrays,
+)
+from .tmb import TMBResults, solve_tmb, tmb_flow_rates
+from .valves import build_process_without_valves, valve_residence_times
+from .state import (
+    column_blocks,
+    interpolate_state,
+    remap_carousel_state,
+    split_state,
+    join_state,
+    unit_state_sizes,
+)
+
+__all__ = [
+    "CachedCadet",
+    "config_hash",
+    "default_cache_directory",
+    "CASE_STUDIES",
+    "PRODUCT_TARGETS",
+    "SPLIT_FRACTIONS",
+    "check_case_study",
+    "default_n_threads",
+    "create_simulator",
+    "five_zone_ternary",
+    "four_zone_binary",
+    "ZoneLayout",
+    "position_zones",
+    "zone_layouts",
+    "ConvergenceLevel",
+    "ConvergenceStudy",
+    "evaluate_level",
+    "grid_convergence",
+    "richardson_extrapolation",
+    "Checkpoint",
+    "CheckpointStore",
+    "carousel_topology",
+    "operating_point",
+    "topology_key",
+    "LazyArray",
+    "LazyResults",
+    "LazySolution",
+    "save_results",
+    "carousel_kpis",
+    "feed_mass_flow",
+    "integrate_window",
+    "outlet_flow_rates",
+    "MultiFidelityReport",
+    "coarse_copy",
+    "compare_results",
+    "simulate_multifidelity",
+    "PeriodStatistics",
+    "period_integrals",
+    "period_statistics",
+    "PhaseProfiler",
+    "default_profile_directory",
+    "solver_statistics",
+    "peak_rss",
+    "RecordedResults",
+    "RecordingPolicy",
+    "simulate_recorded",
+    "SingleColumnResults",
+    "SingleColumnSolver",
+    "axial_snapshots",
+    "bulk_snapshots",
+    "position_column_map",
+    "CSSReport",
+    "boundary_state_differences",
+    "period_differences",
+    "simulate_to_css",
+    "switch_period_profiles",
+    "SweepSummary",
+    "evaluate_point",
+    "load_sweep",
+    "parameter_grid",
+    "run_sweep",
+    "complete_separation",
+    "feasible_points",
+    "flow_rate_ratios",
+    "henry_coefficients",
+    "prune_points",
+    "zone_flow_rates",
+    "TMBResults",
+    "solve_tmb",
+    "tmb_flow_rates",
+    "build_process_without_valves",
+    "valve_residence_times",
+    "SwitchPeriod",
+    "CarouselStepper",
+    "perturbed_plant",
+    "add_column_sensitivity",
+    "add_binding_sensitivities",
+    "kpi_gradients",
+    "period_kpi_gradients",
+    "operating_kpi_gradients",
+    "UncertainParameter",
+    "default_uncertainties",
+    "sample_parameters",
+    "apply_parameters",
+    "evaluate_member",
+    "EnsembleStatistics",
+    "EnsembleSummary",
+    "run_ensemble",
+    "training_design",
+    "css_snapshot",
+    "evaluate_snapshot",
+    "collect_snapshots",
+    "SurrogatePrediction",
+    "PODSurrogate",
+    "evaluate_candidate",
+    "Evaluation",
+    "OptimizationResult",
+    "CarouselOptimizer",
+    "WriteReport",
+    "ResultStore",
+    "previous_store_directory",
+    "simulation_arrays",
+    "save_simulation_results",
+    "column_blocks",
+    "interpolate_state",
+    "remap_carousel_state",
+    "split_state",
+    "join_state",
+    "unit_state_sizes",
+]
@@ -0,0 +1,818 @@
+"""
+Benchmarks of the carousel case studies.
+
+Every benchmark simulates one of the case studies with a given discretization and
+set of time integrator settings in a fresh worker process and records the wall
+time, the solver statistics reported by CADET, the peak resident set size and the
+size of the simulation output. Records are appended to a JSON lines history, such
+that runs with different versions of CADET, CADET-Process or this repository can be
+compared. Settings are varied one at a time around a baseline configuration.
+
+Run from the `src` directory:
+
+    python -m smb_tools.benchmark run --profile quick
+    python -m smb_tools.benchmark baseline
+    python -m smb_tools.benchmark compare
+    python -m smb_tools.benchmark valves
+    python -m smb_tools.benchmark threads --plot benchmarks/thread_scaling.png
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, fields, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import matplotlib.pyplot as plt
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.log import get_logger
+from CADETProcess.processModel import Process
+from CADETProcess.simulationResults import SimulationResults
+from CADETProcess.simulator import Cadet
+
+from .case_studies import CASE_STUDIES, create_simulator
+from .diagnostics import peak_rss, solver_statistics
+from .stationarity import switch_period_profiles
+from .valves import valve_residence_times
+
+__all__ = [
+    "BenchmarkConfig",
+    "PROFILES",
+    "profile_configs",
+    "run_benchmark",
+    "run_profile",
+    "load_history",
+    "compare_records",
+    "DeadVolumeReport",
+    "dead_volume_report",
+    "ThreadScaling",
+    "thread_scaling",
+    "main",
+]
+
+logger = get_logger("Benchmark")
+
+DEFAULT_HISTORY = Path("benchmarks") / "history.jsonl"
+"""Path: Default history file, relative to the working directory."""
+
+DEFAULT_BASELINE = Path("benchmarks") / "baseline.jsonl"
+"""Path: Default baseline file, relative to the working directory."""
+
+COMPARED_METRICS = ("wall_time", "peak_rss", "output_bytes")
+"""tuple[str]: Metrics that are checked for regressions besides solver statistics."""
+
+
+@dataclass(frozen=True)
+class BenchmarkConfig:
+    """
+    Configuration of a single benchmark.
+
+    Attributes
+    ----------
+    case : str
+        Name of the case study in `CASE_STUDIES`.
+    ncol : int
+        Number of axial cells.
+    npar : int or None
+        Number of particle cells. Only used by models with pores.
+    abstol : float
+        Absolute tolerance of the time integrator.
+    reltol : float
+        Relative tolerance of the time integrator.
+    max_step_size : float
+        Maximum step size of the time integrator.
+    use_dll : bool
+        If True, CADET is called through its shared library.
+    n_cycles : int
+        Number of simulated cycles.
+    eliminate_valves : bool
+        If True, the valve units are eliminated, see
+        `build_process_without_valves`.
+    n_threads : int
+        Number of CADET threads for the residual and Jacobian evaluation.
+    """
+
+    case: str = "four_zone_binary"
+    ncol: int = 40
+    npar: Optional[int] = 1
+    abstol: float = 1e-10
+    reltol: float = 1e-6
+    max_step_size: float = 5e6
+    use_dll: bool = True
+    n_cycles: int = 13
+    eliminate_valves: bool = False
+    n_threads: int = 1
+
+    @property
+    def key(self) -> str:
+        """
+        str: Unique name of the configuration.
+
+        Only fields that differ from their defaults are part of the key, sorted by
+        name. New options therefore do not change the keys of stored records.
+        """
+        values = sorted(
+            f"{f.name}={getattr(self, f.name)}"
+            for f in fields(self)[1:]
+            if getattr(self, f.name) != f.default
+        )
+        return "/".join([self.case, *values])
+
+
+PROFILES = {
+    "quick": {
+        "baselines": [BenchmarkConfig("four_zone_binary", n_cycles=1)],
+        "variations": {
+            "ncol": [80],
+            "use_dll": [False],
+            "eliminate_valves": [True],
+        },
+    },
+    "full": {
+        "baselines": [
+            BenchmarkConfig("four_zone_binary"),
+            BenchmarkConfig("five_zone_ternary", npar=None),
+        ],
+        "variations": {
+            "ncol": [40, 80, 160],
+            "npar": [1, 2, 4],
+            "tolerances": [(1e-10, 1e-6), (1e-8, 1e-5), (1e-12, 1e-8)],
+            "max_step_size": [5e6, 1e2],
+            "use_dll": [True, False],
+            "n_cycles": [4, 13],
+            "eliminate_valves": [False, True],
+        },
+    },
+    # The command line interface returns the solver statistics, such that the
+    # thread scaling runs need no additional runs to count them.
+    "threads": {
+        "baselines": [
+            BenchmarkConfig("four_zone_binary", use_dll=False, n_cycles=4),
+            BenchmarkConfig("five_zone_ternary", npar=None, use_dll=False, n_cycles=4),
+        ],
+        "variations": {
+            "n_threads": [2, 4, 8, 16],
+        },
+    },
+}
+"""dict: Baseline configurations and one-at-a-time variations of every profile."""
+
+
+def profile_configs(profile: str | dict) -> list[BenchmarkConfig]:
+    """
+    Return the configurations of a benchmark profile.
+
+    Every setting is varied separately around each baseline configuration.
+    Particle discretizations are only varied for baselines that use `npar`.
+
+    Parameters
+    ----------
+    profile : str or dict
+        Name of a profile in `PROFILES` or a dict with the same structure.
+
+    Returns
+    -------
+    list[BenchmarkConfig]
+        Unique configurations in the order of the profile.
+    """
+    if isinstance(profile, str):
+        try:
+            profile = PROFILES[profile]
+        except KeyError:
+            raise CADETProcessError(f"Unknown benchmark profile {profile}.")
+
+    configs = []
+    for baseline in profile["baselines"]:
+        configs.append(baseline)
+        for name, values in profile["variations"].items():
+            for value in values:
+                if name == "tolerances":
+                    config = replace(baseline, abstol=value[0], reltol=value[1])
+                elif name == "npar" and baseline.npar is None:
+                    continue
+                else:
+                    config = replace(baseline, **{name: value})
+                configs.append(config)
+
+    return list(dict.fromkeys(configs))
+
+
+class _BenchmarkCadet(Cadet):
+    """Simulator that requests solver statistics and keeps the CADET instance."""
+
+    def get_process_config(self, process: Process) -> Any:
+        config = super().get_process_config(process)
+        config.input["return"].write_solver_statistics = 1
+
+        return config
+
+    def _run(
+        self,
+        process: Process,
+        cadet: Any = None,
+        file_path: Optional[os.PathLike] = None,
+    ) -> SimulationResults:
+        if cadet is None:
+            cadet = self.get_new_cadet_instance()
+        self.last_cadet = cadet
+
+        return super()._run(process, cadet=cadet, file_path=file_path)
+
+
+def _output_bytes(cadet: Any) -> int:
+    """Return the size of all arrays of the simulation output in bytes."""
+    size = 0
+    for value in cadet.root.output.solution.values():
+        if hasattr(value, "items"):
+            size += sum(np.asarray(v).nbytes for v in value.values())
+        else:
+            size += np.asarray(value).nbytes
+
+    return size
+
+
+def _simulate(
+    config: BenchmarkConfig,
+    timeout: Optional[float] = None,
+) -> tuple[SimulationResults, _BenchmarkCadet, float]:
+    """Simulate a configuration and return results, simulator and wall time."""
+    factory = CASE_STUDIES[config.case]
+    discretization = {"ncol": config.ncol}
+    if config.npar is not None:
+        discretization["npar"] = config.npar
+    process, _ = factory(**discretization, eliminate_valves=config.eliminate_valves)
+
+    process_simulator = create_simulator(
+        n_cycles=config.n_cycles,
+        abstol=config.abstol,
+        reltol=config.reltol,
+        max_step_size=config.max_step_size,
+        use_dll=config.use_dll,
+        timeout=timeout,
+        n_threads=config.n_threads,
+        simulator_class=_BenchmarkCadet,
+    )
+
+    start = time.perf_counter()
+    simulation_results = process_simulator.simulate(process)
+    wall_time = time.perf_counter() - start
+
+    return simulation_results, process_simulator, wall_time
+
+
+def _statistics_fields(
+    config: BenchmarkConfig,
+    process_simulator: _BenchmarkCadet,
+    timeout: Optional[float] = None,
+) -> dict:
+    """
+    Return the solver statistics of a simulation as fields of a benchmark record.
+
+    The DLL interface does not return the solver statistics. For DLL
+    configurations, they are counted in an additional, untimed simulation with the
+    command line interface. If they are still missing, the error is recorded
+    instead, such that the remaining metrics of the benchmark are kept.
+    """
+    try:
+        return {"statistics": solver_statistics(process_simulator.last_cadet)}
+    except CADETProcessError as e:
+        error = e
+
+    if config.use_dll:
+        try:
+            _, cli_simulator, _ = _simulate(replace(config, use_dll=False), timeout)
+            return {
+                "statistics": solver_statistics(cli_simulator.last_cadet),
+                "statistics_source": "cli",
+            }
+        except Exception as e:
+            error = e
+
+    return {"statistics": {}, "statistics_error": str(error)}
+
+
+def run_benchmark(config: BenchmarkConfig, timeout: Optional[float] = None) -> dict:
+    """
+    Simulate one benchmark configuration in the current process.
+
+    Parameters
+    ----------
+    config : BenchmarkConfig
+        Configuration of the benchmark.
+    timeout : float, optional
+        Maximum run time of the simulation in s.
+
+    Returns
+    -------
+    dict
+        Wall time (s), peak RSS (MiB), output size (bytes) and solver statistics.
+        If the statistics are missing, 'statistics' is empty and
+        'statistics_error' holds the reason.
+    """
+    simulation_results, process_simulator, wall_time = _simulate(config, timeout)
+
+    record = {
+        "wall_time": wall_time,
+        "time_sim": float(simulation_results.time_elapsed),
+        "peak_rss": peak_rss(),
+        "output_bytes": _output_bytes(process_simulator.last_cadet),
+    }
+    record.update(_statistics_fields(config, process_simulator, timeout))
+
+    return record
+
+
+@dataclass
+class DeadVolumeReport:
+    """
+    Effect of eliminating the valve units on outlet profiles and solver effort.
+
+    Attributes
+    ----------
+    config : BenchmarkConfig
+        Configuration with valve units.
+    residence_times : dict[str, float]
+        Residence time of every valve unit in s.
+    n_switches : int
+        Number of simulated switch periods.
+    wall_time : dict[str, float]
+        Wall time with ('valves') and without valve units ('eliminated') in s.
+    statistics : dict[str, dict[str, float]]
+        Solver statistics with and without valve units.
+    profile_errors : dict[str, float]
+        Relative L2 difference of the outlet profiles of the last cycle.
+    statistics_errors : dict[str, str]
+        Reason why the solver statistics of a variant are missing.
+    """
+
+    config: BenchmarkConfig
+    residence_times: dict[str, float]
+    n_switches: int
+    wall_time: dict[str, float]
+    statistics: dict[str, dict[str, float]]
+    profile_errors: dict[str, float]
+    statistics_errors: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def ratios(self) -> dict[str, float]:
+        """dict[str, float]: Statistics without over with valve units."""
+        valves = self.statistics["valves"]
+        eliminated = self.statistics["eliminated"]
+        ratios = {"wall_time": self.wall_time["eliminated"] / self.wall_time["valves"]}
+        for name, value in valves.items():
+            if name in eliminated and value != 0:
+                ratios[name] = eliminated[name] / value
+
+        return ratios
+
+    def summary(self) -> str:
+        """Return step counts, times and profile differences as a text table."""
+        lines = [
+            f"{self.config.key}",
+            f"max. valve residence time: {max(self.residence_times.values()):.3g} s",
+            f"{'metric':<40}{'valves':>14}{'eliminated':>14}{'ratio':>8}",
+        ]
+        rows = {"wall_time": (self.wall_time["valves"], self.wall_time["eliminated"])}
+        for name, value in self.statistics["valves"].items():
+            if name in self.statistics["eliminated"]:
+                rows[name] = (value, self.statistics["eliminated"][name])
+        ratios = self.ratios
+        for name, (valves, eliminated) in rows.items():
+            lines.append(
+                f"{name:<40}{valves:>14.4g}{eliminated:>14.4g}"
+                f"{ratios.get(name, np.nan):>8.2f}"
+            )
+            if "step" in name.lower():
+                lines.append(
+                    f"{'  per switch':<40}{valves / self.n_switches:>14.4g}"
+                    f"{eliminated / self.n_switches:>14.4g}"
+                )
+        for outlet, error in self.profile_errors.items():
+            lines.append(f"profile difference {outlet}: {error:.2e}")
+        for name, error in self.statistics_errors.items():
+            lines.append(f"no solver statistics ({name}): {error}")
+
+        return "\n".join(lines)
+
+
+def dead_volume_report(
+    config: BenchmarkConfig = BenchmarkConfig(),
+    timeout: Optional[float] = None,
+) -> DeadVolumeReport:
+    """
+    Simulate a configuration with and without valve units and compare the results.
+
+    Parameters
+    ----------
+    config : BenchmarkConfig, optional
+        Configuration of the benchmark. `eliminate_valves` is ignored, and the
+        command line interface is used since only it returns the solver statistics.
+    timeout : float, optional
+        Maximum run time of a single simulation in s.
+
+    Returns
+    -------
+    DeadVolumeReport
+        Solver statistics and the difference of the outlet profiles.
+    """
+    config = replace(config, eliminate_valves=False, use_dll=False)
+    _, builder = CASE_STUDIES[config.case](ncol=config.ncol)
+
+    wall_time = {}
+    statistics = {}
+    statistics_errors = {}
+    profiles = {}
+    for name, variant in (
+        ("valves", config),
+        ("eliminated", replace(config, eliminate_valves=True)),
+    ):
+        simulation_results, process_simulator, wall_time[name] = _simulate(
+            variant, timeout
+        )
+        try:
+            statistics[name] = solver_statistics(process_simulator.last_cadet)
+        except CADETProcessError as e:
+            statistics[name] = {}
+            statistics_errors[name] = str(e)
+        profiles[name] = switch_period_profiles(simulation_results, builder)
+
+    profile_errors = {}
+    for outlet, profile in profiles["valves"].items():
+        reference = profile[-builder.n_columns :].ravel()
+        difference = profiles["eliminated"][outlet][-builder.n_columns :].ravel()
+        norm = max(np.linalg.norm(reference), np.finfo(float).tiny)
+        profile_errors[outlet] = float(np.linalg.norm(difference - reference) / norm)
+
+    return DeadVolumeReport(
+        config=config,
+        residence_times=valve_residence_times(builder),
+        n_switches=config.n_cycles * builder.n_columns,
+        wall_time=wall_time,
+        statistics=statistics,
+        profile_errors=profile_errors,
+        statistics_errors=statistics_errors,
+    )
+
+
+@dataclass
+class ThreadScaling:
+    """
+    Wall time of a configuration over the number of CADET threads.
+
+    Attributes
+    ----------
+    config : BenchmarkConfig
+        Single-threaded configuration.
+    n_threads : list[int]
+        Numbers of threads, in ascending order.
+    wall_time : list[float]
+        Wall time for every number of threads in s.
+    """
+
+    config: BenchmarkConfig
+    n_threads: list[int]
+    wall_time: list[float]
+
+    @property
+    def speedup(self) -> np.ndarray:
+        """np.ndarray: Wall time of the first entry over the wall times."""
+        wall_time = np.asarray(self.wall_time)
+        return wall_time[0] / wall_time
+
+    @property
+    def efficiency(self) -> np.ndarray:
+        """np.ndarray: Speedup per thread relative to the first entry."""
+        return self.speedup * self.n_threads[0] / np.asarray(self.n_threads)
+
+    def summary(self) -> str:
+        """Return wall time, speedup and parallel efficiency as a text table."""
+        lines = [
+            f"{self.config.key}",
+            f"{'threads':>8}{'wall time [s]':>16}{'speedup':>10}{'efficiency':>12}",
+        ]
+        for n_threads, wall_time, speedup, efficiency in zip(
+            self.n_threads, self.wall_time, self.speedup, self.efficiency
+        ):
+            lines.append(
+                f"{n_threads:>8}{wall_time:>16.2f}{speedup:>10.2f}{efficiency:>12.0%}"
+            )
+
+        return "\n".join(lines)
+
+    def plot(self, ax: Optional[plt.Axes] = None) -> plt.Axes:
+        """Plot the speedup over the number of threads with the ideal speedup."""
+        if ax is None:
+            fig, ax = plt.subplots()
+
+        n_threads = np.asarray(self.n_threads)
+        ax.loglog(n_threads, self.speedup, marker="o", label=self.config.case)
+        ax.loglog(n_threads, n_threads / n_threads[0], color="k", linestyle="dashed")
+
+        ax.set_xlabel("Threads")
+        ax.set_ylabel("Speedup")
+        ax.legend()
+
+        return ax
+
+
+def thread_scaling(records: Sequence[dict]) -> list[ThreadScaling]:
+    """
+    Group benchmark records into scaling curves over the number of threads.
+
+    Records that only differ in `n_threads` form one curve. Failed records and
+    configurations with a single number of threads are skipped.
+
+    Parameters
+    ----------
+    records : Sequence[dict]
+        Benchmark records, e.g. of the 'threads' profile.
+
+    Returns
+    -------
+    list[ThreadScaling]
+        Scaling curve of every configuration, in the order of the records.
+    """
+    curves = {}
+    for record in records:
+        if record["status"] != "ok":
+            continue
+        config = BenchmarkConfig(**record["config"])
+        n_threads = config.n_threads
+        points = curves.setdefault(replace(config, n_threads=1), {})
+        points[n_threads] = record["wall_time"]
+
+    return [
+        ThreadScaling(
+            config=config,
+            n_threads=sorted(points),
+            wall_time=[points[n_threads] for n_threads in sorted(points)],
+        )
+        for config, points in curves.items()
+        if len(points) > 1
+    ]
+
+
+def _run_isolated(config: BenchmarkConfig, timeout: Optional[float]) -> dict:
+    """Run a benchmark in a fresh process such that peak memory is not shared."""
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        return executor.submit(run_benchmark, config, timeout).result()
+
+
+def _environment() -> dict[str, str]:
+    """Return the versions of the software under test."""
+    import CADETProcess
+
+    environment = {
+        "python": platform.python_version(),
+        "cadet_process": CADETProcess.__version__,
+        "machine": platform.node(),
+    }
+    try:
+        environment["cadet"] = Cadet().version
+    except Exception:
+        environment["cadet"] = "unknown"
+    try:
+        environment["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        environment["commit"] = "unknown"
+
+    return environment
+
+
+def run_profile(
+    profile: str,
+    history_path: str | Path = DEFAULT_HISTORY,
+    repeat: int = 1,
+    timeout: Optional[float] = None,
+) -> list[dict]:
+    """
+    Run all benchmarks of a profile and append the records to the history.
+
+    Parameters
+    ----------
+    profile : str
+        Name of the profile in `PROFILES`.
+    history_path : str or Path, optional
+        JSON lines file the records are appended to.
+    repeat : int, optional
+        Number of repetitions of every benchmark. The record with the lowest wall
+        time is kept. The default is 1.
+    timeout : float, optional
+        Maximum run time of a single simulation in s.
+
+    Returns
+    -------
+    list[dict]
+        Records of all benchmarks.
+    """
+    history_path = Path(history_path)
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+
+    run_id = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    environment = _environment()
+
+    records = []
+    for config in profile_configs(profile):
+        record = {
+            "run_id": run_id,
+            "profile": profile,
+            "benchmark": config.key,
+            "config": asdict(config),
+            "environment": environment,
+        }
+        try:
+            results = [_run_isolated(config, timeout) for _ in range(repeat)]
+        except Exception as e:
+            logger.warning(f"Benchmark {config.key} failed: {e}")
+            record.update(status="failed", error=str(e))
+        else:
+            record.update(status="ok", **min(results, key=lambda r: r["wall_time"]))
+            logger.info(f"{config.key}: {record['wall_time']:.1f} s")
+
+        with open(history_path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+        records.append(record)
+
+    return records
+
+
+def load_history(
+    history_path: str | Path = DEFAULT_HISTORY,
+    run_id: Optional[str] = "latest",
+) -> list[dict]:
+    """
+    Read benchmark records from a JSON lines file.
+
+    Parameters
+    ----------
+    history_path : str or Path, optional
+        History file.
+    run_id : str, optional
+        Only return the records of this run. If 'latest', the records of the last
+        run are returned. If None, all records are returned.
+
+    Returns
+    -------
+    list[dict]
+        Benchmark records.
+    """
+    with open(history_path) as file:
+        records = [json.loads(line) for line in file if line.strip()]
+
+    if run_id == "latest" and records:
+        run_id = records[-1]["run_id"]
+    if run_id is not None:
+        records = [record for record in records if record["run_id"] == run_id]
+
+    return records
+
+
+def compare_records(
+    records: Sequence[dict],
+    baseline: Sequence[dict],
+    tolerance: float = 0.1,
+) -> list[str]:
+    """
+    Compare benchmark records against a baseline.
+
+    A regression is reported if a benchmark failed although its baseline
+    succeeded, or if the wall time, peak RSS, output size or a solver statistic
+    increased by more than `tolerance` relative to the baseline.
+
+    Parameters
+    ----------
+    records : Sequence[dict]
+        Records of the run to check.
+    baseline : Sequence[dict]
+        Records of the baseline run.
+    tolerance : float, optional
+        Allowed relative increase. The default is 0.1.
+
+    Returns
+    -------
+    list[str]
+        Description of every regression.
+    """
+    baseline = {record["benchmark"]: record for record in baseline}
+
+    regressions = []
+    for record in records:
+        reference = baseline.get(record["benchmark"])
+        if reference is None or reference["status"] != "ok":
+            continue
+        if record["status"] != "ok":
+            regressions.append(f"{record['benchmark']}: {record['error']}")
+            continue
+
+        metrics = {name: (record[name], reference[name]) for name in COMPARED_METRICS}
+        for name, value in reference["statistics"].items():
+            if name in record["statistics"] and not name.endswith("time_sim"):
+                metrics[name] = (record["statistics"][name], value)
+
+        for name, (value, reference_value) in metrics.items():
+            if reference_value > 0 and value > (1 + tolerance) * reference_value:
+                change = value / reference_value - 1
+                regressions.append(
+                    f"{record['benchmark']}: {name} {reference_value:.4g} -> "
+                    f"{value:.4g} (+{change:.0%})"
+                )
+
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command line interface of the benchmarks."""
+    parser = argparse.ArgumentParser(prog="python -m smb_tools.benchmark")
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run a benchmark profile.")
+    run_parser.add_argument("--profile", choices=list(PROFILES), default="quick")
+    run_parser.add_argument("--repeat", type=int, default=1)
+    run_parser.add_argument("--timeout", type=float, default=None)
+
+    commands.add_parser("baseline", help="Store the latest run as baseline.")
+
+    compare_parser = commands.add_parser(
+        "compare", help="Compare the latest run against the baseline."
+    )
+    compare_parser.add_argument("--tolerance", type=float, default=0.1)
+
+    valves_parser = commands.add_parser(
+        "valves", help="Compare simulations with and without valve units."
+    )
+    valves_parser.add_argument("--case", choices=list(CASE_STUDIES), default=None)
+    valves_parser.add_argument("--n-cycles", type=int, default=None)
+    valves_parser.add_argument("--timeout", type=float, default=None)
+
+    threads_parser = commands.add_parser(
+        "threads", help="Run the thread scaling profile and print the speedups."
+    )
+    threads_parser.add_argument("--repeat", type=int, default=1)
+    threads_parser.add_argument("--timeout", type=float, default=None)
+    threads_parser.add_argument("--plot", type=Path, default=None)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        records = run_profile(args.profile, args.history, args.repeat, args.timeout)
+        for record in records:
+            wall_time = record.get("wall_time", float("nan"))
+            print(f"{record['status']:>6} {wall_time:10.2f} s  {record['benchmark']}")
+    elif args.command == "baseline":
+        records = load_history(args.history)
+        if not records:
+            raise CADETProcessError(f"No benchmark records in {args.history}.")
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w") as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+        print(f"Stored {len(records)} records of run {records[0]['run_id']}.")
+    elif args.command == "compare":
+        regressions = compare_records(
+            load_history(args.history),
+            load_history(args.baseline, run_id=None),
+            args.tolerance,
+        )
+        for regression in regressions:
+            print(regression)
+        if regressions:
+            return 1
+        print("No regressions.")
+    elif args.command == "valves":
+        for config in PROFILES["full"]["baselines"]:
+            if args.case is not None and config.case != args.case:
+                continue
+            if args.n_cycles is not None:
+                config = replace(config, n_cycles=args.n_cycles)
+            print(dead_volume_report(config, args.timeout).summary())
+    elif args.command == "threads":
+        records = run_profile("threads", args.history, args.repeat, args.timeout)
+        curves = thread_scaling(records)
+        for curve in curves:
+            print(curve.summary())
+        if args.plot is not None and curves:
+            fig, ax = plt.subplots()
+            for curve in curves:
+                curve.plot(ax)
+            args.plot.parent.mkdir(parents=True, exist_ok=True)
+            fig.savefig(args.plot)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
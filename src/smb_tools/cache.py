@@ -0,0 +1,212 @@
+"""
+Content-addressed cache of CADET simulations.
+
+The key of a simulation is a hash of the complete CADET configuration generated from
+the process, which contains the component system, binding model, unit parameters,
+discretization, sections and switch times, connections, number of cycles, initial
+state and time integrator settings. If the configuration was simulated before, the
+stored CADET output is loaded from disk instead of running CADET again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.processModel import Process
+from CADETProcess.simulationResults import SimulationResults
+from CADETProcess.simulator import Cadet
+from diskcache import Cache
+
+__all__ = ["config_hash", "default_cache_directory", "CachedCadet"]
+
+_IGNORED_KEYS = {"nthreads", "write_solver_statistics"}
+"""set: Solver settings that do not change the simulation results."""
+
+
+def _canonical(value: Any) -> Any:
+    """Convert a CADET configuration into JSON-serializable, ordered values."""
+    if isinstance(value, dict):
+        return {
+            str(key): _canonical(item)
+            for key, item in sorted(value.items())
+            if key not in _IGNORED_KEYS
+        }
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return _canonical(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+def config_hash(config: dict) -> str:
+    """
+    Return a stable hash of a CADET configuration.
+
+    Parameters
+    ----------
+    config : dict
+        CADET configuration, e.g. from `Cadet.get_process_config`.
+
+    Returns
+    -------
+    str
+        SHA-256 hex digest of the configuration.
+    """
+    serialized = json.dumps(_canonical(config), sort_keys=True)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def default_cache_directory() -> Path:
+    """
+    Return the default location of the simulation cache.
+
+    The location can be set with the environment variable `SMB_SIMULATION_CACHE`.
+    Otherwise, `~/.cache/smb_tools/simulations` is used such that the cache
+    persists between runs of `process_example`.
+
+    Returns
+    -------
+    Path
+        Cache directory.
+    """
+    directory = os.environ.get("SMB_SIMULATION_CACHE")
+    if directory is None:
+        return Path.home() / ".cache" / "smb_tools" / "simulations"
+    return Path(directory)
+
+
+class CachedCadet(Cadet):
+    """
+    CADET simulator that reuses the results of identical simulations.
+
+    Every call to CADET (including the individual batches of
+    `simulate_n_cycles`) is looked up in a size-bounded cache on disk. Entries are
+    evicted in least-recently-used order once the size limit is exceeded.
+
+    Parameters
+    ----------
+    *args
+        Arguments of `Cadet`.
+    cache_directory : str or Path, optional
+        Directory of the cache. If None, `default_cache_directory()` is used.
+    size_limit : int, optional
+        Maximum size of the cache in bytes. The default is 4 GiB.
+    **kwargs
+        Keyword arguments of `Cadet`.
+
+    Attributes
+    ----------
+    n_hits : int
+        Number of simulations loaded from the cache.
+    n_misses : int
+        Number of simulations run with CADET.
+    last_cadet : Cadet or None
+        CADET instance of the last simulation, including the solver statistics,
+        which are always requested.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        cache_directory: Optional[str | Path] = None,
+        size_limit: int = 2**32,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+
+        if cache_directory is None:
+            cache_directory = default_cache_directory()
+        self.cache = Cache(
+            str(cache_directory),
+            size_limit=size_limit,
+            eviction_policy="least-recently-used",
+        )
+        self.n_hits = 0
+        self.n_misses = 0
+        self.last_cadet = None
+
+    def get_process_config(self, process: Process) -> Any:
+        """Return the CADET configuration, requesting the solver statistics."""
+        config = super().get_process_config(process)
+        config.input["return"].write_solver_statistics = 1
+
+        return config
+
+    def cache_key(self, process: Process) -> str:
+        """Return the cache key of simulating a process with this simulator."""
+        return config_hash(self.get_process_config(process))
+
+    def _run(
+        self,
+        process: Process,
+        cadet: Any = None,
+        file_path: Optional[os.PathLike] = None,
+    ) -> SimulationResults:
+        """Load the results from the cache or run CADET and store its output."""
+        if cadet is not None or file_path is not None:
+            self.last_cadet = cadet
+            return super()._run(process, cadet=cadet, file_path=file_path)
+
+        # Locking the process caches its parameter timelines, such that the
+        # configuration is only generated once for hashing and running.
+        locked_process = not process.lock
+        if locked_process:
+            process.lock = True
+        try:
+            key = self.cache_key(process)
+            with tempfile.TemporaryDirectory(dir=self.temp_dir) as directory:
+                file_path = Path(directory) / "simulation.h5"
+
+                cached = self.cache.get(key, read=True)
+                if cached is not None:
+                    with cached:
+                        file_path.write_bytes(cached.read())
+
+                if file_path.exists():
+                    try:
+                        results = self._load_cached(process, file_path)
+                    except (CADETProcessError, KeyError, OSError):
+                        self.logger.warning("Could not load cached results, rerunning.")
+                        self.cache.delete(key)
+                    else:
+                        self.n_hits += 1
+                        return results
+
+                cadet = self.get_new_cadet_instance()
+                results = super()._run(process, cadet=cadet)
+                self.n_misses += 1
+                self.last_cadet = cadet
+
+                cadet.filename = file_path
+                cadet.root.meta.time_sim = results.time_elapsed
+                cadet.save()
+                with open(file_path, "rb") as file:
+                    self.cache.set(key, file, read=True)
+
+            return results
+        finally:
+            if locked_process:
+                process.lock = False
+
+    def _load_cached(self, process: Process, file_path: Path) -> SimulationResults:
+        """Read simulation results from a cached CADET file."""
+        cadet = self.get_new_cadet_instance()
+        cadet.filename = file_path
+        cadet.load_from_file()
+        results = self.get_simulation_results(process, cadet)
+        self.last_cadet = cadet
+
+        return results
+
+    def clear_cache(self) -> None:
+        """Remove all cached simulations."""
+        self.cache.clear()
@@ -0,0 +1,166 @@
+"""
+Topology information of carousel systems.
+
+The `CarouselBuilder` stores zones, external units and split fractions in its own
+flow sheet. The functions in this module condense this flow sheet into the
+quantities needed by alternative SMB models (e.g. zone flow rates and the
+external streams entering and leaving each zone).
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder, SerialZone
+
+__all__ = ["ZoneLayout", "zone_layouts", "position_zones"]
+
+
+@dataclass
+class ZoneLayout:
+    """
+    Flow rates and external streams of a single zone.
+
+    Attributes
+    ----------
+    name : str
+        Name of the zone.
+    positions : np.ndarray
+        Carousel positions of the zone.
+    flow_rate : float
+        Volumetric flow rate through the columns of the zone.
+    flow_direction : int
+        Flow direction of the zone.
+    upstream : str or None
+        Name of the zone feeding into this zone.
+    upstream_flow_rate : float
+        Flow rate entering from the upstream zone.
+    inlets : dict
+        Flow rate and concentration of every external inlet entering the zone.
+    outlets : dict
+        Flow rate of every external outlet leaving the zone.
+    """
+
+    name: str
+    positions: np.ndarray
+    flow_rate: float
+    flow_direction: int = 1
+    upstream: Optional[str] = None
+    upstream_flow_rate: float = 0.0
+    inlets: dict[str, tuple[float, np.ndarray]] = field(default_factory=dict)
+    outlets: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def n_columns(self) -> int:
+        """int: Number of columns in the zone."""
+        return len(self.positions)
+
+    @property
+    def inlet_flow_rate(self) -> float:
+        """float: Total flow rate of external inlets."""
+        return sum(flow_rate for flow_rate, c in self.inlets.values())
+
+    def inlet_mass_flow(self, n_comp: int) -> np.ndarray:
+        """Return the component mass flow of all external inlets."""
+        mass_flow = np.zeros(n_comp)
+        for flow_rate, c in self.inlets.values():
+            mass_flow += flow_rate * c
+        return mass_flow
+
+
+def _constant_flow_rate(flow_rates: dict, key: str) -> float:
+    """Return the constant coefficient of a flow rate polynomial."""
+    return float(flow_rates[key][None][0])
+
+
+def zone_layouts(builder: CarouselBuilder) -> list[ZoneLayout]:
+    """
+    Condense the carousel flow sheet into a list of zone layouts.
+
+    Only serial zones that are connected in a ring (each zone only receiving flow
+    from the previous zone in `builder.zones`) are supported.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+
+    Returns
+    -------
+    list[ZoneLayout]
+        Layout of every zone in order of the carousel positions.
+
+    Raises
+    ------
+    CADETProcessError
+        If zones are not serial zones or are not connected in a ring.
+    """
+    flow_sheet = builder.flow_sheet
+    flow_rates = flow_sheet.get_flow_rates()
+    zones = builder.zones
+    zone_names = [zone.name for zone in zones]
+
+    layouts = []
+    position_counter = 0
+    for i_zone, zone in enumerate(zones):
+        if not isinstance(zone, SerialZone):
+            raise CADETProcessError("Only serial zones are supported.")
+
+        zone_flow_rates = flow_rates[zone.name]
+        layout = ZoneLayout(
+            name=zone.name,
+            positions=np.arange(position_counter, position_counter + zone.n_columns),
+            flow_rate=_constant_flow_rate(zone_flow_rates, "total_in"),
+            flow_direction=zone.flow_direction,
+        )
+        position_counter += zone.n_columns
+
+        upstream = zone_names[i_zone - 1]
+        for origin, origin_flow_rate in zone_flow_rates["origins"][None].items():
+            flow_rate = float(origin_flow_rate[None][0])
+            if origin in zone_names:
+                if origin != upstream:
+                    raise CADETProcessError(
+                        f"Zone {zone.name} must only receive flow from {upstream}."
+                    )
+                layout.upstream = origin
+                layout.upstream_flow_rate = flow_rate
+            else:
+                inlet = flow_sheet[origin]
+                c = np.array(inlet.c, ndmin=2)[:, 0]
+                layout.inlets[origin] = (flow_rate, c)
+
+        for destination, destination_flow_rate in zone_flow_rates["destinations"][
+            None
+        ].items():
+            if destination not in zone_names:
+                layout.outlets[destination] = float(destination_flow_rate[None][0])
+
+        layouts.append(layout)
+
+    for layout in layouts:
+        if layout.flow_rate <= 0:
+            raise CADETProcessError(f"No flow through {layout.name}.")
+
+    return layouts
+
+
+def position_zones(builder: CarouselBuilder) -> np.ndarray:
+    """
+    Return the zone index of every carousel position.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+
+    Returns
+    -------
+    np.ndarray
+        Zone index of every carousel position.
+    """
+    return np.repeat(
+        np.arange(builder.n_zones),
+        [zone.n_columns for zone in builder.zones],
+    )
@@ -0,0 +1,431 @@
+"""
+Parameterised setup of the case studies.
+
+The factories reproduce the flow sheets of the case study notebooks but expose the
+operating parameters (switch time, split fractions and inlet flow rates) and the
+discretization as arguments. They are module-level functions such that they can be
+sent to worker processes.
+"""
+
+import os
+from typing import Optional
+
+from CADETProcess.modelBuilder import CarouselBuilder, SerialZone
+from CADETProcess.processModel import (
+    ComponentSystem,
+    GeneralRateModel,
+    Inlet,
+    Linear,
+    LumpedRateModelWithoutPores,
+    Outlet,
+    Process,
+)
+from CADETProcess import CADETProcessError
+from CADETProcess.simulator import Cadet
+
+from .cache import _canonical
+from .valves import build_process_without_valves
+
+__all__ = [
+    "four_zone_binary",
+    "five_zone_ternary",
+    "default_n_threads",
+    "create_simulator",
+    "CASE_STUDIES",
+    "PRODUCT_TARGETS",
+    "SPLIT_FRACTIONS",
+    "check_case_study",
+]
+
+
+def four_zone_binary(
+    switch_time: float = 1552,
+    w_e: float = 0.249,
+    w_r: float = 0.213,
+    eluent_flow_rate: float = 4.14e-8,
+    feed_flow_rate: float = 2.0e-8,
+    ncol: int = 40,
+    npar: int = 1,
+    write_solution_bulk: bool = True,
+    eliminate_valves: bool = False,
+) -> tuple[Process, CarouselBuilder]:
+    """
+    Build the four-zone binary separation of glucose and fructose.
+
+    Parameters
+    ----------
+    switch_time : float, optional
+        Switch time in s. The default is 1552.
+    w_e : float, optional
+        Fraction of the zone I outlet leaving through the extract.
+        The default is 0.249.
+    w_r : float, optional
+        Fraction of the zone III outlet leaving through the raffinate.
+        The default is 0.213.
+    eluent_flow_rate : float, optional
+        Eluent flow rate in m^3 / s. The default is 4.14e-8.
+    feed_flow_rate : float, optional
+        Feed flow rate in m^3 / s. The default is 2.0e-8.
+    ncol : int, optional
+        Number of axial cells. The default is 40.
+    npar : int, optional
+        Number of radial particle cells. The default is 1.
+    write_solution_bulk : bool, optional
+        If True, the bulk concentrations of the columns are stored.
+        The default is True.
+    eliminate_valves : bool, optional
+        If True, the columns are connected directly instead of through the valve
+        units, see `build_process_without_valves`. The default is False.
+
+    Returns
+    -------
+    tuple[Process, CarouselBuilder]
+        Carousel process and the builder it was created with.
+    """
+    component_system = ComponentSystem(["A", "B"])
+
+    binding_model = Linear(component_system)
+    binding_model.is_kinetic = False
+    binding_model.adsorption_rate = [0.28, 0.54]
+    binding_model.desorption_rate = [1, 1]
+
+    column = GeneralRateModel(component_system, name="column")
+    column.binding_model = binding_model
+    column.length = 0.536
+    column.diameter = 2.6e-2
+    column.bed_porosity = 0.38
+    column.particle_porosity = 1.0e-5
+    column.particle_radius = 1.63e-3
+    column.film_diffusion = component_system.n_comp * [5e-5]
+    column.pore_diffusion = component_system.n_comp * [1.6e4]
+    column.axial_dispersion = 3.81e-6
+    column.discretization.npar = npar
+    column.discretization.ncol = ncol
+    column.solution_recorder.write_solution_bulk = write_solution_bulk
+
+    eluent = Inlet(component_system, name="eluent")
+    eluent.c = [0, 0]
+    eluent.flow_rate = eluent_flow_rate
+
+    feed = Inlet(component_system, name="feed")
+    feed.c = [2.78e3, 2.78e3]
+    feed.flow_rate = feed_flow_rate
+
+    extract = Outlet(component_system, name="extract")
+    raffinate = Outlet(component_system, name="raffinate")
+
+    zones = [
+        SerialZone(
+            component_system,
+            name,
+            n_columns=2,
+            valve_parameters={"valve_dead_volume": 1e-9},
+        )
+        for name in ("zone_I", "zone_II", "zone_III", "zone_IV")
+    ]
+    zone_I, zone_II, zone_III, zone_IV = zones
+
+    builder = CarouselBuilder(component_system, "smb")
+    builder.valve_dead_volume = 1e-9
+    builder.column = column
+    for unit in (eluent, feed, extract, raffinate, *zones):
+        builder.add_unit(unit)
+
+    builder.add_connection(eluent, zone_I)
+
+    builder.add_connection(zone_I, extract)
+    builder.add_connection(zone_I, zone_II)
+    builder.set_output_state(zone_I, [w_e, 1 - w_e])
+
+    builder.add_connection(zone_II, zone_III)
+
+    builder.add_connection(feed, zone_III)
+
+    builder.add_connection(zone_III, raffinate)
+    builder.add_connection(zone_III, zone_IV)
+    builder.set_output_state(zone_III, [w_r, 1 - w_r])
+
+    builder.add_connection(zone_IV, zone_I)
+
+    builder.switch_time = switch_time
+
+    if eliminate_valves:
+        return build_process_without_valves(builder), builder
+    return builder.build_process(), builder
+
+
+def five_zone_ternary(
+    switch_time: float = 324,
+    w_e1: float = 0.595,
+    w_e2: float = 0.395,
+    w_r: float = 0.368,
+    eluent_flow_rate: float = 1.908e-7,
+    feed_flow_rate: float = 1.67e-8,
+    ncol: int = 40,
+    write_solution_bulk: bool = True,
+    eliminate_valves: bool = False,
+) -> tuple[Process, CarouselBuilder]:
+    """
+    Build the five-zone ternary separation of 2'-deoxynucleosides.
+
+    Parameters
+    ----------
+    switch_time : float, optional
+        Switch time in s. The default is 324.
+    w_e1 : float, optional
+        Fraction of the zone I outlet leaving through extract 1.
+        The default is 0.595.
+    w_e2 : float, optional
+        Fraction of the zone II outlet leaving through extract 2.
+        The default is 0.395.
+    w_r : float, optional
+        Fraction of the zone IV outlet leaving through the raffinate.
+        The default is 0.368.
+    eluent_flow_rate : float, optional
+        Eluent flow rate in m^3 / s. The default is 1.908e-7.
+    feed_flow_rate : float, optional
+        Feed flow rate in m^3 / s. The default is 1.67e-8.
+    ncol : int, optional
+        Number of axial cells. The default is 40.
+    write_solution_bulk : bool, optional
+        If True, the bulk concentrations of the columns are stored.
+        The default is True.
+    eliminate_valves : bool, optional
+        If True, the columns are connected directly instead of through the valve
+        units, see `build_process_without_valves`. The default is False.
+
+    Returns
+    -------
+    tuple[Process, CarouselBuilder]
+        Carousel process and the builder it was created with.
+    """
+    component_system = ComponentSystem(["A", "B", "C"])
+
+    binding_model = Linear(component_system)
+    binding_model.is_kinetic = True
+    binding_model.adsorption_rate = [3.15, 7.40 * 0.5, 23.0 * 0.1]
+    binding_model.desorption_rate = [1, 0.5, 0.1]
+
+    column = LumpedRateModelWithoutPores(component_system, name="column")
+    column.binding_model = binding_model
+    column.length = 0.150
+    column.diameter = 1.0e-2
+    column.total_porosity = 0.80
+    column.axial_dispersion = 1e-7
+    column.discretization.ncol = ncol
+    column.solution_recorder.write_solution_bulk = write_solution_bulk
+
+    eluent = Inlet(component_system, name="eluent")
+    eluent.c = [0, 0, 0]
+    eluent.flow_rate = eluent_flow_rate
+
+    feed = Inlet(component_system, name="feed")
+    feed.c = [4.40, 3.74, 3.98]
+    feed.flow_rate = feed_flow_rate
+
+    extract_1 = Outlet(component_system, name="extract_1")
+    extract_2 = Outlet(component_system, name="extract_2")
+    raffinate = Outlet(component_system, name="raffinate")
+
+    zones = [
+        SerialZone(
+            component_system,
+            name,
+            n_columns=1,
+            valve_parameters={"valve_dead_volume": 1e-9},
+        )
+        for name in ("zone_I", "zone_II", "zone_III", "zone_IV", "zone_V")
+    ]
+    zone_I, zone_II, zone_III, zone_IV, zone_V = zones
+
+    builder = CarouselBuilder(component_system, "smb")
+    builder.valve_dead_volume = 1e-9
+    builder.column = column
+    for unit in (eluent, feed, extract_1, extract_2, raffinate, *zones):
+        builder.add_unit(unit)
+
+    builder.add_connection(eluent, zone_I)
+
+    builder.add_connection(zone_I, extract_1)
+    builder.add_connection(zone_I, zone_II)
+    builder.set_output_state(zone_I, [w_e1, 1 - w_e1])
+
+    builder.add_connection(zone_II, extract_2)
+    builder.add_connection(zone_II, zone_III)
+    builder.set_output_state(zone_II, [w_e2, 1 - w_e2])
+
+    builder.add_connection(zone_III, zone_IV)
+
+    builder.add_connection(feed, zone_IV)
+    builder.add_connection(zone_IV, raffinate)
+    builder.add_connection(zone_IV, zone_V)
+    builder.set_output_state(zone_IV, [w_r, 1 - w_r])
+
+    builder.add_connection(zone_V, zone_I)
+
+    builder.switch_time = switch_time
+
+    if eliminate_valves:
+        return build_process_without_valves(builder), builder
+    return builder.build_process(), builder
+
+
+def default_n_threads(n_workers: int = 1) -> int:
+    """
+    Return the number of CADET threads of a simulation.
+
+    CADET evaluates the residual and Jacobian of the unit operations in parallel,
+    which speeds up carousel processes with many identical columns. If `n_workers`
+    simulations run concurrently, the available cores are divided among them. The
+    number of available cores can be limited with the environment variable
+    `SMB_N_THREADS`, which is done by `main.py` when the notebooks run in parallel.
+
+    Parameters
+    ----------
+    n_workers : int, optional
+        Number of concurrent simulations. The default is 1.
+
+    Returns
+    -------
+    int
+        Number of threads per simulation.
+    """
+    n_cores = int(os.environ.get("SMB_N_THREADS", os.cpu_count() or 1))
+
+    return max(n_cores // max(n_workers, 1), 1)
+
+
+def create_simulator(
+    n_cycles: int = 13,
+    abstol: float = 1e-10,
+    reltol: float = 1e-6,
+    init_step_size: float = 1e-14,
+    max_step_size: float = 5e6,
+    use_dll: bool = True,
+    timeout: Optional[float] = None,
+    n_threads: Optional[int] = None,
+    simulator_class: type[Cadet] = Cadet,
+) -> Cadet:
+    """
+    Create a simulator with the time integrator settings of the case studies.
+
+    Parameters
+    ----------
+    n_cycles : int, optional
+        Number of simulated cycles. The default is 13.
+    abstol : float, optional
+        Absolute tolerance of the time integrator. The default is 1e-10.
+    reltol : float, optional
+        Relative tolerance of the time integrator. The default is 1e-6.
+    init_step_size : float, optional
+        Initial step size of the time integrator. The default is 1e-14.
+    max_step_size : float, optional
+        Maximum step size of the time integrator. The default is 5e6.
+    use_dll : bool, optional
+        If True, CADET is called through its shared library. The default is True.
+    timeout : float, optional
+        Maximum run time of a simulation in s. Only the command line interface
+        enforces it. The default is None.
+    n_threads : int, optional
+        Number of CADET threads. If None, `default_n_threads` is used.
+    simulator_class : type[Cadet], optional
+        Class of the simulator, e.g. a subclass of `Cadet`. The default is `Cadet`.
+
+    Returns
+    -------
+    Cadet
+        Configured simulator.
+    """
+    process_simulator = simulator_class()
+    process_simulator.n_cycles = n_cycles
+    process_simulator.use_dll = use_dll
+    if timeout is not None:
+        process_simulator.timeout = timeout
+    if n_threads is None:
+        n_threads = default_n_threads()
+    process_simulator.solver_parameters.nthreads = n_threads
+
+    process_simulator.time_integrator_parameters.abstol = abstol
+    process_simulator.time_integrator_parameters.reltol = reltol
+    process_simulator.time_integrator_parameters.init_step_size = init_step_size
+    process_simulator.time_integrator_parameters.max_step_size = max_step_size
+
+    return process_simulator
+
+
+CASE_STUDIES = {
+    "four_zone_binary": four_zone_binary,
+    "five_zone_ternary": five_zone_ternary,
+}
+"""dict: Factories of the case studies by name."""
+
+PRODUCT_TARGETS = {
+    "four_zone_binary": {"extract": "B", "raffinate": "A"},
+    "five_zone_ternary": {"extract_1": "C", "extract_2": "B", "raffinate": "A"},
+}
+"""dict: Target component of every product outlet of the case studies."""
+
+SPLIT_FRACTIONS = {
+    "four_zone_binary": {"w_e": "zone_I", "w_r": "zone_III"},
+    "five_zone_ternary": {"w_e1": "zone_I", "w_e2": "zone_II", "w_r": "zone_IV"},
+}
+"""dict: Zone whose outlet is split by every split fraction argument of the factories."""
+
+
+def _flat_parameters(parameters: dict, prefix: str = "") -> dict:
+    """Flatten nested parameters into a dict of dotted names."""
+    flat = {}
+    for key, value in parameters.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flat_parameters(value, f"{name}."))
+        else:
+            flat[name] = _canonical(value)
+    return flat
+
+
+def _process_configuration(process: Process) -> dict:
+    """Return the parameters, components and unit types of a process."""
+    configuration = _flat_parameters(process.parameters)
+    configuration["component_system"] = process.component_system.names
+    for unit in process.flow_sheet.units:
+        configuration[f"flow_sheet.{unit.name}.type"] = type(unit).__name__
+
+    return configuration
+
+
+def check_case_study(process: Process, case: str, **kwargs) -> None:
+    """
+    Check that a process matches the factory of a case study.
+
+    The notebooks set up their processes step by step. This check ensures that the
+    factories, which are used by the benchmarks, sweeps and optimizations, do not
+    drift from the notebooks.
+
+    Parameters
+    ----------
+    process : Process
+        Process to check, e.g. the process of a case study notebook.
+    case : str
+        Name of the case study, see `CASE_STUDIES`.
+    **kwargs
+        Arguments of the factory.
+
+    Raises
+    ------
+    CADETProcessError
+        If the parameters, components or units of the processes differ.
+    """
+    reference, _ = CASE_STUDIES[case](**kwargs)
+    configuration = _process_configuration(process)
+    expected = _process_configuration(reference)
+
+    differences = sorted(
+        name
+        for name in configuration.keys() | expected.keys()
+        if configuration.get(name) != expected.get(name)
+    )
+    if differences:
+        raise CADETProcessError(
+            f"Process differs from the case study {case!r} in {differences}."
+        )
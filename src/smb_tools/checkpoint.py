@@ -0,0 +1,408 @@
+"""
+Checkpoints of carousel states for warm-starting simulations.
+
+The complete system state (columns and valves) at the end of a simulation is stored
+in an HDF5 file, grouped by the topology of the carousel. Before the state is
+stored, the columns are moved back to the positions they occupy at the start of a
+process. A later simulation of a process with the same topology can then start from
+the checkpoint whose operating point is closest to its own, which saves most of the
+cycles needed to approach cyclic steady state.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import h5py
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Inlet, Process
+from CADETProcess.simulationResults import SimulationResults
+
+from .carousel import zone_layouts
+from .state import remap_carousel_state, split_state, unit_state_sizes
+
+__all__ = [
+    "Checkpoint",
+    "CheckpointStore",
+    "carousel_topology",
+    "topology_key",
+    "operating_point",
+]
+
+
+def carousel_topology(process: Process, builder: CarouselBuilder) -> dict:
+    """
+    Describe the structure of a carousel process that determines its state layout.
+
+    Parameters
+    ----------
+    process : Process
+        Process created by `builder.build_process()`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+
+    Returns
+    -------
+    dict
+        Components, zones and state sizes of all unit operations.
+    """
+    return {
+        "components": list(builder.component_system.names),
+        "zones": [
+            [zone.name, zone.n_columns, zone.flow_direction] for zone in builder.zones
+        ],
+        "units": [
+            [name, type(process.flow_sheet[name]).__name__, size]
+            for name, size in unit_state_sizes(process.flow_sheet).items()
+        ],
+    }
+
+
+def topology_key(process: Process, builder: CarouselBuilder) -> str:
+    """
+    Return a short hash of the carousel topology.
+
+    Parameters
+    ----------
+    process : Process
+        Process created by `builder.build_process()`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+
+    Returns
+    -------
+    str
+        Hexadecimal key under which checkpoints of this topology are stored.
+    """
+    topology = json.dumps(carousel_topology(process, builder), sort_keys=True)
+    return hashlib.sha1(topology.encode()).hexdigest()[:16]
+
+
+def operating_point(builder: CarouselBuilder) -> dict[str, float]:
+    """
+    Return the operating parameters of a carousel process.
+
+    The operating point consists of the switch time, the flow rate of every zone and
+    the concentrations of all external inlets.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+
+    Returns
+    -------
+    dict[str, float]
+        Operating parameters.
+    """
+    point = {"switch_time": float(builder.switch_time)}
+    for layout in zone_layouts(builder):
+        point[f"{layout.name}.flow_rate"] = layout.flow_rate
+
+    for unit in builder.flow_sheet.units:
+        if isinstance(unit, Inlet):
+            c = np.array(unit.c, ndmin=2)[:, 0]
+            for comp, c_i in zip(builder.component_system.names, c):
+                point[f"{unit.name}.c.{comp}"] = float(c_i)
+
+    return point
+
+
+def _relative_distance(point: dict[str, float], reference: dict[str, float]) -> float:
+    """Return the maximum relative deviation of two operating points."""
+    if point.keys() != reference.keys():
+        return np.inf
+
+    x = np.array([point[key] for key in reference])
+    x_ref = np.array(list(reference.values()))
+    scale = np.maximum(np.abs(x), np.abs(x_ref))
+    deviation = np.divide(
+        np.abs(x - x_ref), scale, out=np.zeros_like(x), where=scale > 0
+    )
+
+    return float(np.max(deviation, initial=0))
+
+
+@dataclass
+class Checkpoint:
+    """
+    System state of a carousel process at a switch boundary.
+
+    The columns are sorted such that the state can be used as initial state of a
+    process starting at t = 0.
+
+    Attributes
+    ----------
+    name : str
+        Name of the checkpoint within its topology group.
+    topology_key : str
+        Key of the carousel topology.
+    state : np.ndarray
+        System state.
+    state_derivative : np.ndarray
+        Time derivative of the system state.
+    operating_point : dict[str, float]
+        Operating parameters of the process the state was taken from.
+    n_switches : int
+        Number of switch periods simulated before the state was taken.
+    metadata : dict
+        Additional information, e.g. whether the state is at cyclic steady state.
+    """
+
+    name: str
+    topology_key: str
+    state: np.ndarray = field(repr=False)
+    state_derivative: np.ndarray = field(repr=False)
+    operating_point: dict[str, float]
+    n_switches: int
+    metadata: dict[str, Any] = field(default_factory=dict)
+
+    def distance(self, point: dict[str, float]) -> float:
+        """Return the maximum relative deviation from another operating point."""
+        return _relative_distance(point, self.operating_point)
+
+    def apply(self, process: Process) -> None:
+        """Set the checkpoint as initial state of a process."""
+        split_state(process.flow_sheet, self.state)
+        process.system_state = self.state.copy()
+        process.system_state_derivative = self.state_derivative.copy()
+
+
+class CheckpointStore:
+    """
+    HDF5 file containing checkpoints of carousel processes.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Path of the HDF5 file. It is created if it does not exist.
+    max_checkpoints : int, optional
+        Maximum number of checkpoints per topology. If exceeded, the oldest
+        checkpoints are removed. The default is None (no limit).
+
+    Examples
+    --------
+    >>> store = CheckpointStore("checkpoints.h5")
+    >>> store.warm_start(process, builder)
+    >>> simulation_results = process_simulator.simulate(process)
+    >>> store.save(simulation_results, process, builder)
+    """
+
+    def __init__(
+        self,
+        file_path: str | Path,
+        max_checkpoints: Optional[int] = None,
+    ) -> None:
+        self.file_path = Path(file_path)
+        self.max_checkpoints = max_checkpoints
+
+    def save(
+        self,
+        simulation_results: SimulationResults,
+        process: Process,
+        builder: CarouselBuilder,
+        name: Optional[str] = None,
+        **metadata: Any,
+    ) -> Checkpoint:
+        """
+        Store the final state of a simulation.
+
+        Parameters
+        ----------
+        simulation_results : SimulationResults
+            Results of the carousel process. The simulation must end at a switch.
+        process : Process
+            Simulated process.
+        builder : CarouselBuilder
+            Builder the process was created with.
+        name : str, optional
+            Name of the checkpoint. If None, a consecutive number is used.
+        **metadata
+            Additional JSON-serializable information stored with the checkpoint.
+
+        Returns
+        -------
+        Checkpoint
+            Stored checkpoint.
+
+        Raises
+        ------
+        CADETProcessError
+            If the simulation does not end at a switch.
+        """
+        t_end = float(simulation_results.time_complete[-1])
+        n_switches = int(round(t_end / builder.switch_time))
+        if not np.isclose(n_switches * builder.switch_time, t_end):
+            raise CADETProcessError("Simulation must end at a switch.")
+
+        state = remap_carousel_state(
+            process, builder, simulation_results.system_state["state"], t_end
+        )
+        state_derivative = remap_carousel_state(
+            process,
+            builder,
+            simulation_results.system_state["state_derivative"],
+            t_end,
+        )
+
+        key = topology_key(process, builder)
+        with h5py.File(self.file_path, "a") as file:
+            group = file.require_group(key)
+            group.attrs["topology"] = json.dumps(carousel_topology(process, builder))
+
+            counter = int(group.attrs.get("counter", 0))
+            if name is None:
+                name = f"checkpoint_{counter:06d}"
+            group.attrs["counter"] = counter + 1
+            if name in group:
+                del group[name]
+
+            entry = group.create_group(name)
+            entry.attrs["order"] = counter
+            for dataset, values in (
+                ("state", state),
+                ("state_derivative", state_derivative),
+            ):
+                entry.create_dataset(dataset, data=values, compression="gzip")
+            entry.attrs["operating_point"] = json.dumps(operating_point(builder))
+            entry.attrs["n_switches"] = n_switches
+            entry.attrs["metadata"] = json.dumps(metadata)
+
+            self._prune(group)
+
+        return Checkpoint(
+            name=name,
+            topology_key=key,
+            state=state,
+            state_derivative=state_derivative,
+            operating_point=operating_point(builder),
+            n_switches=n_switches,
+            metadata=metadata,
+        )
+
+    def _prune(self, group: h5py.Group) -> None:
+        """Remove the oldest checkpoints exceeding max_checkpoints."""
+        if self.max_checkpoints is None:
+            return
+
+        names = sorted(group, key=lambda name: group[name].attrs["order"])
+        for name in names[: max(len(names) - self.max_checkpoints, 0)]:
+            del group[name]
+
+    def checkpoints(
+        self,
+        process: Process,
+        builder: CarouselBuilder,
+    ) -> list[Checkpoint]:
+        """
+        Load all checkpoints compatible with a carousel process.
+
+        Parameters
+        ----------
+        process : Process
+            Process created by `builder.build_process()`.
+        builder : CarouselBuilder
+            Builder the process was created with.
+
+        Returns
+        -------
+        list[Checkpoint]
+            Checkpoints with the same topology, oldest first.
+        """
+        if not self.file_path.exists():
+            return []
+
+        key = topology_key(process, builder)
+        checkpoints = []
+        with h5py.File(self.file_path, "r") as file:
+            if key not in file:
+                return []
+            group = file[key]
+            names = sorted(group, key=lambda name: group[name].attrs["order"])
+            for name in names:
+                entry = group[name]
+                checkpoints.append(
+                    Checkpoint(
+                        name=name,
+                        topology_key=key,
+                        state=entry["state"][()],
+                        state_derivative=entry["state_derivative"][()],
+                        operating_point=json.loads(entry.attrs["operating_point"]),
+                        n_switches=int(entry.attrs["n_switches"]),
+                        metadata=json.loads(entry.attrs["metadata"]),
+                    )
+                )
+
+        return checkpoints
+
+    def nearest(
+        self,
+        process: Process,
+        builder: CarouselBuilder,
+        max_distance: float = np.inf,
+    ) -> Optional[Checkpoint]:
+        """
+        Find the compatible checkpoint closest to the operating point of a process.
+
+        Parameters
+        ----------
+        process : Process
+            Process created by `builder.build_process()`.
+        builder : CarouselBuilder
+            Builder the process was created with.
+        max_distance : float, optional
+            Maximum relative deviation of any operating parameter.
+            The default is np.inf.
+
+        Returns
+        -------
+        Checkpoint or None
+            Closest checkpoint or None if no checkpoint is close enough.
+        """
+        point = operating_point(builder)
+        candidates = [
+            (checkpoint.distance(point), -i, checkpoint)
+            for i, checkpoint in enumerate(self.checkpoints(process, builder))
+        ]
+        candidates = [c for c in candidates if c[0] <= max_distance]
+        if len(candidates) == 0:
+            return None
+
+        return min(candidates, key=lambda c: c[:2])[2]
+
+    def warm_start(
+        self,
+        process: Process,
+        builder: CarouselBuilder,
+        max_distance: float = np.inf,
+    ) -> Optional[Checkpoint]:
+        """
+        Set the initial state of a process from the nearest compatible checkpoint.
+
+        The next call of `process_simulator.simulate(process)` starts from this
+        state. If no checkpoint is found, the process is not modified.
+
+        Parameters
+        ----------
+        process : Process
+            Process created by `builder.build_process()`.
+        builder : CarouselBuilder
+            Builder the process was created with.
+        max_distance : float, optional
+            Maximum relative deviation of any operating parameter.
+            The default is np.inf.
+
+        Returns
+        -------
+        Checkpoint or None
+            Checkpoint that was applied.
+        """
+        checkpoint = self.nearest(process, builder, max_distance)
+        if checkpoint is not None:
+            checkpoint.apply(process)
+
+        return checkpoint
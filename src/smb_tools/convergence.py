@@ -0,0 +1,363 @@
+"""
+Grid convergence studies of carousel processes.
+
+A case study is simulated to cyclic steady state on a sequence of successively
+refined grids. The discretization error of the KPIs on every grid is estimated by
+Richardson extrapolation and the coarsest grid meeting a target error is selected.
+The coarsest level is simulated first; its CSS state is interpolated onto all finer
+grids, which are then simulated in parallel starting close to CSS.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+import numpy.typing as npt
+from CADETProcess import CADETProcessError
+from CADETProcess.log import get_logger
+
+from .case_studies import create_simulator, default_n_threads
+from .kpi import carousel_kpis
+from .state import interpolate_state
+from .stationarity import simulate_to_css
+from .sweep import _initialize_worker
+
+__all__ = [
+    "richardson_extrapolation",
+    "ConvergenceLevel",
+    "ConvergenceStudy",
+    "evaluate_level",
+    "grid_convergence",
+]
+
+logger = get_logger("Convergence")
+
+
+def richardson_extrapolation(
+    values: npt.ArrayLike,
+    ratio: float,
+    order: Optional[float] = None,
+    default_order: float = 2.0,
+    min_order: float = 0.5,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extrapolate values on successively refined grids to zero grid spacing.
+
+    With three or more levels, the observed order of convergence is estimated from
+    the three finest levels. If the differences do not decrease monotonically
+    (oscillatory or stagnating convergence), `default_order` is used. The estimate
+    is clipped to [`min_order`, `default_order` + 1], since an observed order close
+    to zero lets the extrapolation diverge.
+
+    Parameters
+    ----------
+    values : npt.ArrayLike
+        Values on every level with shape (n_levels, ...), from coarse to fine.
+    ratio : float
+        Refinement ratio between consecutive levels.
+    order : float, optional
+        Order of convergence. If None, it is estimated.
+    default_order : float, optional
+        Order used if it cannot be estimated. The default is 2.
+    min_order : float, optional
+        Lower bound of the estimated order. The default is 0.5.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Extrapolated values and the order of convergence used, both with shape
+        `values.shape[1:]`.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 2:
+        raise CADETProcessError("Richardson extrapolation requires two levels.")
+
+    shape = values.shape[1:]
+    if order is not None:
+        p = np.full(shape, float(order))
+    elif len(values) >= 3:
+        coarse = values[-2] - values[-3]
+        fine = values[-1] - values[-2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            q = coarse / fine
+            p = np.log(q) / np.log(ratio)
+        p = np.where(np.isfinite(p) & (q > 1), p, default_order)
+        p = np.clip(p, min_order, default_order + 1)
+    else:
+        p = np.full(shape, default_order)
+
+    extrapolated = values[-1] + (values[-1] - values[-2]) / (ratio**p - 1)
+
+    return extrapolated, p
+
+
+@dataclass
+class ConvergenceLevel:
+    """
+    Results of one grid of a convergence study.
+
+    Attributes
+    ----------
+    discretization : dict[str, int]
+        Discretization parameters of the level, e.g. `ncol` and `npar`.
+    kpis : dict[str, float]
+        KPIs at cyclic steady state.
+    n_cycles : float
+        Number of simulated cycles until CSS.
+    time_elapsed : float
+        Simulation time in s.
+    warm_start : bool
+        True if the level was started from the interpolated coarse CSS state.
+    """
+
+    discretization: dict[str, int]
+    kpis: dict[str, float]
+    n_cycles: float
+    time_elapsed: float
+    warm_start: bool = False
+
+
+@dataclass
+class ConvergenceStudy:
+    """
+    Results of a grid convergence study.
+
+    Attributes
+    ----------
+    levels : list[ConvergenceLevel]
+        Results of all levels, from coarse to fine.
+    ratio : float
+        Refinement ratio between consecutive levels.
+    extrapolated : dict[str, float]
+        Richardson extrapolation of every KPI.
+    order : dict[str, float]
+        Order of convergence used for every KPI.
+    errors : dict[str, np.ndarray]
+        Estimated relative error of every KPI on every level.
+    target_error : float
+        Maximum relative error of the selected level.
+    selected : int or None
+        Index of the coarsest level whose KPIs all meet the target error.
+    """
+
+    levels: list[ConvergenceLevel]
+    ratio: float
+    extrapolated: dict[str, float]
+    order: dict[str, float]
+    errors: dict[str, np.ndarray]
+    target_error: float
+    selected: Optional[int] = field(default=None)
+
+    @property
+    def max_errors(self) -> np.ndarray:
+        """np.ndarray: Largest estimated relative error of each level."""
+        return np.max(np.stack(list(self.errors.values())), axis=0)
+
+    @property
+    def discretization(self) -> Optional[dict[str, int]]:
+        """dict[str, int] or None: Discretization of the selected level."""
+        if self.selected is None:
+            return None
+        return self.levels[self.selected].discretization
+
+    def summary(self) -> str:
+        """Return errors and simulation times of all levels as a text table."""
+        lines = [f"{'level':<24}{'max error':>12}{'cycles':>8}{'time [s]':>10}"]
+        for i, (level, error) in enumerate(zip(self.levels, self.max_errors)):
+            name = ", ".join(f"{k}={v}" for k, v in level.discretization.items())
+            marker = " *" if i == self.selected else ""
+            lines.append(
+                f"{name:<24}{error:>12.2e}{level.n_cycles:>8.0f}"
+                f"{level.time_elapsed:>10.1f}{marker}"
+            )
+
+        return "\n".join(lines)
+
+
+def evaluate_level(
+    factory: Callable,
+    point: dict[str, Any],
+    targets: dict[str, str],
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+    initial_state: Optional[tuple[np.ndarray, np.ndarray]] = None,
+) -> tuple[ConvergenceLevel, tuple[np.ndarray, np.ndarray]]:
+    """
+    Simulate one grid level to cyclic steady state.
+
+    Parameters
+    ----------
+    factory : Callable
+        Module-level case study factory, e.g. `four_zone_binary`.
+    point : dict[str, Any]
+        Keyword arguments of the factory, including the discretization.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`.
+    initial_state : tuple[np.ndarray, np.ndarray], optional
+        State and state derivative the simulation is started from.
+
+    Returns
+    -------
+    tuple[ConvergenceLevel, tuple[np.ndarray, np.ndarray]]
+        Results of the level and its final state and state derivative.
+    """
+    process, builder = factory(**point)
+    process_simulator = create_simulator(**(simulator_options or {}))
+
+    if initial_state is not None:
+        process.system_state, process.system_state_derivative = initial_state
+
+    simulation_results, _ = simulate_to_css(
+        process_simulator, process, builder, **(css_options or {})
+    )
+
+    level = ConvergenceLevel(
+        discretization={key: point[key] for key in ("ncol", "npar") if key in point},
+        kpis=carousel_kpis(simulation_results, builder, targets),
+        n_cycles=float(simulation_results.time_complete[-1] / process.cycle_time),
+        time_elapsed=float(simulation_results.time_elapsed),
+        warm_start=initial_state is not None,
+    )
+    final_state = (
+        simulation_results.system_state["state"],
+        simulation_results.system_state["state_derivative"],
+    )
+
+    return level, final_state
+
+
+def grid_convergence(
+    factory: Callable,
+    targets: dict[str, str],
+    ncol: int = 10,
+    npar: Optional[int] = None,
+    n_levels: int = 4,
+    ratio: int = 2,
+    target_error: float = 1e-3,
+    kpis: Optional[Sequence[str]] = None,
+    factory_options: Optional[dict] = None,
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+    n_workers: Optional[int] = None,
+) -> ConvergenceStudy:
+    """
+    Determine the coarsest grid that resolves the KPIs within a target error.
+
+    The number of axial cells is multiplied by `ratio` from level to level. If
+    `npar` is given (for the `GeneralRateModel`), the particle discretization is
+    refined by the same ratio. The coarsest level is simulated to CSS from the
+    initial state of the process. Its final state is interpolated onto the finer
+    grids, which are simulated to CSS in parallel.
+
+    Parameters
+    ----------
+    factory : Callable
+        Module-level case study factory, e.g. `four_zone_binary`.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    ncol : int, optional
+        Number of axial cells of the coarsest level. The default is 10.
+    npar : int, optional
+        Number of particle cells of the coarsest level. If None, the particle
+        discretization of the factory is used on all levels.
+    n_levels : int, optional
+        Number of levels. The default is 4.
+    ratio : int, optional
+        Refinement ratio between consecutive levels. The default is 2.
+    target_error : float, optional
+        Maximum estimated relative error of all KPIs. The default is 1e-3.
+    kpis : Sequence[str], optional
+        Names of the KPIs that are checked. If None, purity and recovery of all
+        product outlets are checked.
+    factory_options : dict, optional
+        Further keyword arguments of the factory, e.g. operating parameters.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`. Unless `n_threads` is given, the
+        cores are divided among the workers, see `default_n_threads`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`.
+    n_workers : int, optional
+        Number of worker processes for the finer levels. If None, one worker per
+        level is used, limited by the number of CPUs.
+
+    Returns
+    -------
+    ConvergenceStudy
+        KPIs, error estimates and the selected level.
+    """
+    if n_levels < 2:
+        raise CADETProcessError("A convergence study requires at least two levels.")
+    if n_workers is None:
+        n_workers = min(n_levels - 1, os.cpu_count())
+    if kpis is None:
+        kpis = [
+            f"{outlet}.{kpi}" for outlet in targets for kpi in ("purity", "recovery")
+        ]
+
+    points = []
+    for i in range(n_levels):
+        point = dict(factory_options or {}, ncol=ncol * ratio**i)
+        if npar is not None:
+            point["npar"] = npar * ratio**i
+        points.append(point)
+
+    coarse, coarse_state = evaluate_level(
+        factory, points[0], targets, simulator_options, css_options
+    )
+    logger.info(f"Level {points[0]} reached CSS after {coarse.n_cycles:.0f} cycles.")
+
+    coarse_process, _ = factory(**points[0])
+    initial_states = []
+    for point in points[1:]:
+        process, _ = factory(**point)
+        initial_states.append(
+            tuple(
+                interpolate_state(coarse_process.flow_sheet, process.flow_sheet, state)
+                for state in coarse_state
+            )
+        )
+
+    worker_options = {
+        "n_threads": default_n_threads(n_workers),
+        **(simulator_options or {}),
+    }
+    with ProcessPoolExecutor(n_workers, initializer=_initialize_worker) as executor:
+        futures = [
+            executor.submit(
+                evaluate_level,
+                factory,
+                point,
+                targets,
+                worker_options,
+                css_options,
+                initial_state,
+            )
+            for point, initial_state in zip(points[1:], initial_states)
+        ]
+        levels = [coarse] + [future.result()[0] for future in futures]
+
+    values = np.array([[level.kpis[kpi] for kpi in kpis] for level in levels])
+    extrapolated, order = richardson_extrapolation(values, ratio)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        errors = np.abs(values - extrapolated) / np.abs(extrapolated)
+
+    valid = np.flatnonzero(np.all(errors <= target_error, axis=1))
+    selected = int(valid[0]) if len(valid) > 0 else None
+    if selected is None:
+        logger.warning("No level meets the target error, refine further.")
+
+    return ConvergenceStudy(
+        levels=levels,
+        ratio=ratio,
+        extrapolated=dict(zip(kpis, extrapolated.tolist())),
+        order=dict(zip(kpis, order.tolist())),
+        errors={kpi: errors[:, i] for i, kpi in enumerate(kpis)},
+        target_error=target_error,
+        selected=selected,
+    )
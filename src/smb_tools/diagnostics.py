@@ -0,0 +1,89 @@
+"""
+Diagnostics of CADET simulations shared by the benchmarks and the profiler.
+
+The solver statistics (time steps, residual and Jacobian evaluations, ...) are only
+written by CADET if `return/write_solver_statistics` is set, as `CachedCadet` and the
+benchmark simulator do, and are only returned by the command line interface of
+CADET-Python. The peak resident set size includes finished child processes, such
+that simulations through the command line interface are accounted for.
+"""
+
+import resource
+import sys
+from typing import Any
+
+import numpy as np
+from CADETProcess import CADETProcessError
+
+__all__ = ["solver_statistics", "peak_rss"]
+
+
+def _numeric_entries(group: Any, prefix: str = "") -> dict[str, float]:
+    """Flatten all numeric scalars of a (nested) CADET output group."""
+    entries = {}
+    for key, value in group.items():
+        name = f"{prefix}{key}"
+        if hasattr(value, "items"):
+            entries.update(_numeric_entries(value, f"{name}."))
+            continue
+        value = np.asarray(value)
+        if value.size == 1 and np.issubdtype(value.dtype, np.number):
+            entries[name] = value.item()
+
+    return entries
+
+
+def solver_statistics(cadet: Any) -> dict[str, float]:
+    """
+    Return the solver statistics of a CADET simulation.
+
+    The meta data is read from the output of the command line interface and from
+    `root.meta`, where the DLL interface stores it.
+
+    Parameters
+    ----------
+    cadet : Cadet
+        CADET-Python instance of the simulation, e.g. `CachedCadet.last_cadet`.
+
+    Returns
+    -------
+    dict[str, float]
+        Numeric entries of `output/statistics` and of the meta data, by name.
+
+    Raises
+    ------
+    CADETProcessError
+        If the output contains no statistics. The DLL interface of CADET-Python
+        does not return them, and older CADET versions do not support
+        `write_solver_statistics`.
+    """
+    output = cadet.root.output
+    if "statistics" not in output:
+        raise CADETProcessError(
+            "CADET returned no solver statistics. They are only returned by the "
+            "command line interface (`use_dll=False`) of CADET versions that "
+            "support `return/write_solver_statistics`."
+        )
+
+    statistics = _numeric_entries(output.statistics, "statistics.")
+    for meta in (output.get("meta", {}), cadet.root.get("meta", {})):
+        statistics.update(_numeric_entries(meta, "meta."))
+
+    return statistics
+
+
+def peak_rss() -> float:
+    """
+    Return the peak resident set size of this process and its children.
+
+    Returns
+    -------
+    float
+        Peak resident set size in MiB.
+    """
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
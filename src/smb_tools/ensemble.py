@@ -0,0 +1,595 @@
+"""
+Monte Carlo ensembles of carousel processes under parameter uncertainty.
+
+Uncertain column parameters, e.g. the Henry coefficients, the bed porosity and the
+axial dispersion, are sampled with a seeded Latin hypercube or Sobol design. Every
+member is built by a case study factory, modified with its sampled values and
+simulated in a worker process. Only the KPIs and the per-period mean outlet
+concentrations of the last cycle are sent back, where they are accumulated into
+streaming statistics. The memory of the ensemble therefore does not grow with the
+number of members.
+
+Quantiles are estimated from a reservoir of members. The reservoir keeps the
+members with the smallest random keys, which are derived from the seed and the
+member index, so the statistics do not depend on the order in which the workers
+finish.
+"""
+
+import heapq
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.log import get_logger
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Process
+from scipy.stats import qmc
+
+from .case_studies import create_simulator, default_n_threads
+from .kpi import carousel_kpis
+from .periods import period_statistics
+from .stationarity import simulate_to_css
+from .sweep import _ColumnWriter, _initialize_worker
+
+__all__ = [
+    "UncertainParameter",
+    "default_uncertainties",
+    "sample_parameters",
+    "apply_parameters",
+    "evaluate_member",
+    "EnsembleStatistics",
+    "EnsembleSummary",
+    "run_ensemble",
+]
+
+logger = get_logger("Ensemble")
+
+
+@dataclass
+class UncertainParameter:
+    """
+    Uniformly distributed parameter of the carousel columns.
+
+    Attributes
+    ----------
+    name : str
+        Name of the parameter in the results.
+    parameter : str
+        Path of the parameter relative to the column, e.g. `bed_porosity` or
+        `binding_model.adsorption_rate`.
+    low : float
+        Lower bound.
+    high : float
+        Upper bound.
+    component : int, optional
+        Index of the component of a component-specific parameter.
+    """
+
+    name: str
+    parameter: str
+    low: float
+    high: float
+    component: Optional[int] = None
+
+
+def default_uncertainties(
+    builder: CarouselBuilder,
+    henry: float = 0.1,
+    porosity: float = 0.05,
+    dispersion: float = 0.3,
+) -> list[UncertainParameter]:
+    """
+    Return relative bounds around the nominal parameters of a case study.
+
+    The Henry coefficients are varied through the adsorption rates.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Builder of the case study.
+    henry : float, optional
+        Relative uncertainty of the Henry coefficients. The default is 0.1.
+    porosity : float, optional
+        Relative uncertainty of the bed (or total) porosity. The default is 0.05.
+    dispersion : float, optional
+        Relative uncertainty of the axial dispersion. The default is 0.3.
+
+    Returns
+    -------
+    list[UncertainParameter]
+        Uncertain parameters with bounds `nominal * (1 -/+ uncertainty)`.
+    """
+    column = builder.column
+    uncertainties = []
+    for i, (component, rate) in enumerate(
+        zip(builder.component_system.names, column.binding_model.adsorption_rate)
+    ):
+        uncertainties.append(
+            UncertainParameter(
+                f"adsorption_rate_{component}",
+                "binding_model.adsorption_rate",
+                rate * (1 - henry),
+                rate * (1 + henry),
+                component=i,
+            )
+        )
+
+    # Columns without pores only have a total porosity.
+    porosity_parameter = (
+        "bed_porosity" if "bed_porosity" in column.parameters else "total_porosity"
+    )
+    for parameter, uncertainty in (
+        (porosity_parameter, porosity),
+        ("axial_dispersion", dispersion),
+    ):
+        nominal = float(np.ravel(getattr(column, parameter))[0])
+        uncertainties.append(
+            UncertainParameter(
+                parameter,
+                parameter,
+                nominal * (1 - uncertainty),
+                nominal * (1 + uncertainty),
+            )
+        )
+
+    return uncertainties
+
+
+def sample_parameters(
+    uncertainties: list[UncertainParameter],
+    n_samples: int,
+    method: str = "lhs",
+    seed: Optional[int] = 0,
+) -> np.ndarray:
+    """
+    Draw samples of the uncertain parameters.
+
+    Parameters
+    ----------
+    uncertainties : list[UncertainParameter]
+        Uncertain parameters.
+    n_samples : int
+        Number of samples. For Sobol sampling, powers of two keep the balance
+        properties of the sequence.
+    method : str, optional
+        'lhs' for Latin hypercube, 'sobol' for a scrambled Sobol sequence or
+        'random' for independent uniform samples. The default is 'lhs'.
+    seed : int, optional
+        Seed of the sampler. The default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        Samples with shape (n_samples, n_parameters).
+
+    Raises
+    ------
+    CADETProcessError
+        If the method is unknown.
+    """
+    n_dim = len(uncertainties)
+    if method == "lhs":
+        unit = qmc.LatinHypercube(n_dim, rng=seed).random(n_samples)
+    elif method == "sobol":
+        unit = qmc.Sobol(n_dim, rng=seed).random(n_samples)
+    elif method == "random":
+        unit = np.random.default_rng(seed).random((n_samples, n_dim))
+    else:
+        raise CADETProcessError(f"Unknown sampling method {method}.")
+
+    return qmc.scale(
+        unit,
+        [uncertainty.low for uncertainty in uncertainties],
+        [uncertainty.high for uncertainty in uncertainties],
+    )
+
+
+def _set_parameter(unit: Any, uncertainty: UncertainParameter, value: float) -> None:
+    """Set a (possibly nested and component-specific) parameter of a column."""
+    *path, name = uncertainty.parameter.split(".")
+    for attribute in path:
+        unit = getattr(unit, attribute)
+
+    if uncertainty.component is None:
+        setattr(unit, name, value)
+    else:
+        values = [float(v) for v in np.ravel(getattr(unit, name))]
+        values[uncertainty.component] = value
+        setattr(unit, name, values)
+
+
+def apply_parameters(
+    process: Process,
+    builder: CarouselBuilder,
+    uncertainties: list[UncertainParameter],
+    values: np.ndarray,
+) -> None:
+    """
+    Set sampled parameters on all columns of a carousel process.
+
+    The column of the builder is modified as well, such that KPIs normalized by the
+    column properties are consistent.
+
+    Parameters
+    ----------
+    process : Process
+        Carousel process with columns named `column_<i>`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    uncertainties : list[UncertainParameter]
+        Uncertain parameters.
+    values : np.ndarray
+        Value of every uncertain parameter.
+    """
+    columns = [builder.column] + [
+        unit for unit in process.flow_sheet.units if unit.name.startswith("column_")
+    ]
+    for uncertainty, value in zip(uncertainties, values):
+        for column in columns:
+            _set_parameter(column, uncertainty, float(value))
+
+
+def evaluate_member(
+    factory: Callable,
+    point: dict[str, Any],
+    uncertainties: list[UncertainParameter],
+    values: np.ndarray,
+    targets: dict[str, str],
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+) -> dict[str, Any]:
+    """
+    Simulate a single ensemble member.
+
+    Parameters
+    ----------
+    factory : Callable
+        Case study factory returning process and builder, e.g. `four_zone_binary`.
+    point : dict[str, Any]
+        Keyword arguments of the factory.
+    uncertainties : list[UncertainParameter]
+        Uncertain parameters.
+    values : np.ndarray
+        Sampled value of every uncertain parameter.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`.
+    css_options : dict, optional
+        If given, the process is simulated until cyclic steady state using
+        `simulate_to_css` with these keyword arguments. Otherwise, the number of
+        cycles of the simulator is simulated.
+
+    Returns
+    -------
+    dict[str, Any]
+        KPIs of the last cycle and the mean concentration of every outlet in every
+        switch period of the last cycle, named `<outlet>.mean`, with shape
+        (n_switches, n_comp).
+    """
+    process, builder = factory(**point)
+    apply_parameters(process, builder, uncertainties, values)
+    process_simulator = create_simulator(**(simulator_options or {}))
+
+    if css_options is None:
+        simulation_results = process_simulator.simulate(process)
+    else:
+        simulation_results, _ = simulate_to_css(
+            process_simulator, process, builder, **css_options
+        )
+
+    outputs: dict[str, Any] = carousel_kpis(simulation_results, builder, targets)
+    statistics = period_statistics(simulation_results, builder)
+    for outlet, mean in statistics.mean.items():
+        outputs[f"{outlet}.mean"] = mean[-builder.n_columns :]
+    outputs["time_elapsed"] = float(simulation_results.time_elapsed)
+
+    return outputs
+
+
+class EnsembleStatistics:
+    """
+    Streaming statistics of ensemble outputs.
+
+    Mean and standard deviation are updated with Welford's algorithm. Quantiles
+    are computed from a reservoir of at most `reservoir_size` members, and KPIs in
+    [0, 1] (purity and recovery) are additionally counted in histograms.
+
+    Parameters
+    ----------
+    quantiles : tuple[float, ...], optional
+        Quantiles to report. The default is (0.05, 0.5, 0.95).
+    reservoir_size : int, optional
+        Number of members kept for the quantiles. The default is 1000.
+    n_bins : int, optional
+        Number of bins of the KPI histograms. The default is 50.
+    seed : int, optional
+        Seed of the reservoir keys. The default is 0.
+    """
+
+    def __init__(
+        self,
+        quantiles: tuple[float, ...] = (0.05, 0.5, 0.95),
+        reservoir_size: int = 1000,
+        n_bins: int = 50,
+        seed: Optional[int] = 0,
+    ) -> None:
+        self.quantile_levels = tuple(quantiles)
+        self.reservoir_size = reservoir_size
+        self.bin_edges = np.linspace(0, 1, n_bins + 1)
+        self.seed = seed
+
+        self.n = 0
+        self._mean: dict[str, np.ndarray] = {}
+        self._m2: dict[str, np.ndarray] = {}
+        self._counts: dict[str, np.ndarray] = {}
+        self._reservoir: list[tuple[float, int, dict[str, np.ndarray]]] = []
+
+    def _key(self, index: int) -> float:
+        """Random key of a member, independent of the order of updates."""
+        return float(np.random.default_rng([self.seed or 0, index]).random())
+
+    def update(self, index: int, outputs: dict[str, Any]) -> None:
+        """
+        Add the outputs of a member.
+
+        Parameters
+        ----------
+        index : int
+            Index of the member.
+        outputs : dict[str, Any]
+            Scalar or array outputs of the member, see `evaluate_member`.
+        """
+        outputs = {
+            name: np.asarray(value, dtype=float) for name, value in outputs.items()
+        }
+        self.n += 1
+        for name, value in outputs.items():
+            if name not in self._mean:
+                self._mean[name] = np.zeros_like(value)
+                self._m2[name] = np.zeros_like(value)
+            delta = value - self._mean[name]
+            self._mean[name] += delta / self.n
+            self._m2[name] += delta * (value - self._mean[name])
+
+            if name.endswith((".purity", ".recovery")):
+                counts = self._counts.setdefault(
+                    name, np.zeros(len(self.bin_edges) - 1, dtype=int)
+                )
+                counts += np.histogram(np.clip(value, 0, 1), self.bin_edges)[0]
+
+        # Keep the members with the smallest keys (max-heap of negated keys).
+        entry = (-self._key(index), index, outputs)
+        if len(self._reservoir) < self.reservoir_size:
+            heapq.heappush(self._reservoir, entry)
+        elif entry[0] > self._reservoir[0][0]:
+            heapq.heapreplace(self._reservoir, entry)
+
+    @property
+    def names(self) -> list[str]:
+        """list[str]: Names of all outputs."""
+        return list(self._mean)
+
+    def mean(self, name: str) -> np.ndarray:
+        """np.ndarray: Ensemble mean of an output."""
+        return self._mean[name].copy()
+
+    def std(self, name: str) -> np.ndarray:
+        """np.ndarray: Sample standard deviation of an output."""
+        if self.n < 2:
+            return np.full_like(self._mean[name], np.nan)
+        return np.sqrt(self._m2[name] / (self.n - 1))
+
+    def quantiles(self, name: str) -> np.ndarray:
+        """np.ndarray: Quantiles of an output with shape (n_quantiles, ...)."""
+        values = np.stack([outputs[name] for _, _, outputs in self._reservoir])
+        return np.nanquantile(values, self.quantile_levels, axis=0)
+
+    def histogram(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """tuple[np.ndarray, np.ndarray]: Counts and bin edges of a KPI in [0, 1]."""
+        return self._counts[name].copy(), self.bin_edges.copy()
+
+    def summary(self) -> dict[str, dict[str, np.ndarray]]:
+        """
+        Return mean, standard deviation and quantiles of all outputs.
+
+        Returns
+        -------
+        dict[str, dict[str, np.ndarray]]
+            Statistics of every output, keyed `mean`, `std` and `q<level>`.
+        """
+        summary = {}
+        for name in self.names:
+            summary[name] = {"mean": self.mean(name), "std": self.std(name)}
+            for level, value in zip(self.quantile_levels, self.quantiles(name)):
+                summary[name][f"q{level:g}"] = value
+
+        return summary
+
+
+@dataclass
+class EnsembleSummary:
+    """
+    Summary of a finished ensemble.
+
+    Attributes
+    ----------
+    samples : np.ndarray
+        Sampled parameters with shape (n_samples, n_parameters).
+    statistics : EnsembleStatistics
+        Streaming statistics of all succeeded members.
+    n_succeeded : int
+        Number of members that were simulated successfully.
+    n_failed : int
+        Number of members that failed.
+    time_elapsed : float
+        Wall time of the ensemble in s.
+    file_path : Path, optional
+        Path of the file with the parameters and KPIs of every member.
+    """
+
+    samples: np.ndarray
+    statistics: EnsembleStatistics
+    n_succeeded: int
+    n_failed: int
+    time_elapsed: float
+    file_path: Optional[Path] = None
+
+
+def run_ensemble(
+    factory: Callable,
+    uncertainties: list[UncertainParameter],
+    n_samples: int,
+    targets: dict[str, str],
+    point: Optional[dict[str, Any]] = None,
+    method: str = "lhs",
+    seed: Optional[int] = 0,
+    file_path: Optional[str | Path] = None,
+    n_workers: Optional[int] = None,
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+    statistics: Optional[EnsembleStatistics] = None,
+) -> EnsembleSummary:
+    """
+    Simulate a Monte Carlo ensemble in parallel with streaming statistics.
+
+    At most two members per worker are queued at any time, and the outputs of every
+    member are discarded after they have been added to the statistics. If a file
+    path is given, the sampled parameters, the status and the scalar KPIs of every
+    member are appended to an HDF5 file as in `run_sweep`.
+
+    Parameters
+    ----------
+    factory : Callable
+        Module-level case study factory, e.g. `four_zone_binary`.
+    uncertainties : list[UncertainParameter]
+        Uncertain parameters, e.g. from `default_uncertainties`.
+    n_samples : int
+        Number of members.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    point : dict[str, Any], optional
+        Keyword arguments of the factory for all members.
+    method : str, optional
+        Sampling method, see `sample_parameters`. The default is 'lhs'.
+    seed : int, optional
+        Seed of the samples and the quantile reservoir. The default is 0.
+    file_path : str or Path, optional
+        Path of the HDF5 file with one row per member.
+    n_workers : int, optional
+        Number of worker processes. If None, all CPUs are used.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`. Unless `n_threads` is given, the
+        cores are divided among the workers, see `default_n_threads`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`. If None, a fixed number of cycles
+        is simulated.
+    statistics : EnsembleStatistics, optional
+        Accumulator of the statistics. If None, the defaults are used with `seed`.
+
+    Returns
+    -------
+    EnsembleSummary
+        Samples, statistics and number of succeeded and failed members.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    simulator_options = {
+        "n_threads": default_n_threads(n_workers),
+        **(simulator_options or {}),
+    }
+    point = point or {}
+    if statistics is None:
+        statistics = EnsembleStatistics(seed=seed)
+
+    samples = sample_parameters(uncertainties, n_samples, method, seed)
+    names = [uncertainty.name for uncertainty in uncertainties]
+
+    writer = None
+    if file_path is not None:
+        file_path = Path(file_path)
+        writer = _ColumnWriter(
+            file_path,
+            {
+                "factory": factory.__name__,
+                "targets": str(targets),
+                "method": method,
+                "seed": str(seed),
+            },
+        )
+    counts = {"ok": 0, "failed": 0}
+
+    def record(index: int, status: str, values: dict) -> None:
+        counts[status] += 1
+        if writer is not None:
+            writer.append(
+                {
+                    "member": index,
+                    **dict(zip(names, samples[index])),
+                    "status": status,
+                    **values,
+                }
+            )
+
+    pending = iter(range(n_samples))
+    in_flight: dict[Future, int] = {}
+
+    start = time.time()
+    executor = ProcessPoolExecutor(n_workers, initializer=_initialize_worker)
+    try:
+        while True:
+            for index in pending:
+                future = executor.submit(
+                    evaluate_member,
+                    factory,
+                    point,
+                    uncertainties,
+                    samples[index],
+                    targets,
+                    simulator_options,
+                    css_options,
+                )
+                in_flight[future] = index
+                if len(in_flight) >= 2 * n_workers:
+                    break
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                try:
+                    outputs = future.result()
+                except Exception as e:
+                    logger.error(f"Member {index} failed ({e}).")
+                    record(index, "failed", {"error": str(e)})
+                    continue
+
+                statistics.update(index, outputs)
+                record(
+                    index,
+                    "ok",
+                    {
+                        name: value
+                        for name, value in outputs.items()
+                        if np.ndim(value) == 0
+                    },
+                )
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if writer is not None:
+            writer.close()
+
+    return EnsembleSummary(
+        samples=samples,
+        statistics=statistics,
+        n_succeeded=counts["ok"],
+        n_failed=counts["failed"],
+        time_elapsed=time.time() - start,
+        file_path=file_path,
+    )
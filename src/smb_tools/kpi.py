@@ -0,0 +1,163 @@
+"""
+Performance indicators of carousel processes.
+
+Purity, recovery and productivity of the product outlets are evaluated over a
+window of switch periods at the end of a simulation, typically the last cycle at
+cyclic steady state.
+"""
+
+from typing import Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.simulationResults import SimulationResults
+from scipy.integrate import trapezoid
+
+from .carousel import zone_layouts
+
+__all__ = [
+    "outlet_flow_rates",
+    "feed_mass_flow",
+    "integrate_window",
+    "carousel_kpis",
+]
+
+
+def outlet_flow_rates(builder: CarouselBuilder) -> dict[str, float]:
+    """
+    Return the flow rate of every external outlet.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+
+    Returns
+    -------
+    dict[str, float]
+        Flow rate of every outlet in m^3 / s.
+    """
+    flow_rates = {}
+    for layout in zone_layouts(builder):
+        flow_rates.update(layout.outlets)
+
+    return flow_rates
+
+
+def feed_mass_flow(builder: CarouselBuilder) -> np.ndarray:
+    """
+    Return the component mass flow entering the carousel through all inlets.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+
+    Returns
+    -------
+    np.ndarray
+        Mass flow of every component in mol / s.
+    """
+    n_comp = builder.component_system.n_comp
+
+    return sum(
+        (layout.inlet_mass_flow(n_comp) for layout in zone_layouts(builder)),
+        np.zeros(n_comp),
+    )
+
+
+def integrate_window(
+    time: np.ndarray,
+    solution: np.ndarray,
+    t_start: float,
+    t_end: float,
+) -> np.ndarray:
+    """
+    Integrate a solution over a time window with the trapezoidal rule.
+
+    The solution is interpolated at the window boundaries.
+
+    Parameters
+    ----------
+    time : np.ndarray
+        Time points of the solution.
+    solution : np.ndarray
+        Solution with shape (n_time, ...).
+    t_start : float
+        Start of the window.
+    t_end : float
+        End of the window.
+
+    Returns
+    -------
+    np.ndarray
+        Integral with shape (...).
+    """
+    solution = np.asarray(solution)
+    mask = (time > t_start) & (time < t_end)
+    grid = np.concatenate(([t_start], time[mask], [t_end]))
+
+    flat = solution.reshape(len(time), -1)
+    values = np.stack([np.interp(grid, time, c) for c in flat.T], axis=-1)
+
+    return trapezoid(values, grid, axis=0).reshape(solution.shape[1:])
+
+
+def carousel_kpis(
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+    targets: dict[str, str],
+    n_switches: Optional[int] = None,
+) -> dict[str, float]:
+    """
+    Compute purity, recovery and productivity of the product outlets.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the carousel process.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    n_switches : int, optional
+        Number of switch periods at the end of the simulation that are evaluated.
+        If None, the last cycle is evaluated.
+
+    Returns
+    -------
+    dict[str, float]
+        KPIs named `<outlet>.purity`, `<outlet>.recovery` and
+        `<outlet>.productivity`. Productivity is given in mol per second and cubic
+        meter of stationary phase.
+    """
+    if n_switches is None:
+        n_switches = builder.n_columns
+
+    time = simulation_results.time_complete
+    t_end = np.floor(time[-1] / builder.switch_time + 1e-9) * builder.switch_time
+    t_start = t_end - n_switches * builder.switch_time
+    if t_start < -1e-9:
+        raise CADETProcessError("Simulation is shorter than the evaluation window.")
+    duration = t_end - t_start
+
+    component_names = list(builder.component_system.names)
+    flow_rates = outlet_flow_rates(builder)
+    fed = feed_mass_flow(builder) * duration
+    volume_solid = builder.n_columns * builder.column.volume_solid
+
+    kpis = {}
+    for outlet, component in targets.items():
+        i_comp = component_names.index(component)
+        solution = simulation_results.solution[outlet].inlet.solution
+        mass = flow_rates[outlet] * integrate_window(time, solution, t_start, t_end)
+
+        total = np.sum(mass)
+        kpis[f"{outlet}.purity"] = mass[i_comp] / total if total > 0 else np.nan
+        kpis[f"{outlet}.recovery"] = (
+            mass[i_comp] / fed[i_comp] if fed[i_comp] > 0 else np.nan
+        )
+        kpis[f"{outlet}.productivity"] = mass[i_comp] / (duration * volume_solid)
+
+    return {key: float(value) for key, value in kpis.items()}
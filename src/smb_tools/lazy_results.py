@@ -0,0 +1,360 @@
+"""
+Lazy access to simulation results stored in chunked HDF5 files.
+
+`SimulationResults` holds every solution as an in-memory array, and unit conversions
+such as `np.multiply(solution, molar_mass)` create further full copies. Here, the
+solutions are written once to a chunked HDF5 file. `LazyResults` then returns
+`LazyArray` views that only read the requested time window or switch period from
+disk. Unit conversions are stored with the view and applied when the data is read.
+"""
+
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.simulationResults import SimulationResults
+
+__all__ = ["save_results", "LazyArray", "LazySolution", "LazyResults"]
+
+_CHUNK_BYTES = 2**20
+"""int: Approximate size of a chunk in bytes."""
+
+
+def _chunk_shape(shape: tuple[int, ...], itemsize: int) -> tuple[int, ...]:
+    """Return chunks spanning all but the time axis with about `_CHUNK_BYTES`."""
+    row_bytes = itemsize * int(np.prod(shape[1:], dtype=int))
+    n_rows = max(1, min(shape[0], _CHUNK_BYTES // max(row_bytes, 1)))
+
+    return (n_rows, *shape[1:])
+
+
+def save_results(
+    simulation_results: SimulationResults,
+    file_path: str | Path,
+    builder: Optional[CarouselBuilder] = None,
+    compression: Optional[str] = None,
+) -> None:
+    """
+    Write all solutions of a simulation to a chunked HDF5 file.
+
+    Every solution is stored in the group `<unit>/<solution_type>` with the datasets
+    `time` and `solution`. The solutions are chunked along the time axis such that
+    time windows can be read without loading the complete array.
+
+    The results are not streamed: the complete `SimulationResults` must be in
+    memory, so the peak memory of the run that produces the file is not reduced.
+    Only later analyses that open the file with `LazyResults` save memory. To limit
+    the memory of the simulation itself, see `simulate_recorded`.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results to store.
+    file_path : str or Path
+        Path of the HDF5 file. An existing file is overwritten.
+    builder : CarouselBuilder, optional
+        Builder the process was created with. If given, switch time and cycle time
+        are stored such that `LazyResults.switch` can be used.
+    compression : str, optional
+        HDF5 compression filter, e.g. 'gzip'. Compression reduces the file size at
+        the cost of slower access.
+    """
+    with h5py.File(file_path, "w") as file:
+        file.create_dataset("time", data=simulation_results.time_complete)
+        file.attrs["time_elapsed"] = simulation_results.time_elapsed
+        if builder is not None:
+            file.attrs["switch_time"] = builder.switch_time
+            file.attrs["cycle_time"] = builder.cycle_time
+
+        for unit, solutions in simulation_results.solution.items():
+            for solution_type, solution in solutions.items():
+                if not hasattr(solution, "solution"):
+                    continue
+                data = np.asarray(solution.solution)
+                group = file.create_group(f"solution/{unit}/{solution_type}")
+                group.create_dataset("time", data=solution.time)
+                group.create_dataset(
+                    "solution",
+                    data=data,
+                    chunks=_chunk_shape(data.shape, data.dtype.itemsize),
+                    compression=compression,
+                )
+
+
+class LazyArray:
+    """
+    View on a dataset that is read from disk when indexed.
+
+    The view covers a contiguous range of time indices (the first axis) and can
+    carry a factor that is multiplied with the last axis on access, e.g. the molar
+    masses of the components.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        Dataset with the time as first axis.
+    start : int, optional
+        First time index of the view.
+    stop : int, optional
+        Time index after the last one of the view.
+    scale : npt.ArrayLike, optional
+        Factor that is multiplied with the data on access.
+    """
+
+    def __init__(
+        self,
+        dataset: h5py.Dataset,
+        start: int = 0,
+        stop: Optional[int] = None,
+        scale: Optional[npt.ArrayLike] = None,
+    ) -> None:
+        self.dataset = dataset
+        self.start = start
+        self.stop = dataset.shape[0] if stop is None else stop
+        self.scale = None if scale is None else np.asarray(scale)
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        """tuple: Shape of the view."""
+        return (self.stop - self.start, *self.dataset.shape[1:])
+
+    @property
+    def ndim(self) -> int:
+        """int: Number of dimensions."""
+        return self.dataset.ndim
+
+    @property
+    def dtype(self) -> np.dtype:
+        """np.dtype: Data type of the view."""
+        if self.scale is None:
+            return self.dataset.dtype
+        return np.result_type(self.dataset.dtype, self.scale)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.dataset.name}, shape={self.shape})"
+
+    def __getitem__(self, key: Any) -> np.ndarray:
+        key = key if isinstance(key, tuple) else (key,)
+        time_key, other_keys = (key[0], key[1:]) if key else (slice(None), ())
+
+        if isinstance(time_key, slice):
+            start, stop, step = time_key.indices(len(self))
+            data = self.dataset[self.start + start : self.start + stop : step]
+            other_keys = (slice(None), *other_keys)
+        elif isinstance(time_key, (int, np.integer)):
+            index = range(len(self))[time_key]
+            data = self.dataset[self.start + index]
+        else:
+            # Fancy indexing requires increasing indices in h5py.
+            indices = np.arange(len(self))[time_key] + self.start
+            unique, inverse = np.unique(indices, return_inverse=True)
+            data = self.dataset[unique][inverse]
+            other_keys = (slice(None), *other_keys)
+
+        if self.scale is not None:
+            data = data * self.scale
+
+        return data[other_keys] if other_keys else data
+
+    def __array__(self, dtype: Any = None, copy: Any = None) -> np.ndarray:
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def window(self, start: int, stop: int) -> "LazyArray":
+        """Return a view on the time indices from `start` to `stop` of this view."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return LazyArray(
+            self.dataset, self.start + start, self.start + stop, self.scale
+        )
+
+    def scaled(self, scale: npt.ArrayLike) -> "LazyArray":
+        """Return a view that multiplies the data with `scale` on access."""
+        scale = np.asarray(scale)
+        if self.scale is not None:
+            scale = self.scale * scale
+        return LazyArray(self.dataset, self.start, self.stop, scale)
+
+    def blocks(self, size: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        Iterate over the view in blocks along the time axis.
+
+        Parameters
+        ----------
+        size : int, optional
+            Number of time points per block. If None, the chunk size of the dataset
+            is used.
+
+        Yields
+        ------
+        np.ndarray
+            Consecutive blocks of the view.
+        """
+        if size is None:
+            size = self.dataset.chunks[0] if self.dataset.chunks else len(self)
+        for start in range(0, len(self), size):
+            yield self[start : start + size]
+
+
+class LazySolution:
+    """
+    Time and solution of one unit with lazy access.
+
+    Parameters
+    ----------
+    time : np.ndarray
+        Time points of the view.
+    solution : LazyArray
+        Solution of the view.
+    """
+
+    def __init__(self, time: np.ndarray, solution: LazyArray) -> None:
+        self.time = time
+        self.solution = solution
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(shape={self.solution.shape})"
+
+    def _time_indices(self, t_start: float, t_end: float) -> tuple[int, int]:
+        """Return the range of time indices with t_start <= t <= t_end."""
+        start = int(np.searchsorted(self.time, t_start, side="left"))
+        stop = int(np.searchsorted(self.time, t_end, side="right"))
+
+        return start, stop
+
+    def window(self, t_start: float, t_end: float) -> "LazySolution":
+        """
+        Return a view on the time points in [t_start, t_end].
+
+        Parameters
+        ----------
+        t_start : float
+            Start time of the window.
+        t_end : float
+            End time of the window.
+
+        Returns
+        -------
+        LazySolution
+            View on the window. No data is read.
+        """
+        start, stop = self._time_indices(t_start, t_end)
+        return LazySolution(self.time[start:stop], self.solution.window(start, stop))
+
+    def scaled(self, scale: npt.ArrayLike) -> "LazySolution":
+        """Return a view that multiplies the solution with `scale` on access."""
+        return LazySolution(self.time, self.solution.scaled(scale))
+
+
+class LazyResults:
+    """
+    Simulation results stored with `save_results`, read on demand.
+
+    Only the time vectors are loaded when opening the file. Solutions are returned
+    as `LazySolution` views. The file stays open until `close` is called or the
+    context manager exits.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Path of the HDF5 file.
+
+    Examples
+    --------
+    >>> with LazyResults("results.h5") as results:
+    ...     raffinate = results.solution("raffinate").scaled(molar_mass)
+    ...     last_switch = results.switch(-1, "raffinate").solution[:]
+    """
+
+    def __init__(self, file_path: str | Path) -> None:
+        self.file = h5py.File(file_path, "r")
+        self.time = self.file["time"][()]
+        self.time_elapsed = float(self.file.attrs["time_elapsed"])
+        self.switch_time = self.file.attrs.get("switch_time")
+        self.cycle_time = self.file.attrs.get("cycle_time")
+
+    def __enter__(self) -> "LazyResults":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the file."""
+        self.file.close()
+
+    @property
+    def units(self) -> list[str]:
+        """list[str]: Names of all units with stored solutions."""
+        return list(self.file["solution"])
+
+    def solution_types(self, unit: str) -> list[str]:
+        """Return the names of all stored solutions of a unit."""
+        return list(self.file[f"solution/{unit}"])
+
+    def solution(self, unit: str, solution_type: str = "inlet") -> LazySolution:
+        """
+        Return a lazy view on the solution of a unit.
+
+        Parameters
+        ----------
+        unit : str
+            Name of the unit.
+        solution_type : str, optional
+            Type of the solution, e.g. 'inlet', 'outlet' or 'bulk'. The default is
+            'inlet'.
+
+        Returns
+        -------
+        LazySolution
+            View on the complete solution. No data is read.
+        """
+        try:
+            group = self.file[f"solution/{unit}/{solution_type}"]
+        except KeyError:
+            raise CADETProcessError(f"No {solution_type} solution of unit {unit}.")
+
+        return LazySolution(group["time"][()], LazyArray(group["solution"]))
+
+    @property
+    def n_switches(self) -> int:
+        """int: Number of complete switch periods."""
+        if self.switch_time is None:
+            raise CADETProcessError("Results were stored without switch time.")
+        return int(np.floor(self.time[-1] / self.switch_time + 1e-9))
+
+    def switch(
+        self,
+        index: int,
+        unit: str,
+        solution_type: str = "inlet",
+    ) -> LazySolution:
+        """
+        Return a lazy view on one switch period of the solution of a unit.
+
+        Parameters
+        ----------
+        index : int
+            Index of the switch period. Negative values count from the end.
+        unit : str
+            Name of the unit.
+        solution_type : str, optional
+            Type of the solution. The default is 'inlet'.
+
+        Returns
+        -------
+        LazySolution
+            View on the switch period including both boundaries.
+        """
+        index = range(self.n_switches)[index]
+        t_start = index * self.switch_time
+
+        return self.solution(unit, solution_type).window(
+            t_start, t_start + self.switch_time
+        )
@@ -0,0 +1,277 @@
+"""
+Multi-fidelity simulation of carousel processes to cyclic steady state.
+
+Most cycles of a carousel simulation are spent on the start-up transient, for which
+a coarse discretization and loose tolerances suffice. Here, a coarse copy of the
+process is simulated until approximate CSS. Its final state is then interpolated
+onto the discretization of the process, which is only simulated for the last few
+cycles at full fidelity.
+"""
+
+import copy
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Process
+from CADETProcess.simulationResults import SimulationResults
+from CADETProcess.simulator import Cadet
+
+from .kpi import carousel_kpis
+from .state import interpolate_state
+from .stationarity import CSSReport, simulate_to_css, switch_period_profiles
+
+__all__ = [
+    "MultiFidelityReport",
+    "coarse_copy",
+    "compare_results",
+    "simulate_multifidelity",
+]
+
+
+@dataclass
+class MultiFidelityReport:
+    """
+    Cost and accuracy of a multi-fidelity run.
+
+    Attributes
+    ----------
+    coarse_discretization : dict[str, int]
+        Discretization of the coarse stage.
+    coarse_css : CSSReport
+        Convergence report of the coarse stage.
+    n_cycles_coarse : int
+        Number of cycles simulated on the coarse grid.
+    n_cycles_fine : int
+        Number of cycles simulated at full fidelity.
+    time_coarse : float
+        Simulation time of the coarse stage in s.
+    time_fine : float
+        Simulation time of the fine stage in s.
+    final_difference : float
+        Relative difference of the outlet profiles of the last two switch periods
+        of the fine stage. This indicates how far the result is from CSS.
+    reference_error : dict[str, float] or None
+        Errors against a full-fidelity reference, see `compare_results`.
+    time_reference : float or None
+        Simulation time of the full-fidelity reference in s.
+    """
+
+    coarse_discretization: dict[str, int]
+    coarse_css: CSSReport
+    n_cycles_coarse: int
+    n_cycles_fine: int
+    time_coarse: float
+    time_fine: float
+    final_difference: float
+    reference_error: Optional[dict[str, float]] = None
+    time_reference: Optional[float] = None
+
+    @property
+    def time_elapsed(self) -> float:
+        """float: Total simulation time of both stages in s."""
+        return self.time_coarse + self.time_fine
+
+    @property
+    def speedup(self) -> Optional[float]:
+        """float or None: Simulation time of the reference over the total time."""
+        if self.time_reference is None:
+            return None
+        return self.time_reference / self.time_elapsed
+
+
+def coarse_copy(
+    builder: CarouselBuilder,
+    discretization: dict[str, int],
+) -> tuple[Process, CarouselBuilder]:
+    """
+    Build a copy of a carousel process with a different column discretization.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Builder of the process.
+    discretization : dict[str, int]
+        Discretization parameters of the column, e.g. `{"ncol": 10}`.
+
+    Returns
+    -------
+    tuple[Process, CarouselBuilder]
+        Process and builder with the modified discretization.
+    """
+    builder = copy.deepcopy(builder)
+    for name, value in discretization.items():
+        setattr(builder.column.discretization, name, value)
+
+    return builder.build_process(), builder
+
+
+def compare_results(
+    simulation_results: SimulationResults,
+    reference_results: SimulationResults,
+    builder: CarouselBuilder,
+    targets: Optional[dict[str, str]] = None,
+    n_points: int = 100,
+) -> dict[str, float]:
+    """
+    Compare the last cycle of a carousel simulation with a reference.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results to check.
+    reference_results : SimulationResults
+        Reference results of the same process.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    targets : dict[str, str], optional
+        Name of the target component of every product outlet. If given, the
+        absolute errors of the KPIs of the last cycle are included.
+    n_points : int, optional
+        Number of samples per switch period. The default is 100.
+
+    Returns
+    -------
+    dict[str, float]
+        Relative L2 error of the outlet profiles of the last cycle ('profiles')
+        and the absolute error of every KPI.
+    """
+    n_switches = builder.n_columns
+    profiles = switch_period_profiles(simulation_results, builder, n_points=n_points)
+    reference = switch_period_profiles(reference_results, builder, n_points=n_points)
+
+    errors = []
+    for outlet, profile in profiles.items():
+        last = profile[-n_switches:].ravel()
+        last_reference = reference[outlet][-n_switches:].ravel()
+        norm = max(np.linalg.norm(last_reference), np.finfo(float).tiny)
+        errors.append(np.linalg.norm(last - last_reference) / norm)
+
+    error = {"profiles": float(np.max(errors))}
+    if targets is not None:
+        kpis = carousel_kpis(simulation_results, builder, targets)
+        reference_kpis = carousel_kpis(reference_results, builder, targets)
+        for name, value in kpis.items():
+            error[name] = abs(value - reference_kpis[name])
+
+    return error
+
+
+def simulate_multifidelity(
+    process_simulator: Cadet,
+    process: Process,
+    builder: CarouselBuilder,
+    coarse_discretization: Optional[dict[str, int]] = None,
+    coarse_tolerances: Optional[dict[str, float]] = None,
+    n_cycles_fine: int = 2,
+    css_options: Optional[dict] = None,
+    reference: bool | SimulationResults = False,
+    targets: Optional[dict[str, str]] = None,
+) -> tuple[SimulationResults, MultiFidelityReport]:
+    """
+    Simulate to CSS on a coarse grid and finish with a few full-fidelity cycles.
+
+    Parameters
+    ----------
+    process_simulator : Cadet
+        Simulator with the time integrator settings of the fine stage.
+    process : Process
+        Process created by `builder.build_process()`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    coarse_discretization : dict[str, int], optional
+        Column discretization of the coarse stage. If None, a quarter of the axial
+        cells of the process (at least 5) is used.
+    coarse_tolerances : dict[str, float], optional
+        Time integrator parameters of the coarse stage, e.g. `{"reltol": 1e-4}`.
+        If None, the settings of the simulator are used.
+    n_cycles_fine : int, optional
+        Number of cycles simulated at full fidelity. The default is 2.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css` for the coarse stage.
+    reference : bool or SimulationResults, optional
+        If True, the process is additionally simulated to CSS at full fidelity
+        with `css_options`. Alternatively, existing reference results can be
+        passed. The final errors are reported in `reference_error`.
+    targets : dict[str, str], optional
+        Name of the target component of every product outlet, used for the KPI
+        errors against the reference.
+
+    Returns
+    -------
+    tuple[SimulationResults, MultiFidelityReport]
+        Results of the full-fidelity cycles and the report.
+    """
+    if coarse_discretization is None:
+        coarse_discretization = {
+            "ncol": max(5, builder.column.discretization.ncol // 4)
+        }
+    css_options = css_options or {}
+
+    coarse_process, coarse_builder = coarse_copy(builder, coarse_discretization)
+
+    parameters = process_simulator.time_integrator_parameters
+    tolerances_orig = {
+        name: getattr(parameters, name) for name in (coarse_tolerances or {})
+    }
+    try:
+        for name, value in (coarse_tolerances or {}).items():
+            setattr(parameters, name, value)
+        coarse_results, coarse_css = simulate_to_css(
+            process_simulator, coarse_process, coarse_builder, **css_options
+        )
+    finally:
+        for name, value in tolerances_orig.items():
+            setattr(parameters, name, value)
+
+    n_cycles_coarse = int(round(coarse_results.time_complete[-1] / process.cycle_time))
+
+    state, state_derivative = (
+        interpolate_state(coarse_process.flow_sheet, process.flow_sheet, state)
+        for state in (
+            coarse_results.system_state["state"],
+            coarse_results.system_state["state_derivative"],
+        )
+    )
+
+    n_cycles_orig = process_simulator.n_cycles
+    system_state_orig = process.system_state
+    system_state_derivative_orig = process.system_state_derivative
+    try:
+        process.system_state = state
+        process.system_state_derivative = state_derivative
+        simulation_results = process_simulator.simulate_n_cycles(process, n_cycles_fine)
+    finally:
+        process_simulator.n_cycles = n_cycles_orig
+        process.system_state = system_state_orig
+        process.system_state_derivative = system_state_derivative_orig
+
+    profiles = switch_period_profiles(simulation_results, builder)
+    last = {outlet: profile[-2:] for outlet, profile in profiles.items()}
+    final_difference = max(
+        np.linalg.norm(p[1] - p[0]) / max(np.linalg.norm(p[1]), np.finfo(float).tiny)
+        for p in last.values()
+    )
+
+    report = MultiFidelityReport(
+        coarse_discretization=coarse_discretization,
+        coarse_css=coarse_css,
+        n_cycles_coarse=n_cycles_coarse,
+        n_cycles_fine=n_cycles_fine,
+        time_coarse=float(coarse_results.time_elapsed),
+        time_fine=float(simulation_results.time_elapsed),
+        final_difference=float(final_difference),
+    )
+
+    if reference is True:
+        reference, _ = simulate_to_css(
+            process_simulator, process, builder, **css_options
+        )
+    if isinstance(reference, SimulationResults):
+        report.reference_error = compare_results(
+            simulation_results, reference, builder, targets
+        )
+        report.time_reference = float(reference.time_elapsed)
+
+    return simulation_results, report
@@ -0,0 +1,527 @@
+"""
+Parallel optimization of carousel operating points.
+
+Operating parameters such as the switch time, flow rates and split fractions are
+optimized with differential evolution. Every generation is evaluated on a process
+pool. Each candidate is simulated to CSS starting from the final state of the
+closest candidate that has already converged, which takes far fewer cycles than a
+start from the initial conditions once the population contracts. Candidates that
+have been evaluated before, up to a tolerance, are answered from a cache.
+
+Purity requirements are handled as constraints: feasible candidates are always
+ranked above infeasible ones, and infeasible candidates are ranked by their total
+purity deficit.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.log import get_logger
+from scipy.optimize import differential_evolution
+
+from .case_studies import create_simulator, default_n_threads
+from .kpi import carousel_kpis
+from .state import remap_carousel_state
+from .stationarity import simulate_to_css
+from .sweep import _initialize_worker
+
+__all__ = [
+    "evaluate_candidate",
+    "Evaluation",
+    "OptimizationResult",
+    "CarouselOptimizer",
+]
+
+logger = get_logger("Optimizer")
+
+_INFEASIBLE = 1e12
+"""float: Offset of the fitness of candidates violating the purity constraints."""
+
+_FAILED = 1e15
+"""float: Fitness of candidates whose simulation failed."""
+
+
+def evaluate_candidate(
+    factory: Callable,
+    point: dict[str, Any],
+    targets: dict[str, str],
+    initial_state: Optional[tuple[np.ndarray, np.ndarray]] = None,
+    desorbent_inlets: tuple[str, ...] = ("eluent",),
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+) -> dict[str, Any]:
+    """
+    Simulate a candidate to CSS and compute its KPIs.
+
+    Parameters
+    ----------
+    factory : Callable
+        Case study factory returning process and builder, e.g. `four_zone_binary`.
+    point : dict[str, Any]
+        Keyword arguments of the factory.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    initial_state : tuple[np.ndarray, np.ndarray], optional
+        State and state derivative at t = 0, e.g. the final state of another
+        candidate. If None, the initial conditions of the units are used.
+    desorbent_inlets : tuple[str, ...], optional
+        Inlets supplying desorbent. The default is ('eluent',).
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`.
+
+    Returns
+    -------
+    dict[str, Any]
+        KPIs including `productivity` (sum over all targets) and
+        `desorbent_consumption` (desorbent volume per amount of product in
+        m^3 / mol), the final state moved back to t = 0, the number of simulated
+        cycles and the simulation time.
+    """
+    process, builder = factory(**point)
+    if initial_state is not None:
+        process.system_state, process.system_state_derivative = initial_state
+    process_simulator = create_simulator(**(simulator_options or {}))
+
+    simulation_results, _ = simulate_to_css(
+        process_simulator, process, builder, **(css_options or {})
+    )
+
+    kpis = carousel_kpis(simulation_results, builder, targets)
+    productivity = sum(kpis[f"{outlet}.productivity"] for outlet in targets)
+    product_flow = productivity * builder.n_columns * builder.column.volume_solid
+    desorbent_flow = sum(
+        float(np.ravel(builder.flow_sheet[name].flow_rate)[0])
+        for name in desorbent_inlets
+    )
+    kpis["productivity"] = productivity
+    kpis["desorbent_consumption"] = (
+        desorbent_flow / product_flow if product_flow > 0 else np.inf
+    )
+
+    t_end = float(simulation_results.time_complete[-1])
+    state = tuple(
+        remap_carousel_state(
+            process, builder, simulation_results.system_state[name], t_end
+        )
+        for name in ("state", "state_derivative")
+    )
+
+    return {
+        "kpis": kpis,
+        "state": state,
+        "n_cycles": int(round(t_end / process.cycle_time)),
+        "time_elapsed": float(simulation_results.time_elapsed),
+    }
+
+
+@dataclass
+class Evaluation:
+    """
+    Evaluated candidate of the optimization.
+
+    Attributes
+    ----------
+    point : dict[str, float]
+        Optimized parameters of the candidate.
+    status : str
+        'ok', 'cached' or 'failed'.
+    kpis : dict[str, float]
+        KPIs of the candidate.
+    fitness : float
+        Value minimized by the optimizer.
+    violation : float
+        Sum of the purity deficits of all constrained outlets.
+    n_cycles : int
+        Number of simulated cycles.
+    time_elapsed : float
+        Simulation time in s.
+    warm_start : float or None
+        Normalized distance to the candidate whose state was used as initial state,
+        or None for a cold start.
+    """
+
+    point: dict[str, float]
+    status: str
+    kpis: dict[str, float] = field(default_factory=dict, repr=False)
+    fitness: float = _FAILED
+    violation: float = np.inf
+    n_cycles: int = 0
+    time_elapsed: float = 0.0
+    warm_start: Optional[float] = None
+
+    @property
+    def feasible(self) -> bool:
+        """bool: True if all purity constraints are met."""
+        return self.status != "failed" and self.violation <= 0
+
+
+@dataclass
+class OptimizationResult:
+    """
+    Result of an optimization of a carousel process.
+
+    Attributes
+    ----------
+    best : Evaluation
+        Best candidate.
+    history : list[Evaluation]
+        All evaluations in the order they were requested, including cache hits.
+    time_elapsed : float
+        Wall time of the optimization in s.
+    message : str
+        Termination message of the optimizer.
+    """
+
+    best: Evaluation
+    history: list[Evaluation] = field(repr=False)
+    time_elapsed: float
+    message: str
+
+    @property
+    def n_simulations(self) -> int:
+        """int: Number of simulated candidates."""
+        return sum(evaluation.status != "cached" for evaluation in self.history)
+
+    @property
+    def n_cache_hits(self) -> int:
+        """int: Number of candidates answered from the cache."""
+        return sum(evaluation.status == "cached" for evaluation in self.history)
+
+    @property
+    def n_cycles(self) -> int:
+        """int: Total number of simulated cycles."""
+        return sum(
+            evaluation.n_cycles
+            for evaluation in self.history
+            if evaluation.status != "cached"
+        )
+
+    def cycles_per_simulation(self) -> dict[str, float]:
+        """
+        Return the mean number of cycles of cold and warm-started simulations.
+
+        Returns
+        -------
+        dict[str, float]
+            Mean number of cycles keyed 'cold' and 'warm'.
+        """
+        cycles = {"cold": [], "warm": []}
+        for evaluation in self.history:
+            if evaluation.status != "ok":
+                continue
+            key = "cold" if evaluation.warm_start is None else "warm"
+            cycles[key].append(evaluation.n_cycles)
+
+        return {
+            key: float(np.mean(values)) if values else np.nan
+            for key, values in cycles.items()
+        }
+
+
+class CarouselOptimizer:
+    """
+    Maximize productivity or minimize desorbent consumption under purity limits.
+
+    Parameters
+    ----------
+    factory : Callable
+        Module-level case study factory, e.g. `four_zone_binary`.
+    bounds : dict[str, tuple[float, float]]
+        Lower and upper bound of every optimized factory argument.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    purity : dict[str, float]
+        Minimum purity of the constrained product outlets.
+    objective : str, optional
+        'productivity' (maximized) or 'desorbent_consumption' (minimized).
+        The default is 'productivity'.
+    base_point : dict[str, Any], optional
+        Fixed keyword arguments of the factory.
+    desorbent_inlets : tuple[str, ...], optional
+        Inlets supplying desorbent. The default is ('eluent',).
+    n_workers : int, optional
+        Number of worker processes. If None, all CPUs are used.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`. Unless `n_threads` is given, the
+        cores are divided among the workers, see `default_n_threads`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`.
+    cache_tol : float, optional
+        Candidates whose parameters, relative to the bounds, differ by less than
+        this tolerance are considered duplicates. The default is 1e-6.
+
+    Examples
+    --------
+    >>> optimizer = CarouselOptimizer(
+    ...     four_zone_binary,
+    ...     {"switch_time": (1200, 1900), "w_e": (0.15, 0.35), "w_r": (0.15, 0.3)},
+    ...     targets={"extract": "B", "raffinate": "A"},
+    ...     purity={"extract": 0.95, "raffinate": 0.95},
+    ... )
+    >>> result = optimizer.optimize(x0={"switch_time": 1552, "w_e": 0.249, "w_r": 0.213})
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        bounds: dict[str, tuple[float, float]],
+        targets: dict[str, str],
+        purity: dict[str, float],
+        objective: str = "productivity",
+        base_point: Optional[dict[str, Any]] = None,
+        desorbent_inlets: tuple[str, ...] = ("eluent",),
+        n_workers: Optional[int] = None,
+        simulator_options: Optional[dict] = None,
+        css_options: Optional[dict] = None,
+        cache_tol: float = 1e-6,
+    ) -> None:
+        if objective not in ("productivity", "desorbent_consumption"):
+            raise CADETProcessError(f"Unknown objective {objective}.")
+        for outlet in purity:
+            if outlet not in targets:
+                raise CADETProcessError(f"Outlet {outlet} has no target component.")
+
+        self.factory = factory
+        self.bounds = dict(bounds)
+        self.targets = targets
+        self.purity = purity
+        self.objective = objective
+        self.base_point = dict(base_point or {})
+        self.desorbent_inlets = tuple(desorbent_inlets)
+        self.n_workers = n_workers or os.cpu_count()
+        self.simulator_options = {
+            "n_threads": default_n_threads(self.n_workers),
+            **(simulator_options or {}),
+        }
+        self.css_options = css_options
+        self.cache_tol = cache_tol
+
+        self.history: list[Evaluation] = []
+        self._cache: dict[tuple, Evaluation] = {}
+        self._states: list[tuple[np.ndarray, tuple[np.ndarray, np.ndarray]]] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def names(self) -> list[str]:
+        """list[str]: Names of the optimized parameters."""
+        return list(self.bounds)
+
+    def _normalize(self, point: dict[str, float]) -> np.ndarray:
+        """Scale parameters to the unit box of the bounds."""
+        low, high = np.array([self.bounds[name] for name in self.names], dtype=float).T
+        x = np.array([point[name] for name in self.names], dtype=float)
+        return (x - low) / (high - low)
+
+    def _key(self, x: np.ndarray) -> tuple:
+        """Cache key of normalized parameters."""
+        return tuple(np.round(x / self.cache_tol).astype(np.int64))
+
+    def _nearest_state(
+        self, x: np.ndarray
+    ) -> tuple[Optional[float], Optional[tuple[np.ndarray, np.ndarray]]]:
+        """Final state of the closest converged candidate."""
+        if not self._states:
+            return None, None
+
+        distances = [np.linalg.norm(x - x_state) for x_state, _ in self._states]
+        i = int(np.argmin(distances))
+        return float(distances[i]), self._states[i][1]
+
+    def _fitness(self, kpis: dict[str, float]) -> tuple[float, float]:
+        """Fitness and purity violation of a candidate."""
+        violation = sum(
+            max(minimum - np.nan_to_num(kpis[f"{outlet}.purity"]), 0)
+            for outlet, minimum in self.purity.items()
+        )
+        if violation > 0:
+            return _INFEASIBLE * (1 + violation), float(violation)
+
+        value = float(kpis[self.objective])
+        return (-value if self.objective == "productivity" else value), 0.0
+
+    def evaluate(self, points: list[dict[str, float]]) -> list[Evaluation]:
+        """
+        Evaluate candidates in parallel.
+
+        Duplicates of cached candidates are not simulated again. All other
+        candidates start from the final state of the closest converged candidate
+        of earlier calls.
+
+        Parameters
+        ----------
+        points : list[dict[str, float]]
+            Optimized parameters of every candidate.
+
+        Returns
+        -------
+        list[Evaluation]
+            Evaluation of every candidate, in the order of `points`.
+        """
+        executor = self._executor
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(
+                self.n_workers, initializer=_initialize_worker
+            )
+
+        evaluations: list[Optional[Evaluation]] = [None] * len(points)
+        submitted = {}
+        try:
+            for i, point in enumerate(points):
+                x = self._normalize(point)
+                key = self._key(x)
+                if key in self._cache:
+                    cached = self._cache[key]
+                    evaluations[i] = Evaluation(
+                        point=dict(point),
+                        status="cached",
+                        kpis=cached.kpis,
+                        fitness=cached.fitness,
+                        violation=cached.violation,
+                    )
+                    continue
+                if key in submitted:
+                    submitted[key][1].append(i)
+                    continue
+
+                distance, state = self._nearest_state(x)
+                future = executor.submit(
+                    evaluate_candidate,
+                    self.factory,
+                    {**self.base_point, **point},
+                    self.targets,
+                    state,
+                    self.desorbent_inlets,
+                    self.simulator_options,
+                    self.css_options,
+                )
+                submitted[key] = (future, [i], x, distance)
+
+            for key, (future, indices, x, distance) in submitted.items():
+                point = points[indices[0]]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Candidate {point} failed ({e}).")
+                    evaluation = Evaluation(point=dict(point), status="failed")
+                else:
+                    fitness, violation = self._fitness(result["kpis"])
+                    evaluation = Evaluation(
+                        point=dict(point),
+                        status="ok",
+                        kpis=result["kpis"],
+                        fitness=fitness,
+                        violation=violation,
+                        n_cycles=result["n_cycles"],
+                        time_elapsed=result["time_elapsed"],
+                        warm_start=distance,
+                    )
+                    self._states.append((x, result["state"]))
+
+                self._cache[key] = evaluation
+                evaluations[indices[0]] = evaluation
+                for i in indices[1:]:
+                    evaluations[i] = Evaluation(
+                        point=dict(points[i]),
+                        status="cached",
+                        kpis=evaluation.kpis,
+                        fitness=evaluation.fitness,
+                        violation=evaluation.violation,
+                    )
+        finally:
+            if own_executor:
+                executor.shutdown(cancel_futures=True)
+
+        self.history.extend(evaluations)
+        return evaluations
+
+    def _map(self, func: Callable, population: Any) -> list[float]:
+        """Evaluate a population for `differential_evolution`."""
+        points = [dict(zip(self.names, map(float, x))) for x in population]
+        return [evaluation.fitness for evaluation in self.evaluate(points)]
+
+    def _fitness_at(self, x: np.ndarray) -> float:
+        """Fitness of a single candidate."""
+        return self._map(None, [x])[0]
+
+    def optimize(
+        self,
+        x0: Optional[dict[str, float]] = None,
+        maxiter: int = 20,
+        popsize: int = 8,
+        tol: float = 1e-3,
+        seed: Optional[int] = 0,
+    ) -> OptimizationResult:
+        """
+        Run the optimization.
+
+        Parameters
+        ----------
+        x0 : dict[str, float], optional
+            Initial guess, e.g. the operating point chosen by hand. It is evaluated
+            first, such that the first generation already starts from its state.
+        maxiter : int, optional
+            Maximum number of generations. The default is 20.
+        popsize : int, optional
+            Population size per parameter. The default is 8.
+        tol : float, optional
+            Relative convergence tolerance of the population. The default is 1e-3.
+        seed : int, optional
+            Seed of the optimizer. The default is 0.
+
+        Returns
+        -------
+        OptimizationResult
+            Best candidate and all evaluations.
+
+        Raises
+        ------
+        CADETProcessError
+            If no candidate satisfies the purity constraints.
+        """
+        start = time.time()
+        history_start = len(self.history)
+
+        self._executor = ProcessPoolExecutor(
+            self.n_workers, initializer=_initialize_worker
+        )
+        try:
+            if x0 is not None:
+                self.evaluate([x0])
+            result = differential_evolution(
+                self._fitness_at,
+                [self.bounds[name] for name in self.names],
+                maxiter=maxiter,
+                popsize=popsize,
+                tol=tol,
+                seed=seed,
+                x0=None if x0 is None else [x0[name] for name in self.names],
+                polish=False,
+                updating="deferred",
+                workers=self._map,
+            )
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+        history = self.history[history_start:]
+        best = min(history, key=lambda evaluation: evaluation.fitness)
+        if not best.feasible:
+            raise CADETProcessError(
+                "No candidate satisfies the purity constraints "
+                f"(smallest violation {best.violation:.3g})."
+            )
+
+        return OptimizationResult(
+            best=best,
+            history=history,
+            time_elapsed=time.time() - start,
+            message=str(result.message),
+        )
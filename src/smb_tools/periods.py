@@ -0,0 +1,179 @@
+"""
+Statistics of outlet profiles per switch period.
+
+The profiles are integrated with the trapezoidal rule on their own time grid. Values
+at the period boundaries are interpolated, so the statistics neither depend on the
+output resolution nor require the switch time to be a multiple of the output time
+step. All periods, outlets and components are processed in a single vectorised pass.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.simulationResults import SimulationResults
+
+from .kpi import outlet_flow_rates
+from .stationarity import _n_complete_switches
+
+__all__ = ["period_integrals", "PeriodStatistics", "period_statistics"]
+
+
+def period_integrals(
+    time: np.ndarray,
+    solution: np.ndarray,
+    period: float,
+    n_periods: Optional[int] = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Integrate a solution over consecutive periods of equal length.
+
+    Parameters
+    ----------
+    time : np.ndarray
+        Strictly increasing time points of the solution starting at 0.
+    solution : np.ndarray
+        Solution with shape (n_time, ...).
+    period : float
+        Length of a period.
+    n_periods : int, optional
+        Number of periods. If None, all complete periods are used.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        Integral, minimum and maximum of every period, each with shape
+        (n_periods, ...).
+    """
+    time = np.asarray(time, dtype=float)
+    solution = np.asarray(solution)
+    if n_periods is None:
+        n_periods = _n_complete_switches(time, period)
+
+    boundaries = np.arange(n_periods + 1) * period
+
+    # Cumulative integral at every time point.
+    dt = np.diff(time)
+    dt = dt.reshape(-1, *(1,) * (solution.ndim - 1))
+    segments = 0.5 * (solution[1:] + solution[:-1]) * dt
+    cumulative = np.concatenate(
+        (np.zeros((1, *solution.shape[1:])), np.cumsum(segments, axis=0))
+    )
+
+    # Interpolated values and cumulative integral at the period boundaries.
+    j = np.clip(np.searchsorted(time, boundaries, side="right") - 1, 0, len(time) - 2)
+    delta = boundaries - time[j]
+    theta = delta / (time[j + 1] - time[j])
+    theta = theta.reshape(-1, *(1,) * (solution.ndim - 1))
+    delta = delta.reshape(theta.shape)
+    boundary_values = solution[j] + theta * (solution[j + 1] - solution[j])
+    boundary_integral = cumulative[j] + 0.5 * (solution[j] + boundary_values) * delta
+
+    integral = np.diff(boundary_integral, axis=0)
+
+    # Extrema of the samples inside each period, including the boundary values.
+    starts = np.searchsorted(time, boundaries, side="left")
+    is_empty = (starts[1:] == starts[:-1]).reshape(theta[1:].shape)
+    inner = solution[: starts[-1]]
+    indices = np.minimum(starts[:-1], max(len(inner) - 1, 0))
+
+    minimum = np.minimum(boundary_values[:-1], boundary_values[1:])
+    maximum = np.maximum(boundary_values[:-1], boundary_values[1:])
+    if len(inner) > 0:
+        inner_min = np.minimum.reduceat(inner, indices, axis=0)
+        inner_max = np.maximum.reduceat(inner, indices, axis=0)
+        minimum = np.where(is_empty, minimum, np.minimum(minimum, inner_min))
+        maximum = np.where(is_empty, maximum, np.maximum(maximum, inner_max))
+
+    return integral, minimum, maximum
+
+
+@dataclass
+class PeriodStatistics:
+    """
+    Statistics of the outlet profiles for every switch period.
+
+    All arrays have the shape (n_periods, n_comp).
+
+    Attributes
+    ----------
+    period : float
+        Length of a period (the switch time).
+    mean : dict[str, np.ndarray]
+        Time-averaged concentration of every outlet.
+    min : dict[str, np.ndarray]
+        Minimum concentration of every outlet.
+    max : dict[str, np.ndarray]
+        Maximum concentration of every outlet.
+    mass : dict[str, np.ndarray]
+        Amount of every component leaving through the outlet during the period.
+    """
+
+    period: float
+    mean: dict[str, np.ndarray]
+    min: dict[str, np.ndarray]
+    max: dict[str, np.ndarray]
+    mass: dict[str, np.ndarray]
+
+    @property
+    def n_periods(self) -> int:
+        """int: Number of periods."""
+        return len(next(iter(self.mean.values())))
+
+    @property
+    def start(self) -> np.ndarray:
+        """np.ndarray: Start time of every period."""
+        return np.arange(self.n_periods) * self.period
+
+
+def period_statistics(
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+    outlets: Optional[list[str]] = None,
+    n_periods: Optional[int] = None,
+) -> PeriodStatistics:
+    """
+    Compute mean, extrema and mass of the outlet profiles for every switch period.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the carousel process.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    outlets : list[str], optional
+        Names of the outlet units. If None, all outlets of the flow sheet are used.
+    n_periods : int, optional
+        Number of switch periods. If None, all complete periods are used.
+
+    Returns
+    -------
+    PeriodStatistics
+        Statistics of all outlets.
+    """
+    if outlets is None:
+        outlets = [unit.name for unit in builder.flow_sheet.outlets]
+
+    time = simulation_results.time_complete
+    solution = np.stack(
+        [simulation_results.solution[outlet].inlet.solution for outlet in outlets],
+        axis=1,
+    )
+
+    integral, minimum, maximum = period_integrals(
+        time, solution, builder.switch_time, n_periods
+    )
+    mean = integral / builder.switch_time
+    flow_rates = outlet_flow_rates(builder)
+
+    return PeriodStatistics(
+        period=builder.switch_time,
+        mean={outlet: mean[:, i] for i, outlet in enumerate(outlets)},
+        min={outlet: minimum[:, i] for i, outlet in enumerate(outlets)},
+        max={outlet: maximum[:, i] for i, outlet in enumerate(outlets)},
+        mass={
+            outlet: integral[:, i] * flow_rates[outlet]
+            for i, outlet in enumerate(outlets)
+        },
+    )
@@ -0,0 +1,361 @@
+"""
+Phase-level profiling of the case study notebooks.
+
+A `PhaseProfiler` splits the execution of a notebook into named phases (imports,
+process setup, simulation, result conversion, plotting, ...) and records the wall
+time, CPU time and peak resident set size of each phase. The profile is written as
+JSON and CSV file such that it is committed to the output repository together with
+the results of every `process_example` run. Optionally, the hottest functions are
+determined with `cProfile`.
+"""
+
+import cProfile
+import csv
+import io
+import json
+import os
+import platform
+import pstats
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.simulationResults import SimulationResults
+
+from .diagnostics import peak_rss, solver_statistics
+
+__all__ = ["default_profile_directory", "PhaseProfiler"]
+
+
+def default_profile_directory() -> Path:
+    """
+    Return the directory profiles are written to.
+
+    The location can be set with the environment variable `SMB_PROFILE_DIRECTORY`,
+    which is done by `main.py` to write the profiles to the output repository.
+    Otherwise, `profiles` in the working directory is used.
+
+    Returns
+    -------
+    Path
+        Profile directory.
+    """
+    return Path(os.environ.get("SMB_PROFILE_DIRECTORY", "profiles"))
+
+
+def _process_age() -> Optional[float]:
+    """Return the wall time since the start of this process, if available."""
+    try:
+        with open("/proc/self/stat") as file:
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def _git_commit() -> str:
+    """Return the current commit of the source repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class PhaseProfiler:
+    """
+    Record wall time, CPU time and peak memory of consecutive phases.
+
+    Phases are either started with `start`, which ends the current phase, or
+    wrapped in the `phase` context manager. In a notebook, `track_cells` records
+    every cell as a phase without changing the cells. Phases with the same name are
+    accumulated. Time spent before the profiler was created (interpreter startup
+    and the import of CADET-Process) is recorded as phase 'startup'.
+
+    Parameters
+    ----------
+    name : str
+        Name of the profile, e.g. the name of the notebook.
+    directory : str or Path, optional
+        Output directory. If None, `default_profile_directory()` is used.
+    cprofile : bool, optional
+        If True, all phases are profiled with `cProfile` and the hottest functions
+        are written to `<name>_functions.txt`. If None, the environment variable
+        `SMB_PROFILE_CPROFILE` is used. The default is None.
+    n_functions : int, optional
+        Number of functions in the cProfile report. The default is 30.
+
+    Examples
+    --------
+    >>> profiler = PhaseProfiler("four_zone_binary")
+    >>> with profiler.phase("simulate"):
+    ...     simulation_results = process_simulator.simulate(process)
+    >>> profiler.record_simulation(simulation_results, process_simulator)
+    >>> profiler.write()
+
+    In a notebook, the first cell starts tracking and the last cell writes the
+    profile:
+
+    >>> profiler = PhaseProfiler("four_zone_binary").track_cells()
+    """
+
+    def __init__(
+        self,
+        name: str,
+        directory: Optional[str | Path] = None,
+        cprofile: Optional[bool] = None,
+        n_functions: int = 30,
+    ) -> None:
+        self.name = name
+        self.directory = default_profile_directory() if directory is None else directory
+        if cprofile is None:
+            cprofile = os.environ.get("SMB_PROFILE_CPROFILE", "0") not in ("", "0")
+        self.profile = cProfile.Profile() if cprofile else None
+        self.n_functions = n_functions
+
+        self.phases: dict[str, dict[str, float]] = {}
+        self.cells: dict[str, str] = {}
+        self.simulation: dict[str, Any] = {}
+        self._current: Optional[tuple[str, float, float]] = None
+
+        startup_cpu = time.process_time()
+        startup_wall = _process_age()
+        self._add("startup", startup_wall or np.nan, startup_cpu)
+
+    def _add(self, name: str, wall_time: float, cpu_time: float) -> None:
+        phase = self.phases.setdefault(
+            name, {"wall_time": 0.0, "cpu_time": 0.0, "calls": 0}
+        )
+        phase["wall_time"] += wall_time
+        phase["cpu_time"] += cpu_time
+        phase["calls"] += 1
+        phase["peak_rss"] = peak_rss()
+
+    def start(self, name: str) -> None:
+        """
+        End the current phase and start a new one.
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase.
+        """
+        self.stop()
+        self._current = (name, time.perf_counter(), time.process_time())
+        if self.profile is not None:
+            self.profile.enable()
+
+    def stop(self) -> None:
+        """End the current phase, if any."""
+        if self._current is None:
+            return
+        if self.profile is not None:
+            self.profile.disable()
+
+        name, wall_start, cpu_start = self._current
+        self._add(
+            name, time.perf_counter() - wall_start, time.process_time() - cpu_start
+        )
+        self._current = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Context manager recording the enclosed code as phase `name`."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def track_cells(self) -> "PhaseProfiler":
+        """
+        Record every subsequently executed IPython cell as a phase.
+
+        Phases are named `cell_<n>` in the order of execution, and the first line
+        of every cell is stored in `cells`. Outside of IPython, e.g. when the
+        notebook is run as a script, the rest of the run is recorded as phase
+        'notebook'.
+
+        Returns
+        -------
+        PhaseProfiler
+            This profiler.
+        """
+        try:
+            from IPython import get_ipython
+        except ImportError:
+            ipython = None
+        else:
+            ipython = get_ipython()
+
+        if ipython is None:
+            self.start("notebook")
+            return self
+
+        ipython.events.register("pre_run_cell", self._pre_run_cell)
+        ipython.events.register("post_run_cell", self._post_run_cell)
+
+        return self
+
+    def _pre_run_cell(self, info: Any) -> None:
+        name = f"cell_{len(self.cells) + 1:02d}"
+        lines = [line for line in info.raw_cell.splitlines() if line.strip()]
+        self.cells[name] = lines[0] if lines else ""
+        self.start(name)
+
+    def _post_run_cell(self, result: Any) -> None:
+        self.stop()
+
+    def record_simulation(
+        self,
+        simulation_results: SimulationResults,
+        process_simulator: Optional[Any] = None,
+    ) -> None:
+        """
+        Record statistics of a simulation.
+
+        Parameters
+        ----------
+        simulation_results : SimulationResults
+            Results of the simulation.
+        process_simulator : Cadet, optional
+            Simulator of the results. Its settings and, for `CachedCadet`, the
+            cache hits and misses are recorded. If the simulator keeps the CADET
+            instance of the last simulation as `last_cadet`, its solver statistics
+            (time steps, residual and Jacobian evaluations, ...) are recorded as
+            well. CADET only returns them through the command line interface
+            (`use_dll = False`), see `solver_statistics`.
+        """
+        solution_bytes = sum(
+            np.asarray(solution.solution).nbytes
+            for unit in simulation_results.solution.values()
+            for solution in unit.values()
+            if hasattr(solution, "solution")
+        )
+        self.simulation.update(
+            time_sim=float(simulation_results.time_elapsed),
+            n_time_points=len(simulation_results.time_complete),
+            solution_bytes=int(solution_bytes),
+        )
+
+        if process_simulator is None:
+            return
+        parameters = process_simulator.time_integrator_parameters
+        self.simulation.update(
+            n_cycles=process_simulator.n_cycles,
+            use_dll=bool(process_simulator.use_dll),
+            abstol=parameters.abstol,
+            reltol=parameters.reltol,
+            max_step_size=parameters.max_step_size,
+        )
+        for counter in ("n_hits", "n_misses"):
+            if hasattr(process_simulator, counter):
+                self.simulation[f"cache_{counter}"] = getattr(
+                    process_simulator, counter
+                )
+
+        cadet = getattr(process_simulator, "last_cadet", None)
+        if cadet is not None:
+            self.simulation.pop("statistics", None)
+            self.simulation.pop("statistics_error", None)
+            try:
+                self.simulation["statistics"] = solver_statistics(cadet)
+            except CADETProcessError as e:
+                self.simulation["statistics_error"] = str(e)
+
+    def report(self) -> dict[str, Any]:
+        """
+        Return the profile.
+
+        Returns
+        -------
+        dict[str, Any]
+            Name, environment, phases (in order of first occurrence), first line
+            of every tracked cell, totals and simulation statistics.
+        """
+        import CADETProcess
+
+        phases = [{"phase": name, **values} for name, values in self.phases.items()]
+        return {
+            "name": self.name,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "cadet_process": CADETProcess.__version__,
+            "phases": phases,
+            "cells": self.cells,
+            "wall_time": float(np.nansum([p["wall_time"] for p in phases])),
+            "cpu_time": float(sum(p["cpu_time"] for p in phases)),
+            "peak_rss": peak_rss(),
+            "simulation": self.simulation,
+        }
+
+    def _hottest_functions(self) -> str:
+        """Return the hottest functions of the cProfile run as text."""
+        stream = io.StringIO()
+        statistics = pstats.Stats(self.profile, stream=stream)
+        statistics.sort_stats("cumulative").print_stats(self.n_functions)
+        statistics.sort_stats("tottime").print_stats(self.n_functions)
+
+        return stream.getvalue()
+
+    def write(self) -> Path:
+        """
+        End the current phase and write the profile.
+
+        Writes `<name>.json` with the complete profile and `<name>.csv` with one
+        row per phase. If cProfile is enabled, `<name>_functions.txt` contains the
+        hottest functions sorted by cumulative and by own time.
+
+        Returns
+        -------
+        Path
+            Path of the JSON file.
+        """
+        self.stop()
+        if not self.phases:
+            raise CADETProcessError("No phases were recorded.")
+
+        directory = Path(self.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+
+        json_path = directory / f"{self.name}.json"
+        with open(json_path, "w") as file:
+            json.dump(report, file, indent=2)
+
+        with open(directory / f"{self.name}.csv", "w", newline="") as file:
+            writer = csv.DictWriter(
+                file, fieldnames=["phase", "wall_time", "cpu_time", "calls", "peak_rss"]
+            )
+            writer.writeheader()
+            writer.writerows(report["phases"])
+
+        if self.profile is not None:
+            functions_path = directory / f"{self.name}_functions.txt"
+            functions_path.write_text(self._hottest_functions())
+
+        return json_path
+
+    def summary(self) -> str:
+        """Return the phases as a text table."""
+        lines = [f"{'phase':<20}{'wall [s]':>10}{'cpu [s]':>10}{'peak [MiB]':>12}"]
+        for name, values in self.phases.items():
+            lines.append(
+                f"{name:<20}{values['wall_time']:>10.2f}{values['cpu_time']:>10.2f}"
+                f"{values['peak_rss']:>12.0f}  {self.cells.get(name, '')[:40]}"
+            )
+
+        return "\n".join(lines)
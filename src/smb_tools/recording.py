@@ -0,0 +1,229 @@
+"""
+Selective recording of long carousel simulations.
+
+CADET writes every recorded quantity at every output time of the whole simulation.
+For long runs with many columns, the bulk solution alone can exceed the available
+memory. Here, the process is simulated in chunks of whole cycles, each continuing
+from the final state of the previous chunk. Cycles before `start_cycle` are
+simulated without recording, the output time grid is coarsened to a fixed number of
+points per switch period and only the requested bulk snapshots are kept from each
+chunk before the next one is simulated.
+"""
+
+from dataclasses import dataclass, field
+from typing import Literal, Optional, Sequence
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Process
+from CADETProcess.simulator import Cadet
+
+from .snapshots import bulk_snapshots
+
+__all__ = ["RecordingPolicy", "RecordedResults", "simulate_recorded"]
+
+
+@dataclass
+class RecordingPolicy:
+    """
+    Specification of the quantities recorded during a carousel simulation.
+
+    Attributes
+    ----------
+    bulk_times : 'switches', Sequence[float] or None
+        Times at which the bulk profiles of all columns are kept. If 'switches', a
+        snapshot is taken at every switch. If None, no bulk profiles are recorded.
+    outlet_points_per_switch : int, optional
+        Number of output time points per switch period. If None, the time
+        resolution of the simulator is used.
+    start_cycle : int
+        Number of cycles simulated before recording starts.
+    chunk_cycles : int
+        Number of cycles simulated in one CADET run. Only the bulk solution of one
+        chunk is held in memory at a time.
+    """
+
+    bulk_times: Optional[Literal["switches"] | Sequence[float]] = None
+    outlet_points_per_switch: Optional[int] = None
+    start_cycle: int = 0
+    chunk_cycles: int = 1
+
+    def snapshot_times(self, builder: CarouselBuilder, n_cycles: int) -> np.ndarray:
+        """Return the times of all bulk snapshots within the recorded cycles."""
+        t_start = self.start_cycle * builder.cycle_time
+        t_end = n_cycles * builder.cycle_time
+
+        if self.bulk_times is None:
+            return np.zeros(0)
+        if isinstance(self.bulk_times, str):
+            if self.bulk_times != "switches":
+                raise CADETProcessError(f"Unknown bulk times {self.bulk_times}.")
+            n_switches = n_cycles * builder.n_columns
+            times = np.arange(n_switches + 1) * builder.switch_time
+        else:
+            times = np.sort(np.asarray(self.bulk_times, dtype=float))
+
+        return times[(times >= t_start) & (times <= t_end)]
+
+
+@dataclass
+class RecordedResults:
+    """
+    Results of a simulation with a recording policy.
+
+    Attributes
+    ----------
+    time : np.ndarray
+        Output times of the outlets in the recorded cycles.
+    outlets : dict[str, np.ndarray]
+        Outlet concentrations with shape (n_time, n_comp).
+    bulk_times : np.ndarray
+        Times of the bulk snapshots.
+    bulk : np.ndarray or None
+        Bulk profiles with shape (n_snapshots, n_positions, ncol, n_comp), sorted
+        by carousel position.
+    n_cycles : int
+        Total number of simulated cycles.
+    time_elapsed : float
+        Accumulated simulation time of all chunks.
+    system_state : dict
+        Final state and state derivative.
+    """
+
+    time: np.ndarray
+    outlets: dict[str, np.ndarray]
+    bulk_times: np.ndarray
+    bulk: Optional[np.ndarray]
+    n_cycles: int
+    time_elapsed: float
+    system_state: dict = field(repr=False)
+
+
+def _column_recorders(process: Process, builder: CarouselBuilder) -> list:
+    """Return the distinct solution recorders of all columns."""
+    recorders = [builder.column.solution_recorder]
+    for i in range(builder.n_columns):
+        recorder = process.flow_sheet[f"column_{i}"].solution_recorder
+        if all(recorder is not r for r in recorders):
+            recorders.append(recorder)
+
+    return recorders
+
+
+def simulate_recorded(
+    process_simulator: Cadet,
+    process: Process,
+    builder: CarouselBuilder,
+    policy: RecordingPolicy,
+    n_cycles: Optional[int] = None,
+) -> RecordedResults:
+    """
+    Simulate a carousel process and only keep the quantities of a recording policy.
+
+    Parameters
+    ----------
+    process_simulator : Cadet
+        Simulator with time integrator settings.
+    process : Process
+        Process created by `builder.build_process()`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    policy : RecordingPolicy
+        Quantities to record.
+    n_cycles : int, optional
+        Total number of cycles. If None, `process_simulator.n_cycles` is used.
+
+    Returns
+    -------
+    RecordedResults
+        Outlet profiles and bulk snapshots of the recorded cycles.
+    """
+    if n_cycles is None:
+        n_cycles = process_simulator.n_cycles
+    if policy.start_cycle >= n_cycles:
+        raise CADETProcessError("start_cycle must be lower than n_cycles.")
+
+    outlets = [unit.name for unit in builder.flow_sheet.outlets]
+    snapshot_times = policy.snapshot_times(builder, n_cycles)
+
+    recorders = _column_recorders(process, builder)
+    write_solution_bulk_orig = [r.write_solution_bulk for r in recorders]
+    n_cycles_orig = process_simulator.n_cycles
+    time_resolution_orig = process_simulator.time_resolution
+    system_state_orig = process.system_state
+    system_state_derivative_orig = process.system_state_derivative
+
+    def set_recording(write_solution_bulk: bool, time_resolution: float) -> None:
+        for recorder in recorders:
+            recorder.write_solution_bulk = write_solution_bulk
+        process_simulator.time_resolution = time_resolution
+
+    if policy.outlet_points_per_switch is None:
+        time_resolution = time_resolution_orig
+    else:
+        time_resolution = builder.switch_time / policy.outlet_points_per_switch
+
+    time = []
+    solutions = {outlet: [] for outlet in outlets}
+    bulk = []
+    time_elapsed = 0
+    results = None
+
+    try:
+        if policy.start_cycle > 0:
+            # Only section times (i.e. the switches) are written.
+            set_recording(False, builder.cycle_time)
+            results = process_simulator.simulate_n_cycles(process, policy.start_cycle)
+            time_elapsed += results.time_elapsed
+
+        cycle = policy.start_cycle
+        while cycle < n_cycles:
+            n_chunk = min(policy.chunk_cycles, n_cycles - cycle)
+            t_offset = cycle * builder.cycle_time
+            t_chunk_end = (cycle + n_chunk) * builder.cycle_time
+
+            is_last = cycle + n_chunk == n_cycles
+            in_chunk = (snapshot_times >= t_offset) & (
+                (snapshot_times < t_chunk_end)
+                | (is_last & (snapshot_times <= t_chunk_end))
+            )
+
+            set_recording(bool(np.any(in_chunk)), time_resolution)
+            results = process_simulator.simulate_n_cycles(
+                process, n_chunk, previous_results=results
+            )
+            time_elapsed += results.time_elapsed
+
+            # Skip the first point of subsequent chunks, which repeats the last one.
+            start = 0 if len(time) == 0 else 1
+            time.append(results.time_complete[start:] + t_offset)
+            for outlet in outlets:
+                solutions[outlet].append(
+                    results.solution[outlet].inlet.solution[start:]
+                )
+            if np.any(in_chunk):
+                bulk.append(
+                    bulk_snapshots(
+                        builder, results, snapshot_times[in_chunk] - t_offset
+                    )
+                )
+
+            cycle += n_chunk
+    finally:
+        for recorder, write_solution_bulk in zip(recorders, write_solution_bulk_orig):
+            recorder.write_solution_bulk = write_solution_bulk
+        process_simulator.time_resolution = time_resolution_orig
+        process_simulator.n_cycles = n_cycles_orig
+        process.system_state = system_state_orig
+        process.system_state_derivative = system_state_derivative_orig
+
+    return RecordedResults(
+        time=np.concatenate(time),
+        outlets={outlet: np.concatenate(solutions[outlet]) for outlet in outlets},
+        bulk_times=snapshot_times,
+        bulk=np.concatenate(bulk) if bulk else None,
+        n_cycles=n_cycles,
+        time_elapsed=time_elapsed,
+        system_state=results.system_state,
+    )
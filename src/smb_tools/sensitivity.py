@@ -0,0 +1,420 @@
+"""
+Gradients of carousel KPIs from forward parameter sensitivities.
+
+CADET integrates the forward sensitivities of all states alongside the primal
+solution. For a carousel process, a model parameter such as a binding constant
+belongs to every column, so its sensitivity is added as one fused parameter of all
+columns. The sensitivities of the outlet concentrations are integrated like the
+concentrations themselves, which yields the gradients of purity, recovery and
+productivity from a single simulation.
+
+The sensitivities start at zero with every simulation. Like the state itself, they
+converge to their cyclic steady state over the simulated cycles, so gradients should
+be evaluated in the last cycle of a simulation of several cycles.
+
+Flow rate sensitivities are not supported by CADET-Process, and the switch time and
+split fractions are parameters of the events. Gradients with respect to these
+operating parameters are computed by finite differences, each simulated to CSS from
+the final state of the nominal simulation, see `operating_kpi_gradients`.
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Linear, Process
+from CADETProcess.simulationResults import SimulationResults
+from CADETProcess.simulator import Cadet
+
+from .kpi import carousel_kpis, feed_mass_flow, integrate_window, outlet_flow_rates
+from .periods import period_integrals
+from .stationarity import simulate_to_css
+
+__all__ = [
+    "add_column_sensitivity",
+    "add_binding_sensitivities",
+    "kpi_gradients",
+    "period_kpi_gradients",
+    "operating_kpi_gradients",
+]
+
+
+def add_column_sensitivity(
+    process: Process,
+    parameter: str,
+    component: Optional[str] = None,
+    name: Optional[str] = None,
+) -> str:
+    """
+    Add the sensitivity of a parameter shared by all columns of a carousel process.
+
+    Parameters
+    ----------
+    process : Process
+        Carousel process with columns named `column_<i>`.
+    parameter : str
+        Path of the parameter relative to the column, e.g. `axial_dispersion` or
+        `binding_model.adsorption_rate`.
+    component : str, optional
+        Component of a component-specific parameter.
+    name : str, optional
+        Name of the sensitivity. If None, the parameter name is used, followed by
+        the component.
+
+    Returns
+    -------
+    str
+        Name of the sensitivity.
+
+    Raises
+    ------
+    CADETProcessError
+        If the process has no columns.
+    """
+    columns = [
+        unit.name
+        for unit in process.flow_sheet.units
+        if unit.name.startswith("column_")
+    ]
+    if len(columns) == 0:
+        raise CADETProcessError("Process has no carousel columns.")
+
+    if name is None:
+        name = parameter.split(".")[-1]
+        if component is not None:
+            name = f"{name}_{component}"
+
+    process.add_parameter_sensitivity(
+        [f"{column}.{parameter}" for column in columns],
+        name=name,
+        components=len(columns) * [component],
+        polynomial_coefficients=len(columns) * [None],
+    )
+
+    return name
+
+
+def add_binding_sensitivities(
+    process: Process,
+    parameters: tuple[str, ...] = ("adsorption_rate", "desorption_rate"),
+    components: Optional[list[str]] = None,
+) -> list[str]:
+    """
+    Add the sensitivities of the constants of a `Linear` binding model.
+
+    Parameters
+    ----------
+    process : Process
+        Carousel process with columns named `column_<i>`.
+    parameters : tuple[str, ...], optional
+        Parameters of the binding model. The default is the adsorption and
+        desorption rate.
+    components : list[str], optional
+        Components for which sensitivities are added. If None, all components are
+        used.
+
+    Returns
+    -------
+    list[str]
+        Names of the sensitivities, `<parameter>_<component>`.
+
+    Raises
+    ------
+    CADETProcessError
+        If the binding model is not `Linear`.
+    """
+    binding_model = process.flow_sheet["column_0"].binding_model
+    if not isinstance(binding_model, Linear):
+        raise CADETProcessError("Binding sensitivities require a Linear binding model.")
+
+    if components is None:
+        components = list(process.component_system.species)
+
+    return [
+        add_column_sensitivity(process, f"binding_model.{parameter}", component)
+        for parameter in parameters
+        for component in components
+    ]
+
+
+def _kpis_from_mass(
+    mass: np.ndarray,
+    mass_sensitivities: dict[str, np.ndarray],
+    i_comp: int,
+    fed: float,
+    normalization: float,
+) -> tuple[dict[str, np.ndarray], dict[str, dict[str, np.ndarray]]]:
+    """Purity, recovery and productivity and their derivatives from outlet masses."""
+    target = mass[..., i_comp]
+    total = np.sum(mass, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kpis = {
+            "purity": np.where(total > 0, target / total, np.nan),
+            "recovery": target / fed if fed > 0 else np.full_like(target, np.nan),
+            "productivity": target / normalization,
+        }
+
+        gradients = {kpi: {} for kpi in kpis}
+        for name, d_mass in mass_sensitivities.items():
+            d_target = d_mass[..., i_comp]
+            d_total = np.sum(d_mass, axis=-1)
+            gradients["purity"][name] = np.where(
+                total > 0, (d_target * total - target * d_total) / total**2, np.nan
+            )
+            gradients["recovery"][name] = (
+                d_target / fed if fed > 0 else np.full_like(target, np.nan)
+            )
+            gradients["productivity"][name] = d_target / normalization
+
+    return kpis, gradients
+
+
+def _sensitivity_names(
+    simulation_results: SimulationResults, sensitivities: Optional[list[str]]
+) -> list[str]:
+    """Names of the requested sensitivities, checked against the results."""
+    available = list(simulation_results.sensitivity.keys())
+    if sensitivities is None:
+        return available
+
+    for name in sensitivities:
+        if name not in available:
+            raise CADETProcessError(f"Results contain no sensitivity {name}.")
+
+    return list(sensitivities)
+
+
+def kpi_gradients(
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+    targets: dict[str, str],
+    n_switches: Optional[int] = None,
+    sensitivities: Optional[list[str]] = None,
+) -> tuple[dict[str, float], dict[str, dict[str, float]]]:
+    """
+    Compute the KPIs and their gradients from the parameter sensitivities.
+
+    The KPIs are evaluated over the same window as in `carousel_kpis`.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the carousel process with parameter sensitivities.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    n_switches : int, optional
+        Number of switch periods at the end of the simulation that are evaluated.
+        If None, the last cycle is evaluated.
+    sensitivities : list[str], optional
+        Names of the sensitivities. If None, all sensitivities of the results are
+        used.
+
+    Returns
+    -------
+    tuple[dict[str, float], dict[str, dict[str, float]]]
+        KPIs named as in `carousel_kpis` and the derivative of every KPI with
+        respect to every sensitivity parameter.
+
+    Raises
+    ------
+    CADETProcessError
+        If the simulation is shorter than the evaluation window.
+    """
+    if n_switches is None:
+        n_switches = builder.n_columns
+    names = _sensitivity_names(simulation_results, sensitivities)
+
+    time = simulation_results.time_complete
+    t_end = np.floor(time[-1] / builder.switch_time + 1e-9) * builder.switch_time
+    t_start = t_end - n_switches * builder.switch_time
+    if t_start < -1e-9:
+        raise CADETProcessError("Simulation is shorter than the evaluation window.")
+    duration = t_end - t_start
+
+    component_names = list(builder.component_system.names)
+    flow_rates = outlet_flow_rates(builder)
+    fed = feed_mass_flow(builder) * duration
+    volume_solid = builder.n_columns * builder.column.volume_solid
+
+    kpis = {}
+    gradients = {}
+    for outlet, component in targets.items():
+        i_comp = component_names.index(component)
+        solution = simulation_results.solution[outlet].inlet.solution
+        mass = flow_rates[outlet] * integrate_window(time, solution, t_start, t_end)
+        mass_sensitivities = {
+            name: flow_rates[outlet]
+            * integrate_window(
+                time,
+                simulation_results.sensitivity[name][outlet].inlet.solution,
+                t_start,
+                t_end,
+            )
+            for name in names
+        }
+
+        outlet_kpis, outlet_gradients = _kpis_from_mass(
+            mass, mass_sensitivities, i_comp, fed[i_comp], duration * volume_solid
+        )
+        for kpi, value in outlet_kpis.items():
+            kpis[f"{outlet}.{kpi}"] = float(value)
+            gradients[f"{outlet}.{kpi}"] = {
+                name: float(d) for name, d in outlet_gradients[kpi].items()
+            }
+
+    return kpis, gradients
+
+
+def period_kpi_gradients(
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+    targets: dict[str, str],
+    sensitivities: Optional[list[str]] = None,
+) -> tuple[dict[str, np.ndarray], dict[str, dict[str, np.ndarray]]]:
+    """
+    Compute the KPIs of every switch period and their gradients.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the carousel process with parameter sensitivities.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    sensitivities : list[str], optional
+        Names of the sensitivities. If None, all sensitivities of the results are
+        used.
+
+    Returns
+    -------
+    tuple[dict[str, np.ndarray], dict[str, dict[str, np.ndarray]]]
+        KPIs with shape (n_periods,) named as in `carousel_kpis` and their
+        derivatives with respect to every sensitivity parameter.
+
+    See Also
+    --------
+    period_statistics
+    """
+    names = _sensitivity_names(simulation_results, sensitivities)
+
+    time = simulation_results.time_complete
+    switch_time = builder.switch_time
+    component_names = list(builder.component_system.names)
+    flow_rates = outlet_flow_rates(builder)
+    fed = feed_mass_flow(builder) * switch_time
+    volume_solid = builder.n_columns * builder.column.volume_solid
+
+    kpis = {}
+    gradients = {}
+    for outlet, component in targets.items():
+        i_comp = component_names.index(component)
+        # Integrate concentrations and sensitivities in one pass.
+        solution = np.stack(
+            [
+                simulation_results.solution[outlet].inlet.solution,
+                *(
+                    simulation_results.sensitivity[name][outlet].inlet.solution
+                    for name in names
+                ),
+            ],
+            axis=1,
+        )
+        integral = flow_rates[outlet] * period_integrals(time, solution, switch_time)[0]
+
+        outlet_kpis, outlet_gradients = _kpis_from_mass(
+            integral[:, 0],
+            {name: integral[:, i + 1] for i, name in enumerate(names)},
+            i_comp,
+            fed[i_comp],
+            switch_time * volume_solid,
+        )
+        for kpi, value in outlet_kpis.items():
+            kpis[f"{outlet}.{kpi}"] = value
+            gradients[f"{outlet}.{kpi}"] = outlet_gradients[kpi]
+
+    return kpis, gradients
+
+
+def operating_kpi_gradients(
+    process_simulator: Cadet,
+    factory: Callable,
+    point: dict[str, float],
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+    targets: dict[str, str],
+    parameters: Optional[list[str]] = None,
+    rel_step: float = 1e-2,
+    css_options: Optional[dict] = None,
+) -> dict[str, dict[str, float]]:
+    """
+    Compute KPI gradients with respect to operating parameters.
+
+    Every parameter is perturbed in turn and the perturbed process is simulated to
+    CSS, starting from the final state of the nominal simulation. Since this state
+    is close to the perturbed CSS, only a few cycles are needed per parameter
+    instead of a complete start-up.
+
+    Parameters
+    ----------
+    process_simulator : Cadet
+        Simulator with time integrator settings.
+    factory : Callable
+        Case study factory returning process and builder, e.g. `four_zone_binary`.
+    point : dict[str, float]
+        Keyword arguments of the factory at the nominal operating point.
+    simulation_results : SimulationResults
+        Results of the nominal process at CSS, ending after a complete cycle.
+    builder : CarouselBuilder
+        Builder of the nominal process.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    parameters : list[str], optional
+        Factory arguments to differentiate. If None, all arguments of `point`.
+    rel_step : float, optional
+        Relative step of the forward differences. The default is 1e-2.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`. The default tolerance is 1e-5 and
+        at least two cycles are simulated.
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        Derivative of every KPI with respect to every parameter.
+
+    Raises
+    ------
+    CADETProcessError
+        If a parameter is not an argument of `point`.
+    """
+    if parameters is None:
+        parameters = list(point)
+    css_options = {"tol": 1e-5, "n_cycles_min": 2, **(css_options or {})}
+
+    kpis = carousel_kpis(simulation_results, builder, targets)
+    state = simulation_results.system_state["state"]
+    state_derivative = simulation_results.system_state["state_derivative"]
+
+    gradients = {kpi: {} for kpi in kpis}
+    for parameter in parameters:
+        if parameter not in point:
+            raise CADETProcessError(f"Unknown operating parameter {parameter}.")
+
+        step = rel_step * abs(point[parameter]) or rel_step
+        process, perturbed_builder = factory(
+            **{**point, parameter: point[parameter] + step}
+        )
+        process.system_state = state
+        process.system_state_derivative = state_derivative
+        perturbed_results, _ = simulate_to_css(
+            process_simulator, process, perturbed_builder, **css_options
+        )
+
+        perturbed = carousel_kpis(perturbed_results, perturbed_builder, targets)
+        for kpi, value in kpis.items():
+            gradients[kpi][parameter] = (perturbed[kpi] - value) / step
+
+    return gradients
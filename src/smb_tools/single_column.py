@@ -0,0 +1,375 @@
+"""
+Single-column solver for carousel processes.
+
+Implements the approach of He et al. (2018), "Efficient numerical simulation of
+simulated moving bed chromatography with a single-column solver". Since all columns
+of the carousel are identical, the cyclic steady state can be computed by simulating
+only one column. The column is moved through all carousel positions, one switch
+period at a time, while its state is carried over from one position to the next.
+The inlet of a position is taken from the stored outlet history of the upstream
+position, mixed with the external inlets of the zone.
+
+Hold-up volumes of the zone valves are neglected.
+"""
+
+import copy
+from dataclasses import dataclass, field
+from typing import Literal, Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import FlowSheet, Inlet, Outlet, Process
+from CADETProcess.simulator import Cadet
+
+from .carousel import ZoneLayout, position_zones, zone_layouts
+
+__all__ = ["SingleColumnResults", "SingleColumnSolver"]
+
+
+@dataclass
+class SingleColumnResults:
+    """
+    Results of the single-column solver at cyclic steady state.
+
+    Attributes
+    ----------
+    time : np.ndarray
+        Time within one switch period at which the profiles are stored.
+    column_outlets : np.ndarray
+        Outlet profile of every carousel position with shape
+        (n_positions, n_time, n_comp).
+    outlets : dict[str, np.ndarray]
+        Profiles of the external outlets with shape (n_time, n_comp).
+    history : np.ndarray
+        Relative change of the column outlet profiles in every iteration.
+    converged : bool
+        True if the tolerance was reached.
+    time_elapsed : float
+        Accumulated simulation time of all single-column runs.
+    state : tuple[np.ndarray, np.ndarray], optional
+        State and state derivative of the column at the end of the last run.
+    """
+
+    time: np.ndarray
+    column_outlets: np.ndarray
+    outlets: dict[str, np.ndarray]
+    history: np.ndarray
+    converged: bool
+    time_elapsed: float = 0.0
+    state: Optional[tuple[np.ndarray, np.ndarray]] = field(default=None, repr=False)
+
+    @property
+    def n_iterations(self) -> int:
+        """int: Number of simulated carousel cycles."""
+        return len(self.history)
+
+    def resample(self, n_points: int = 100) -> dict[str, np.ndarray]:
+        """
+        Resample the outlet profiles at the midpoints of n_points intervals.
+
+        The returned profiles can be compared with the last period returned by
+        `switch_period_profiles` for a full flow sheet simulation.
+
+        Parameters
+        ----------
+        n_points : int, optional
+            Number of samples. The default is 100.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            Profiles with shape (n_points, n_comp) for each outlet.
+        """
+        switch_time = self.time[-1]
+        relative_time = (np.arange(n_points) + 0.5) / n_points * switch_time
+
+        return {
+            name: np.stack(
+                [np.interp(relative_time, self.time, c) for c in profile.T],
+                axis=-1,
+            )
+            for name, profile in self.outlets.items()
+        }
+
+
+class SingleColumnSolver:
+    """
+    Compute the cyclic steady state of a carousel process with one column.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder. Only serial zones connected in a ring are
+        supported.
+    process_simulator : Cadet
+        Simulator used for the single-column runs.
+    n_points : int, optional
+        Number of piecewise linear segments used to store the outlet history of a
+        switch period. The default is 100.
+
+    See Also
+    --------
+    zone_layouts
+    simulate_to_css
+    """
+
+    def __init__(
+        self,
+        builder: CarouselBuilder,
+        process_simulator: Cadet,
+        n_points: int = 100,
+    ) -> None:
+        self.builder = builder
+        self.process_simulator = process_simulator
+        self.n_points = n_points
+
+        self.layouts = zone_layouts(builder)
+        self.zone_indices = position_zones(builder)
+
+        self.column = copy.copy(builder.column)
+        self.column.name = "column"
+
+    @property
+    def n_comp(self) -> int:
+        """int: Number of components."""
+        return self.builder.component_system.n_comp
+
+    @property
+    def n_positions(self) -> int:
+        """int: Number of carousel positions."""
+        return self.builder.n_columns
+
+    @property
+    def time(self) -> np.ndarray:
+        """np.ndarray: Nodes of the stored outlet histories."""
+        return np.linspace(0, self.builder.switch_time, self.n_points + 1)
+
+    def _layout(self, position: int) -> ZoneLayout:
+        return self.layouts[self.zone_indices[position]]
+
+    def inlet_profile(self, position: int, column_outlets: np.ndarray) -> np.ndarray:
+        """
+        Compute the inlet profile of a carousel position.
+
+        Parameters
+        ----------
+        position : int
+            Carousel position.
+        column_outlets : np.ndarray
+            Stored outlet profiles of all positions.
+
+        Returns
+        -------
+        np.ndarray
+            Inlet concentration at the nodes of the outlet history.
+        """
+        layout = self._layout(position)
+        upstream_outlet = column_outlets[position - 1]
+
+        if position != layout.positions[0]:
+            return upstream_outlet.copy()
+
+        mass_flow = layout.upstream_flow_rate * upstream_outlet + (
+            layout.inlet_mass_flow(self.n_comp)
+        )
+
+        return mass_flow / layout.flow_rate
+
+    def build_process(self, position: int, inlet_profile: np.ndarray) -> Process:
+        """
+        Build the single-column process for one switch period at a position.
+
+        Parameters
+        ----------
+        position : int
+            Carousel position.
+        inlet_profile : np.ndarray
+            Inlet concentration at the nodes of the outlet history.
+
+        Returns
+        -------
+        Process
+            Process with one column simulating one switch period.
+        """
+        component_system = self.builder.component_system
+        layout = self._layout(position)
+
+        flow_sheet = FlowSheet(component_system, "single_column")
+        inlet = Inlet(component_system, name="inlet")
+        inlet.flow_rate = layout.flow_rate
+        outlet = Outlet(component_system, name="outlet")
+        self.column.flow_direction = layout.flow_direction
+
+        flow_sheet.add_unit(inlet)
+        flow_sheet.add_unit(self.column)
+        flow_sheet.add_unit(outlet)
+        flow_sheet.add_connection(inlet, self.column)
+        flow_sheet.add_connection(self.column, outlet)
+
+        process = Process(flow_sheet, "single_column")
+        process.cycle_time = self.builder.switch_time
+
+        time = self.time
+        slopes = np.diff(inlet_profile, axis=0) / np.diff(time)[:, np.newaxis]
+        for i, (t, c, slope) in enumerate(zip(time[:-1], inlet_profile, slopes)):
+            process.add_event(
+                f"inlet_{i}",
+                "flow_sheet.inlet.c",
+                np.column_stack((c, slope)).tolist(),
+                t,
+            )
+
+        return process
+
+    def _simulate_position(
+        self,
+        position: int,
+        inlet_profile: np.ndarray,
+        state: Optional[tuple[np.ndarray, np.ndarray]],
+    ) -> tuple[np.ndarray, tuple[np.ndarray, np.ndarray], float]:
+        """Simulate one switch period and return outlet, final state and time."""
+        process = self.build_process(position, inlet_profile)
+        if state is not None:
+            process.system_state, process.system_state_derivative = state
+
+        n_cycles_orig = self.process_simulator.n_cycles
+        try:
+            results = self.process_simulator.simulate_n_cycles(process, 1)
+        finally:
+            self.process_simulator.n_cycles = n_cycles_orig
+
+        time = results.time_complete
+        solution = results.solution.outlet.inlet.solution
+        outlet_profile = np.stack(
+            [np.interp(self.time, time, c) for c in solution.T], axis=-1
+        )
+        state = (
+            np.asarray(results.system_state["state"]),
+            np.asarray(results.system_state["state_derivative"]),
+        )
+
+        return outlet_profile, state, results.time_elapsed
+
+    def _cycle(
+        self,
+        column_outlets: np.ndarray,
+        state: Optional[tuple[np.ndarray, np.ndarray]],
+    ) -> tuple[np.ndarray, tuple[np.ndarray, np.ndarray], float]:
+        """Move the column once around the carousel."""
+        column_outlets = column_outlets.copy()
+        time_elapsed = 0
+        for position in reversed(range(self.n_positions)):
+            inlet_profile = self.inlet_profile(position, column_outlets)
+            column_outlets[position], state, elapsed = self._simulate_position(
+                position, inlet_profile, state
+            )
+            time_elapsed += elapsed
+
+        return column_outlets, state, time_elapsed
+
+    def simulate(
+        self,
+        tol: float = 1e-4,
+        n_cycles_max: int = 100,
+        acceleration: Optional[Literal["anderson"]] = None,
+        anderson_depth: int = 3,
+    ) -> SingleColumnResults:
+        """
+        Iterate the single-column cycle until cyclic steady state is reached.
+
+        Parameters
+        ----------
+        tol : float, optional
+            Tolerance for the relative change of the outlet histories of all
+            positions between two iterations. The default is 1e-4.
+        n_cycles_max : int, optional
+            Maximum number of iterations. The default is 100.
+        acceleration : {None, 'anderson'}, optional
+            If 'anderson', the fixed-point iteration on the outlet histories and the
+            column state at the period boundary is accelerated with Anderson mixing,
+            a multisecant quasi-Newton method. The default is None.
+        anderson_depth : int, optional
+            Number of previous iterates used for Anderson mixing. The default is 3.
+
+        Returns
+        -------
+        SingleColumnResults
+            Outlet profiles of all positions and external outlets at CSS.
+        """
+        if acceleration not in (None, "anderson"):
+            raise CADETProcessError(f"Unknown acceleration method {acceleration}.")
+
+        shape = (self.n_positions, self.n_points + 1, self.n_comp)
+        column_outlets = np.zeros(shape)
+        state = None
+
+        history = []
+        x_history = []
+        g_history = []
+        time_elapsed = 0
+        converged = False
+
+        for i_cycle in range(n_cycles_max):
+            new_outlets, new_state, elapsed = self._cycle(column_outlets, state)
+            time_elapsed += elapsed
+
+            norm = max(np.linalg.norm(new_outlets), np.finfo(float).tiny)
+            history.append(np.linalg.norm(new_outlets - column_outlets) / norm)
+
+            if history[-1] < tol:
+                column_outlets, state = new_outlets, new_state
+                converged = True
+                break
+
+            if acceleration is None or state is None:
+                column_outlets, state = new_outlets, new_state
+                continue
+
+            x = np.concatenate((column_outlets.ravel(), *state))
+            g = np.concatenate((new_outlets.ravel(), *new_state))
+            x_history.append(x)
+            g_history.append(g)
+            x_history = x_history[-(anderson_depth + 1) :]
+            g_history = g_history[-(anderson_depth + 1) :]
+
+            x_new = self._anderson_step(x_history, g_history)
+
+            n_outlets = column_outlets.size
+            column_outlets = np.clip(x_new[:n_outlets].reshape(shape), 0, None)
+            y, ydot = np.split(x_new[n_outlets:], 2)
+            state = (y, ydot)
+
+        outlets = {}
+        for layout in self.layouts:
+            for name in layout.outlets:
+                outlets[name] = column_outlets[layout.positions[-1]]
+
+        return SingleColumnResults(
+            time=self.time,
+            column_outlets=column_outlets,
+            outlets=outlets,
+            history=np.array(history),
+            converged=converged,
+            time_elapsed=time_elapsed,
+            state=state,
+        )
+
+    @staticmethod
+    def _anderson_step(
+        x_history: list[np.ndarray],
+        g_history: list[np.ndarray],
+    ) -> np.ndarray:
+        """Compute the next iterate from previous iterates and their images."""
+        g = g_history[-1]
+        if len(x_history) < 2:
+            return g
+
+        f = [g_i - x_i for x_i, g_i in zip(x_history, g_history)]
+        delta_f = np.column_stack([f[i + 1] - f[i] for i in range(len(f) - 1)])
+        delta_g = np.column_stack(
+            [g_history[i + 1] - g_history[i] for i in range(len(f) - 1)]
+        )
+        gamma, *_ = np.linalg.lstsq(delta_f, f[-1], rcond=None)
+
+        return g - delta_g @ gamma
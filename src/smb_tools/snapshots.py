@@ -0,0 +1,131 @@
+"""
+Axial concentration profiles of all carousel positions at many time points.
+
+`CarouselSolutionBulk.plot_at_time` looks up the time index and the column of every
+carousel position separately for each time point. The functions in this module
+determine all time indices with one `searchsorted`, compute the position-to-column
+map for all time points at once and gather the profiles column by column.
+"""
+
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.modelBuilder.carouselBuilder import CarouselSolutionBulk
+from CADETProcess.simulationResults import SimulationResults
+
+__all__ = ["position_column_map", "bulk_snapshots", "axial_snapshots"]
+
+
+def position_column_map(builder: CarouselBuilder, times: npt.ArrayLike) -> np.ndarray:
+    """
+    Return the index of the column at every carousel position for every time.
+
+    Equivalent to calling `builder.column_indices_at_time(t, position)` for all
+    combinations of times and positions.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+    times : npt.ArrayLike
+        Time points.
+
+    Returns
+    -------
+    np.ndarray
+        Column indices with shape (n_times, n_positions).
+    """
+    times = np.asarray(times, dtype=float)
+    carousel_states = np.floor(
+        (times % builder.cycle_time) / builder.switch_time
+    ).astype(int)
+    positions = np.arange(builder.n_columns)
+
+    return (positions + carousel_states[:, np.newaxis]) % builder.n_columns
+
+
+def bulk_snapshots(
+    builder: CarouselBuilder,
+    simulation_results: SimulationResults,
+    times: npt.ArrayLike,
+    scale: Optional[npt.ArrayLike] = None,
+) -> np.ndarray:
+    """
+    Extract the bulk profiles of all carousel positions at the given times.
+
+    The first stored time point that is not earlier than the requested time is
+    used, as in `CarouselSolutionBulk.plot_at_time`.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Builder the process was created with.
+    simulation_results : SimulationResults
+        Results of the carousel process containing the bulk solution of all
+        columns.
+    times : npt.ArrayLike
+        Time points of the snapshots.
+    scale : npt.ArrayLike, optional
+        Factor per component that is multiplied with the concentrations, e.g. the
+        molar masses for converting mol / m^3 to g / m^3.
+
+    Returns
+    -------
+    np.ndarray
+        Profiles with shape (n_times, n_positions, ncol, n_comp), sorted by
+        carousel position.
+    """
+    times = np.atleast_1d(np.asarray(times, dtype=float))
+    solution = simulation_results.solution
+    time = solution.column_0.bulk.time
+
+    time_indices = np.searchsorted(time, times, side="left")
+    time_indices = np.minimum(time_indices, len(time) - 1)
+    column_map = position_column_map(builder, times)
+
+    shape = solution.column_0.bulk.solution.shape[1:]
+    snapshots = np.empty((len(times), builder.n_columns, *shape))
+
+    for column_index in range(builder.n_columns):
+        i_time, i_position = np.nonzero(column_map == column_index)
+        bulk = solution[f"column_{column_index}"].bulk.solution
+        snapshots[i_time, i_position] = bulk[time_indices[i_time]]
+
+    if scale is not None:
+        snapshots *= np.asarray(scale)
+
+    return snapshots
+
+
+def axial_snapshots(
+    solution_bulk: CarouselSolutionBulk,
+    times: npt.ArrayLike,
+    scale: Optional[npt.ArrayLike] = None,
+) -> np.ndarray:
+    """
+    Extract the bulk profiles of all carousel positions at the given times.
+
+    Parameters
+    ----------
+    solution_bulk : CarouselSolutionBulk
+        Bulk solution of the carousel process.
+    times : npt.ArrayLike
+        Time points of the snapshots.
+    scale : npt.ArrayLike, optional
+        Factor per component that is multiplied with the concentrations.
+
+    Returns
+    -------
+    np.ndarray
+        Profiles with shape (n_times, n_positions, ncol, n_comp), sorted by
+        carousel position.
+
+    See Also
+    --------
+    bulk_snapshots
+    """
+    return bulk_snapshots(
+        solution_bulk.builder, solution_bulk.simulation_results, times, scale
+    )
@@ -0,0 +1,484 @@
+"""
+Layout of the CADET system state of flow sheets and carousel processes.
+
+CADET stores the complete state of a flow sheet in one vector (`INIT_STATE_Y`,
+`process.system_state`). It consists of the states of all unit operations in order
+of their unit index, followed by the coupling block containing the inlet
+concentrations of all units with an inlet port. The functions in this module split
+this vector into the blocks of the individual units, move the column blocks of a
+carousel process between carousel positions and interpolate the state between
+different discretizations of the same flow sheet.
+"""
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import (
+    Cstr,
+    FlowSheet,
+    GeneralRateModel,
+    Inlet,
+    LumpedRateModelWithoutPores,
+    LumpedRateModelWithPores,
+    Outlet,
+    Process,
+    TubularReactor,
+)
+from CADETProcess.processModel.discretization import DGMixin
+from CADETProcess.processModel.unitOperation import UnitBaseClass
+
+__all__ = [
+    "axial_points",
+    "unit_state_size",
+    "unit_state_sizes",
+    "coupling_state_size",
+    "split_state",
+    "join_state",
+    "column_blocks",
+    "remap_carousel_state",
+    "interpolate_unit_state",
+    "interpolate_state",
+]
+
+
+def axial_points(unit: UnitBaseClass) -> int:
+    """
+    Return the number of axial discretization points of a column.
+
+    Parameters
+    ----------
+    unit : UnitBaseClass
+        Tubular reactor or chromatographic column.
+
+    Returns
+    -------
+    int
+        Number of axial cells (FV) or axial nodes (DG).
+    """
+    discretization = unit.discretization
+    if isinstance(discretization, DGMixin):
+        return discretization.axial_dof
+    return discretization.ncol
+
+
+def _particle_points(unit: GeneralRateModel) -> int:
+    """Return the number of radial discretization points of the particles."""
+    discretization = unit.discretization
+    if isinstance(discretization, DGMixin):
+        return discretization.par_disc_vector_length
+    return discretization.npar
+
+
+def unit_state_size(unit: UnitBaseClass) -> int:
+    """
+    Return the number of entries of a unit operation in the CADET state vector.
+
+    Parameters
+    ----------
+    unit : UnitBaseClass
+        Unit operation.
+
+    Returns
+    -------
+    int
+        Number of degrees of freedom of the unit, including its inlet block.
+
+    Raises
+    ------
+    CADETProcessError
+        If the unit operation type is not supported.
+    """
+    n_comp = unit.n_comp
+
+    if isinstance(unit, (Inlet, Outlet)):
+        return n_comp
+
+    n_bound = unit.n_bound_states
+
+    if isinstance(unit, Cstr):
+        return n_comp + n_comp + n_bound + 1
+
+    n_col = axial_points(unit)
+
+    if isinstance(unit, LumpedRateModelWithoutPores):
+        return n_comp + n_col * (n_comp + n_bound)
+    if isinstance(unit, LumpedRateModelWithPores):
+        return n_comp + n_col * n_comp + n_col * (n_comp + n_bound) + n_col * n_comp
+    if isinstance(unit, GeneralRateModel):
+        n_par = _particle_points(unit)
+        return (
+            n_comp
+            + n_col * n_comp
+            + n_col * n_par * (n_comp + n_bound)
+            + n_col * n_comp
+        )
+    if isinstance(unit, TubularReactor):
+        return n_comp + n_col * n_comp
+
+    raise CADETProcessError(f"Unknown state layout of {type(unit).__name__}.")
+
+
+def unit_state_sizes(flow_sheet: FlowSheet) -> dict[str, int]:
+    """
+    Return the state sizes of all unit operations in order of their unit index.
+
+    Parameters
+    ----------
+    flow_sheet : FlowSheet
+        Flow sheet of the process.
+
+    Returns
+    -------
+    dict[str, int]
+        Number of degrees of freedom of every unit.
+    """
+    return {unit.name: unit_state_size(unit) for unit in flow_sheet.units}
+
+
+def coupling_state_size(flow_sheet: FlowSheet) -> int:
+    """
+    Return the size of the coupling block at the end of the state vector.
+
+    Parameters
+    ----------
+    flow_sheet : FlowSheet
+        Flow sheet of the process.
+
+    Returns
+    -------
+    int
+        Number of inlet concentrations of all units with an inlet port.
+    """
+    return sum(unit.n_comp for unit in flow_sheet.units if not isinstance(unit, Inlet))
+
+
+def split_state(
+    flow_sheet: FlowSheet,
+    state: np.ndarray,
+) -> tuple[dict[str, np.ndarray], np.ndarray]:
+    """
+    Split a CADET state vector into the blocks of the unit operations.
+
+    Parameters
+    ----------
+    flow_sheet : FlowSheet
+        Flow sheet of the process.
+    state : np.ndarray
+        State vector, e.g. `simulation_results.system_state["state"]`.
+
+    Returns
+    -------
+    tuple[dict[str, np.ndarray], np.ndarray]
+        State of every unit operation and the remaining coupling block.
+
+    Raises
+    ------
+    CADETProcessError
+        If the state does not match the flow sheet.
+    """
+    state = np.asarray(state, dtype=float)
+    sizes = unit_state_sizes(flow_sheet)
+
+    n_units = sum(sizes.values())
+    if len(state) != n_units + coupling_state_size(flow_sheet):
+        raise CADETProcessError(
+            f"State of length {len(state)} does not match flow sheet "
+            f"{flow_sheet.name}."
+        )
+
+    offsets = np.cumsum([0, *sizes.values()])
+    blocks = {
+        name: state[start:end]
+        for name, start, end in zip(sizes, offsets[:-1], offsets[1:])
+    }
+
+    return blocks, state[n_units:]
+
+
+def join_state(
+    flow_sheet: FlowSheet,
+    blocks: dict[str, np.ndarray],
+    coupling: np.ndarray,
+) -> np.ndarray:
+    """
+    Assemble a CADET state vector from the blocks of the unit operations.
+
+    Parameters
+    ----------
+    flow_sheet : FlowSheet
+        Flow sheet of the process.
+    blocks : dict[str, np.ndarray]
+        State of every unit operation.
+    coupling : np.ndarray
+        Coupling block.
+
+    Returns
+    -------
+    np.ndarray
+        State vector.
+
+    See Also
+    --------
+    split_state
+    """
+    return np.concatenate([blocks[unit.name] for unit in flow_sheet.units] + [coupling])
+
+
+def _coupling_blocks(flow_sheet: FlowSheet, coupling: np.ndarray) -> dict:
+    """Split the coupling block into the inlet concentrations of each unit."""
+    names = [unit.name for unit in flow_sheet.units if not isinstance(unit, Inlet)]
+    return dict(zip(names, np.split(coupling, len(names))))
+
+
+def _column_indices(builder: CarouselBuilder, t: float) -> np.ndarray:
+    """Return the column indices of all positions, robust to round-off at switches."""
+    positions = np.arange(builder.n_columns)
+    return builder.column_indices_at_time(t + 1e-6 * builder.switch_time, positions)
+
+
+def column_blocks(
+    process: Process,
+    builder: CarouselBuilder,
+    state: np.ndarray,
+    t: float = 0,
+) -> np.ndarray:
+    """
+    Return the column states of a carousel process sorted by carousel position.
+
+    Parameters
+    ----------
+    process : Process
+        Process created by `builder.build_process()`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    state : np.ndarray
+        State vector of the carousel process.
+    t : float, optional
+        Time at which the state was taken. The default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        Column states with shape (n_columns, n_dof_column).
+    """
+    blocks, _ = split_state(process.flow_sheet, state)
+    col_indices = _column_indices(builder, t)
+
+    return np.stack([blocks[f"column_{i}"] for i in col_indices])
+
+
+def remap_carousel_state(
+    process: Process,
+    builder: CarouselBuilder,
+    state: np.ndarray,
+    t_from: float,
+    t_to: float = 0,
+) -> np.ndarray:
+    """
+    Move the column states of a carousel process to a different carousel state.
+
+    The state of the column at carousel position `i` at `t_from` is assigned to the
+    column at carousel position `i` at `t_to`. Valve states are not changed. This
+    is used to restart a process from a state taken at an arbitrary switch.
+
+    Parameters
+    ----------
+    process : Process
+        Process created by `builder.build_process()`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    state : np.ndarray
+        State vector (or state derivative) of the carousel process.
+    t_from : float
+        Time at which the state was taken. At a switch boundary, the state belongs
+        to the carousel state starting at that time.
+    t_to : float, optional
+        Time from which on the process is continued. The default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        Remapped state vector.
+    """
+    flow_sheet = process.flow_sheet
+    blocks, coupling = split_state(flow_sheet, state)
+    coupling_blocks = _coupling_blocks(flow_sheet, coupling)
+
+    col_from = _column_indices(builder, t_from)
+    col_to = _column_indices(builder, t_to)
+
+    new_blocks = blocks.copy()
+    new_coupling_blocks = coupling_blocks.copy()
+    for i_from, i_to in zip(col_from, col_to):
+        new_blocks[f"column_{i_to}"] = blocks[f"column_{i_from}"]
+        new_coupling_blocks[f"column_{i_to}"] = coupling_blocks[f"column_{i_from}"]
+
+    new_coupling = np.concatenate(
+        [
+            new_coupling_blocks[unit.name]
+            for unit in flow_sheet.units
+            if not isinstance(unit, Inlet)
+        ]
+    )
+
+    return join_state(flow_sheet, new_blocks, new_coupling)
+
+
+_COLUMN_TYPES = (
+    LumpedRateModelWithoutPores,
+    LumpedRateModelWithPores,
+    GeneralRateModel,
+    TubularReactor,
+)
+"""tuple: Unit operations with an axially discretized state."""
+
+
+def _column_segments(unit: UnitBaseClass) -> list[tuple[int, ...]]:
+    """
+    Return the shapes of the state segments of a column after its inlet block.
+
+    The first dimension of every segment is the axial coordinate. For the particle
+    segment of the `GeneralRateModel`, the second dimension is the radial one.
+    """
+    n_comp = unit.n_comp
+    n_bound = unit.n_bound_states
+    n_col = axial_points(unit)
+
+    if isinstance(unit, LumpedRateModelWithoutPores):
+        return [(n_col, n_comp + n_bound)]
+    if isinstance(unit, LumpedRateModelWithPores):
+        return [(n_col, n_comp), (n_col, n_comp + n_bound), (n_col, n_comp)]
+    if isinstance(unit, GeneralRateModel):
+        n_par = _particle_points(unit)
+        return [(n_col, n_comp), (n_col, n_par, n_comp + n_bound), (n_col, n_comp)]
+    if isinstance(unit, TubularReactor):
+        return [(n_col, n_comp)]
+
+    raise CADETProcessError(f"Unknown state layout of {type(unit).__name__}.")
+
+
+def _interpolate_cells(values: np.ndarray, n_cells: int, axis: int) -> np.ndarray:
+    """Linearly interpolate values at equidistant cell centers to `n_cells` cells."""
+    n_from = values.shape[axis]
+    if n_from == n_cells:
+        return values.copy()
+    if n_from == 1:
+        return np.repeat(values, n_cells, axis=axis)
+
+    x_from = (np.arange(n_from) + 0.5) / n_from
+    x_to = (np.arange(n_cells) + 0.5) / n_cells
+
+    j = np.clip(np.searchsorted(x_from, x_to) - 1, 0, n_from - 2)
+    weight = np.clip((x_to - x_from[j]) * n_from, 0, 1)
+    shape = [1] * values.ndim
+    shape[axis] = n_cells
+    weight = weight.reshape(shape)
+
+    lower = np.take(values, j, axis=axis)
+    upper = np.take(values, j + 1, axis=axis)
+
+    return (1 - weight) * lower + weight * upper
+
+
+def interpolate_unit_state(
+    unit_from: UnitBaseClass,
+    unit_to: UnitBaseClass,
+    block: np.ndarray,
+) -> np.ndarray:
+    """
+    Interpolate the state of a unit operation onto another discretization.
+
+    Column states are interpolated linearly between the cell centers of the axial
+    and, for the `GeneralRateModel`, the radial discretization. Cell centers are
+    assumed to be equidistant. States of other unit operations are copied.
+
+    Parameters
+    ----------
+    unit_from : UnitBaseClass
+        Unit operation with the discretization of `block`.
+    unit_to : UnitBaseClass
+        Same unit operation with the target discretization.
+    block : np.ndarray
+        State (or state derivative) of `unit_from`.
+
+    Returns
+    -------
+    np.ndarray
+        State of `unit_to`.
+
+    Raises
+    ------
+    CADETProcessError
+        If the units are of different type or use a DG discretization.
+    """
+    if type(unit_from) is not type(unit_to):
+        raise CADETProcessError(
+            f"Cannot interpolate {type(unit_from).__name__} onto "
+            f"{type(unit_to).__name__}."
+        )
+    if not isinstance(unit_from, _COLUMN_TYPES):
+        return np.array(block, dtype=float)
+    if isinstance(unit_from.discretization, DGMixin) or isinstance(
+        unit_to.discretization, DGMixin
+    ):
+        raise CADETProcessError("Interpolation of DG discretizations is not supported.")
+
+    n_comp = unit_from.n_comp
+    segments_from = _column_segments(unit_from)
+    segments_to = _column_segments(unit_to)
+    if segments_from == segments_to:
+        return np.array(block, dtype=float)
+
+    sizes = [int(np.prod(shape)) for shape in segments_from]
+    offsets = np.cumsum([n_comp, *sizes])
+
+    new_segments = [np.asarray(block[:n_comp], dtype=float)]
+    for start, end, shape_from, shape_to in zip(
+        offsets[:-1], offsets[1:], segments_from, segments_to
+    ):
+        values = np.reshape(block[start:end], shape_from)
+        for axis in range(len(shape_from) - 1):
+            values = _interpolate_cells(values, shape_to[axis], axis)
+        new_segments.append(values.ravel())
+
+    return np.concatenate(new_segments)
+
+
+def interpolate_state(
+    flow_sheet_from: FlowSheet,
+    flow_sheet_to: FlowSheet,
+    state: np.ndarray,
+) -> np.ndarray:
+    """
+    Interpolate a CADET state vector onto a flow sheet with another discretization.
+
+    Parameters
+    ----------
+    flow_sheet_from : FlowSheet
+        Flow sheet the state belongs to.
+    flow_sheet_to : FlowSheet
+        Flow sheet with the same units, but a different discretization.
+    state : np.ndarray
+        State vector (or state derivative) of `flow_sheet_from`.
+
+    Returns
+    -------
+    np.ndarray
+        State vector of `flow_sheet_to`.
+
+    See Also
+    --------
+    interpolate_unit_state
+    """
+    blocks, coupling = split_state(flow_sheet_from, state)
+    units_from = {unit.name: unit for unit in flow_sheet_from.units}
+
+    new_blocks = {}
+    for unit in flow_sheet_to.units:
+        if unit.name not in units_from:
+            raise CADETProcessError(f"Unit {unit.name} is not part of the state.")
+        new_blocks[unit.name] = interpolate_unit_state(
+            units_from[unit.name], unit, blocks[unit.name]
+        )
+
+    return join_state(flow_sheet_to, new_blocks, coupling)
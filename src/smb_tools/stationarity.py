@@ -0,0 +1,344 @@
+"""
+Cyclic steady state (CSS) detection for carousel processes.
+
+Instead of simulating a fixed number of cycles, the process is simulated in batches
+of cycles. After every batch, the outlet profiles of each switch period are compared
+with those of the previous period and the simulation stops once the difference
+drops below a tolerance.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import matplotlib.pyplot as plt
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Process
+from CADETProcess.simulationResults import SimulationResults
+from CADETProcess.simulator import Cadet
+
+__all__ = [
+    "CSSReport",
+    "switch_period_profiles",
+    "period_differences",
+    "boundary_state_differences",
+    "simulate_to_css",
+]
+
+
+@dataclass
+class CSSReport:
+    """
+    Convergence information of a CSS run.
+
+    Attributes
+    ----------
+    converged : bool
+        True if the tolerance was met before `n_cycles_max` was reached.
+    css_switch : int or None
+        Index of the first switch period from which on all period-to-period
+        differences are below the tolerance.
+    n_switches : int
+        Number of simulated switch periods.
+    tolerance : float
+        Tolerance used for the convergence check.
+    outlet_history : np.ndarray
+        Relative difference of the outlet profiles of each switch period to the
+        previous one. The first entry is NaN.
+    bulk_history : np.ndarray or None
+        Relative difference of the column states at the end of each switch period
+        to the previous one, if the column states were compared.
+    """
+
+    converged: bool
+    css_switch: Optional[int]
+    n_switches: int
+    tolerance: float
+    outlet_history: np.ndarray
+    bulk_history: Optional[np.ndarray] = None
+
+    @property
+    def history(self) -> np.ndarray:
+        """np.ndarray: Combined convergence history used for the CSS check."""
+        if self.bulk_history is None:
+            return self.outlet_history
+        return np.fmax(self.outlet_history, self.bulk_history)
+
+    def plot(self, ax: Optional[plt.Axes] = None) -> plt.Axes:
+        """Plot the convergence history over the switch periods."""
+        if ax is None:
+            fig, ax = plt.subplots()
+
+        ax.semilogy(self.outlet_history, label="outlets")
+        if self.bulk_history is not None:
+            ax.semilogy(self.bulk_history, label="column states")
+        ax.axhline(self.tolerance, color="k", linestyle="dashed", label="tolerance")
+        if self.css_switch is not None:
+            ax.axvline(self.css_switch, color="k", linestyle="dotted", label="CSS")
+
+        ax.set_xlabel("Switches")
+        ax.set_ylabel("Relative difference to previous period")
+        ax.legend()
+
+        return ax
+
+
+def _n_complete_switches(time: np.ndarray, switch_time: float) -> int:
+    """Return the number of switch periods fully contained in time."""
+    return int(np.floor(time[-1] / switch_time + 1e-9))
+
+
+def switch_period_profiles(
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+    outlets: Optional[list[str]] = None,
+    n_points: int = 100,
+) -> dict[str, np.ndarray]:
+    """
+    Resample outlet profiles onto a common time grid for every switch period.
+
+    Samples are taken at the midpoints of `n_points` equally sized intervals of
+    each period to avoid the discontinuities at the switch times.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the carousel process.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    outlets : list[str], optional
+        Names of the outlet units. If None, all outlets of the flow sheet are used.
+    n_points : int, optional
+        Number of samples per switch period. The default is 100.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Profiles with shape (n_switches, n_points, n_comp) for each outlet.
+    """
+    if outlets is None:
+        outlets = [unit.name for unit in builder.flow_sheet.outlets]
+
+    time = simulation_results.time_complete
+    switch_time = builder.switch_time
+    n_switches = _n_complete_switches(time, switch_time)
+
+    relative_time = (np.arange(n_points) + 0.5) / n_points * switch_time
+    sample_time = (
+        np.arange(n_switches)[:, np.newaxis] * switch_time + relative_time
+    ).ravel()
+
+    profiles = {}
+    for outlet in outlets:
+        solution = simulation_results.solution[outlet].inlet.solution
+        resampled = np.stack(
+            [np.interp(sample_time, time, c) for c in solution.T],
+            axis=-1,
+        )
+        profiles[outlet] = resampled.reshape(n_switches, n_points, -1)
+
+    return profiles
+
+
+def period_differences(profiles: dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Compute the relative difference of each switch period to the previous one.
+
+    Parameters
+    ----------
+    profiles : dict[str, np.ndarray]
+        Profiles with shape (n_switches, ...) as returned by
+        `switch_period_profiles`.
+
+    Returns
+    -------
+    np.ndarray
+        Maximum relative L2 difference over all entries of profiles. The first
+        entry is NaN.
+    """
+    differences = []
+    for profile in profiles.values():
+        profile = profile.reshape(profile.shape[0], -1)
+        norm = np.linalg.norm(profile[1:], axis=1)
+        delta = np.linalg.norm(np.diff(profile, axis=0), axis=1)
+        differences.append(delta / np.maximum(norm, np.finfo(float).tiny))
+
+    differences = np.max(differences, axis=0)
+
+    return np.concatenate(([np.nan], differences))
+
+
+def boundary_state_differences(
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+) -> np.ndarray:
+    """
+    Compare the column states at the end of consecutive switch periods.
+
+    The bulk concentrations are sorted by carousel position such that the states of
+    two periods are identical at CSS.
+    Requires `column.solution_recorder.write_solution_bulk = True`.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the carousel process.
+    builder : CarouselBuilder
+        Builder the process was created with.
+
+    Returns
+    -------
+    np.ndarray
+        Relative L2 difference of the position-sorted bulk states. The first entry
+        is NaN.
+    """
+    if not builder.column.solution_recorder.write_solution_bulk:
+        raise CADETProcessError(
+            "Cannot compare column states if bulk solution is not stored."
+        )
+
+    solution = simulation_results.solution
+    time = solution.column_0.bulk.time
+    switch_time = builder.switch_time
+    n_switches = _n_complete_switches(time, switch_time)
+    positions = np.arange(builder.n_columns)
+
+    states = []
+    for switch in range(n_switches):
+        t_end = (switch + 1) * switch_time
+        t_i = min(np.searchsorted(time, t_end - 1e-9), len(time) - 1)
+        col_indices = builder.column_indices_at_time(t_end - switch_time / 2, positions)
+        states.append(
+            np.stack([solution[f"column_{i}"].bulk.solution[t_i] for i in col_indices])
+        )
+
+    return period_differences({"bulk": np.array(states)})
+
+
+def _css_switch(history: np.ndarray, tol: float) -> Optional[int]:
+    """Return first index from which on history stays below tol."""
+    above = np.flatnonzero(~(history[1:] < tol))
+    if len(above) == 0:
+        return 1 if len(history) > 1 else None
+    css_switch = above[-1] + 2
+    if css_switch >= len(history):
+        return None
+    return int(css_switch)
+
+
+def simulate_to_css(
+    process_simulator: Cadet,
+    process: Process,
+    builder: CarouselBuilder,
+    tol: float = 1e-3,
+    n_cycles_batch: int = 1,
+    n_cycles_min: int = 1,
+    n_cycles_max: int = 50,
+    outlets: Optional[list[str]] = None,
+    compare_bulk: bool = False,
+    n_points: int = 100,
+) -> tuple[SimulationResults, CSSReport]:
+    """
+    Simulate a carousel process until cyclic steady state is reached.
+
+    The process is simulated in batches of `n_cycles_batch` cycles, each continuing
+    from the final state of the previous batch. After every batch, the outlet
+    profiles (and optionally the column states) of each switch period are compared
+    with the previous period. The simulation stops once the difference of the last
+    switch period drops below `tol`.
+
+    Parameters
+    ----------
+    process_simulator : Cadet
+        Simulator with time integrator settings.
+    process : Process
+        Process created by `builder.build_process()`.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    tol : float, optional
+        Tolerance for the relative difference of consecutive periods.
+        The default is 1e-3.
+    n_cycles_batch : int, optional
+        Number of cycles simulated per batch. The default is 1.
+    n_cycles_min : int, optional
+        Minimum number of cycles. The default is 1.
+    n_cycles_max : int, optional
+        Maximum number of cycles. The default is 50.
+    outlets : list[str], optional
+        Names of the outlets to compare. If None, all outlets are compared.
+    compare_bulk : bool, optional
+        If True, also compare the column states at the end of each switch period.
+        The default is False.
+    n_points : int, optional
+        Number of samples per switch period for comparing the outlet profiles.
+        The default is 100.
+
+    Returns
+    -------
+    tuple[SimulationResults, CSSReport]
+        Results of all simulated cycles and the convergence report.
+
+    See Also
+    --------
+    switch_period_profiles
+    boundary_state_differences
+    """
+    if not process.check_config():
+        raise CADETProcessError("Process is not configured correctly.")
+    if n_cycles_max < n_cycles_min:
+        raise ValueError("n_cycles_max is set lower than n_cycles_min.")
+
+    n_cycles_orig = process_simulator.n_cycles
+    system_state_orig = process.system_state
+    system_state_derivative_orig = process.system_state_derivative
+
+    results = None
+    n_cycles = 0
+    try:
+        while True:
+            n_batch = min(
+                max(n_cycles_batch, n_cycles_min - n_cycles),
+                n_cycles_max - n_cycles,
+            )
+            new_results = process_simulator.simulate_n_cycles(
+                process, n_batch, previous_results=results
+            )
+            n_cycles += n_batch
+
+            if results is None:
+                results = new_results
+            else:
+                results.update(new_results)
+
+            profiles = switch_period_profiles(results, builder, outlets, n_points)
+            outlet_history = period_differences(profiles)
+            bulk_history = None
+            if compare_bulk:
+                bulk_history = boundary_state_differences(results, builder)
+
+            report = CSSReport(
+                converged=False,
+                css_switch=None,
+                n_switches=len(outlet_history),
+                tolerance=tol,
+                outlet_history=outlet_history,
+                bulk_history=bulk_history,
+            )
+            report.css_switch = _css_switch(report.history, tol)
+
+            if n_cycles >= n_cycles_min and report.css_switch is not None:
+                report.converged = True
+                break
+
+            if n_cycles >= n_cycles_max:
+                process_simulator.logger.warning(
+                    "Exceeded maximum number of cycles before reaching CSS."
+                )
+                break
+    finally:
+        process_simulator.n_cycles = n_cycles_orig
+        process.system_state = system_state_orig
+        process.system_state_derivative = system_state_derivative_orig
+
+    return results, report
@@ -0,0 +1,419 @@
+"""
+Receding-horizon simulation of carousel processes.
+
+Model-based control of a carousel process updates the operating point once per
+switch period: the outlets of the last period are measured, the model is
+re-optimized from the current state and the new switch time, flow rates and split
+fractions are applied to the next period. Here, a carousel process is advanced by
+exactly one switch period at a time. Instead of simulating the complete cycle, a
+process with only the first carousel state is simulated, and the column states are
+moved back by one position after every switch. This keeps every step at the cost of
+a single switch period and allows the operating point to change between steps.
+
+A plant stand-in for closed-loop studies is the same model with perturbed Henry
+coefficients, see `perturbed_plant`.
+"""
+
+import copy
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Linear, Process
+from CADETProcess.simulator import Cadet
+from scipy.integrate import trapezoid
+
+from .state import remap_carousel_state
+from .valves import build_process_without_valves
+
+__all__ = ["SwitchPeriod", "CarouselStepper", "perturbed_plant"]
+
+
+@dataclass
+class SwitchPeriod:
+    """
+    Outlet profiles of a single switch period.
+
+    Attributes
+    ----------
+    index : int
+        Number of the switch period, starting at 0.
+    t_start : float
+        Process time at the start of the period in s.
+    switch_time : float
+        Duration of the period in s.
+    inlet_flow_rates : dict[str, float]
+        Flow rates of the external inlets in m^3 / s.
+    split_fractions : dict[str, float]
+        Fraction of the zone outlet leaving through the external outlets by zone.
+    time : np.ndarray
+        Time points relative to the start of the period in s.
+    outlets : dict[str, np.ndarray]
+        Concentrations with shape (n_time, n_comp) of every outlet.
+    time_elapsed : float
+        Wall time of the step in s.
+    """
+
+    index: int
+    t_start: float
+    switch_time: float
+    inlet_flow_rates: dict[str, float]
+    split_fractions: dict[str, float]
+    time: np.ndarray
+    outlets: dict[str, np.ndarray] = field(repr=False)
+    time_elapsed: float
+
+    def mean_concentrations(self) -> dict[str, np.ndarray]:
+        """
+        Return the time-averaged outlet concentrations of the period.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            Mean concentration of every component for every outlet.
+        """
+        return {
+            outlet: trapezoid(c, self.time, axis=0) / self.switch_time
+            for outlet, c in self.outlets.items()
+        }
+
+
+def _split_state(builder: CarouselBuilder, zone, fraction: float) -> list[float]:
+    """Output state of a zone with `fraction` leaving through its external outlets."""
+    destinations = builder.flow_sheet.connections[zone].destinations[None]
+    n_external = sum(destination not in builder.zones for destination in destinations)
+    if n_external == 0:
+        raise CADETProcessError(f"Zone {zone.name} has no external outlet.")
+
+    return [
+        1 - fraction if destination in builder.zones else fraction / n_external
+        for destination in destinations
+    ]
+
+
+class CarouselStepper:
+    """
+    Advance a carousel process one switch period at a time.
+
+    The stepper works on a copy of the builder, which holds the current operating
+    point. The complete state of all columns and valves is carried over from one
+    step to the next.
+
+    Parameters
+    ----------
+    process_simulator : Cadet
+        Simulator used for every step.
+    builder : CarouselBuilder
+        Configured carousel builder with the initial operating point.
+    eliminate_valves : bool, optional
+        If True, the columns are connected directly, see
+        `build_process_without_valves`. The default is False.
+    initial_state : tuple[np.ndarray, np.ndarray], optional
+        State and state derivative at the start of the first period. If None, the
+        initial conditions of the units are used.
+
+    Examples
+    --------
+    >>> stepper = CarouselStepper(Cadet(), builder)
+    >>> period = stepper.step()
+    >>> period = stepper.step(switch_time=1500, split_fractions={"zone_I": 0.25})
+    """
+
+    def __init__(
+        self,
+        process_simulator: Cadet,
+        builder: CarouselBuilder,
+        eliminate_valves: bool = False,
+        initial_state: Optional[tuple[np.ndarray, np.ndarray]] = None,
+    ) -> None:
+        self.process_simulator = process_simulator
+        self.builder = copy.deepcopy(builder)
+        self.eliminate_valves = eliminate_valves
+
+        self.n_steps = 0
+        self.t = 0.0
+        self._process = None
+        self._state = initial_state
+
+    @property
+    def zones(self) -> list[str]:
+        """list[str]: Names of the zones with external outlets."""
+        flow_sheet = self.builder.flow_sheet
+        return [
+            zone.name
+            for zone in self.builder.zones
+            if any(
+                destination not in self.builder.zones
+                for destination in flow_sheet.connections[zone].destinations[None]
+            )
+        ]
+
+    @property
+    def inlets(self) -> list[str]:
+        """list[str]: Names of the external inlets."""
+        return [unit.name for unit in self.builder.flow_sheet.inlets]
+
+    @property
+    def inlet_flow_rates(self) -> dict[str, float]:
+        """dict[str, float]: Current flow rates of the external inlets."""
+        flow_sheet = self.builder.flow_sheet
+        return {
+            name: float(np.ravel(flow_sheet[name].flow_rate)[0]) for name in self.inlets
+        }
+
+    @property
+    def split_fractions(self) -> dict[str, float]:
+        """dict[str, float]: Current split fractions of the zones."""
+        flow_sheet = self.builder.flow_sheet
+        fractions = {}
+        for name in self.zones:
+            zone = flow_sheet[name]
+            destinations = flow_sheet.connections[zone].destinations[None]
+            fractions[name] = float(
+                sum(
+                    fraction
+                    for fraction, destination in zip(
+                        flow_sheet.output_states[zone], destinations
+                    )
+                    if destination not in self.builder.zones
+                )
+            )
+
+        return fractions
+
+    @property
+    def process(self) -> Process:
+        """Process: Carousel process of a single switch period."""
+        if self._process is None:
+            self._process = self._build_process()
+        return self._process
+
+    def _build_process(self) -> Process:
+        """Build the process and remove all events after the first switch."""
+        builder = self.builder
+        if self.eliminate_valves:
+            process = build_process_without_valves(builder)
+        else:
+            process = builder.build_process()
+
+        for evt in list(process.events):
+            if evt.time > 0:
+                process.remove_event(evt.name)
+        process.cycle_time = builder.switch_time
+
+        return process
+
+    @property
+    def state(self) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """tuple[np.ndarray, np.ndarray] or None: State at the start of the next period."""
+        return self._state
+
+    @state.setter
+    def state(self, state: Optional[tuple[np.ndarray, np.ndarray]]) -> None:
+        self._state = state
+
+    def set_operating_point(
+        self,
+        switch_time: Optional[float] = None,
+        inlet_flow_rates: Optional[dict[str, float]] = None,
+        split_fractions: Optional[dict[str, float]] = None,
+    ) -> None:
+        """
+        Change the operating point of the following switch periods.
+
+        Switch time and inlet flow rates are updated in the existing process. New
+        split fractions are applied to the valves; without valves, the process is
+        rebuilt since the splits are part of the events of the columns.
+
+        Parameters
+        ----------
+        switch_time : float, optional
+            Switch time in s.
+        inlet_flow_rates : dict[str, float], optional
+            Flow rates of external inlets by inlet name.
+        split_fractions : dict[str, float], optional
+            Fraction of the zone outlet leaving through the external outlets by
+            zone name.
+
+        Raises
+        ------
+        CADETProcessError
+            If an inlet or zone is unknown.
+        """
+        builder = self.builder
+        flow_sheet = builder.flow_sheet
+
+        if switch_time is not None:
+            builder.switch_time = switch_time
+            if self._process is not None:
+                self._process.cycle_time = switch_time
+
+        for name, flow_rate in (inlet_flow_rates or {}).items():
+            if name not in self.inlets:
+                raise CADETProcessError(f"Unknown inlet {name}.")
+            # Units are shared between the builder and its processes.
+            flow_sheet[name].flow_rate = flow_rate
+
+        for name, fraction in (split_fractions or {}).items():
+            if name not in self.zones:
+                raise CADETProcessError(f"Zone {name} has no external outlet.")
+            zone = flow_sheet[name]
+            output_state = _split_state(builder, zone, fraction)
+            builder.set_output_state(zone, output_state)
+            if self._process is None:
+                continue
+            if self.eliminate_valves:
+                self._process = None
+            else:
+                self._process.flow_sheet.set_output_state(
+                    zone.outlet_unit.name, output_state
+                )
+
+    def step(
+        self,
+        switch_time: Optional[float] = None,
+        inlet_flow_rates: Optional[dict[str, float]] = None,
+        split_fractions: Optional[dict[str, float]] = None,
+    ) -> SwitchPeriod:
+        """
+        Simulate the next switch period.
+
+        Parameters
+        ----------
+        switch_time : float, optional
+            Switch time in s.
+        inlet_flow_rates : dict[str, float], optional
+            Flow rates of external inlets by inlet name.
+        split_fractions : dict[str, float], optional
+            Fraction of the zone outlet leaving through the external outlets by
+            zone name.
+
+        Returns
+        -------
+        SwitchPeriod
+            Outlet profiles of the period.
+
+        See Also
+        --------
+        set_operating_point
+        """
+        start = time.perf_counter()
+        self.set_operating_point(switch_time, inlet_flow_rates, split_fractions)
+
+        builder = self.builder
+        process = self.process
+        process_simulator = self.process_simulator
+
+        n_cycles_orig = process_simulator.n_cycles
+        system_state_orig = process.system_state
+        system_state_derivative_orig = process.system_state_derivative
+        try:
+            if self._state is not None:
+                process.system_state, process.system_state_derivative = self._state
+            process_simulator.n_cycles = 1
+            simulation_results = process_simulator.simulate(process)
+        finally:
+            process_simulator.n_cycles = n_cycles_orig
+            process.system_state = system_state_orig
+            process.system_state_derivative = system_state_derivative_orig
+
+        # The state at the end of the period belongs to the next carousel state.
+        self._state = tuple(
+            remap_carousel_state(
+                process,
+                builder,
+                simulation_results.system_state[name],
+                t_from=builder.switch_time,
+            )
+            for name in ("state", "state_derivative")
+        )
+
+        period = SwitchPeriod(
+            index=self.n_steps,
+            t_start=self.t,
+            switch_time=float(builder.switch_time),
+            inlet_flow_rates=self.inlet_flow_rates,
+            split_fractions=self.split_fractions,
+            time=np.asarray(simulation_results.time_complete, dtype=float),
+            outlets={
+                unit.name: simulation_results.solution[unit.name].inlet.solution
+                for unit in builder.flow_sheet.outlets
+            },
+            time_elapsed=time.perf_counter() - start,
+        )
+        self.n_steps += 1
+        self.t += builder.switch_time
+
+        return period
+
+    def run(self, operating_points: list[dict]) -> list[SwitchPeriod]:
+        """
+        Simulate one switch period for every operating point.
+
+        Parameters
+        ----------
+        operating_points : list[dict]
+            Keyword arguments of `step` for every period.
+
+        Returns
+        -------
+        list[SwitchPeriod]
+            Outlet profiles of all periods.
+        """
+        return [self.step(**point) for point in operating_points]
+
+
+def perturbed_plant(
+    builder: CarouselBuilder,
+    henry_factors: Optional[npt.ArrayLike] = None,
+    rel_std: float = 0.05,
+    seed: Optional[int] = None,
+) -> tuple[CarouselBuilder, np.ndarray]:
+    """
+    Create a plant stand-in with perturbed Henry coefficients.
+
+    The adsorption rates of the binding model are scaled, such that the kinetics
+    of the desorption remain unchanged.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Builder of the model.
+    henry_factors : npt.ArrayLike, optional
+        Factors of the Henry coefficients of every component. If None, they are
+        drawn from a log-normal distribution with `rel_std`.
+    rel_std : float, optional
+        Relative standard deviation of the random factors. The default is 0.05.
+    seed : int, optional
+        Seed of the random factors.
+
+    Returns
+    -------
+    tuple[CarouselBuilder, np.ndarray]
+        Copy of the builder with the perturbed binding model and the factors.
+
+    Raises
+    ------
+    CADETProcessError
+        If the binding model is not `Linear`.
+    """
+    plant = copy.deepcopy(builder)
+    binding_model = plant.column.binding_model
+    if not isinstance(binding_model, Linear):
+        raise CADETProcessError("Henry coefficients require a Linear binding model.")
+
+    n_comp = plant.component_system.n_comp
+    if henry_factors is None:
+        rng = np.random.default_rng(seed)
+        henry_factors = np.exp(rng.normal(0, np.log1p(rel_std), n_comp))
+    henry_factors = np.broadcast_to(np.asarray(henry_factors, dtype=float), n_comp)
+
+    binding_model.adsorption_rate = (
+        np.asarray(binding_model.adsorption_rate, dtype=float) * henry_factors
+    ).tolist()
+
+    return plant, henry_factors.copy()
@@ -0,0 +1,515 @@
+"""
+Compact, incremental storage of simulation outputs.
+
+Arrays are split into chunks along their first (time) axis, converted to float32,
+byte-shuffled and compressed losslessly. Every chunk is stored in a `.chunk` file
+named after the hash of its content, and a JSON manifest per run lists the chunks of
+every array. Time series can additionally be decimated, either by a fixed factor or
+automatically to meet a size budget.
+
+cadet-rdm starts every run on a fresh output branch, so the store is rebuilt from
+scratch each time. The chunks are tracked with Git LFS through a `.gitattributes`
+file in the store, and LFS stores every file content only once. A chunk that the
+previous run already produced therefore adds no LFS object. In contrast, the HDF5
+files of `lazy_results` become a new object with every run. `main.py` passes the
+cached output of the previous run through the environment variable
+`SMB_PREVIOUS_OUTPUT`, such that `WriteReport.new_bytes` counts the data that
+actually changed.
+
+Reading a run returns the arrays with their original dtype and (decimated) shape.
+"""
+
+import hashlib
+import json
+import lzma
+import os
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.simulationResults import SimulationResults
+
+__all__ = [
+    "WriteReport",
+    "ResultStore",
+    "previous_store_directory",
+    "simulation_arrays",
+    "save_simulation_results",
+]
+
+_GITATTRIBUTES = "*.chunk filter=lfs diff=lfs merge=lfs -text\n"
+"""str: Attributes that let Git LFS track the chunk files."""
+
+_COMPRESSORS = {
+    "zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress),
+}
+"""dict: Compression and decompression function of every compressor."""
+
+
+def _shuffle(data: np.ndarray) -> bytes:
+    """Group the bytes of all values by significance, which compresses better."""
+    return (
+        np.ascontiguousarray(data).view(np.uint8).reshape(-1, data.itemsize).T.tobytes()
+    )
+
+
+def _unshuffle(data: bytes, dtype: np.dtype) -> np.ndarray:
+    """Invert `_shuffle`."""
+    dtype = np.dtype(dtype)
+    return (
+        np.frombuffer(data, np.uint8)
+        .reshape(dtype.itemsize, -1)
+        .T.copy()
+        .view(dtype)
+        .ravel()
+    )
+
+
+@dataclass
+class WriteReport:
+    """
+    Sizes of a stored run.
+
+    Attributes
+    ----------
+    name : str
+        Name of the run.
+    raw_bytes : int
+        Size of the arrays before decimation and compression.
+    stored_bytes : int
+        Size of all chunks referenced by the run.
+    new_bytes : int
+        Size of the chunks that are neither in the store nor in the previous store.
+    n_chunks : int
+        Number of chunks referenced by the run.
+    n_new_chunks : int
+        Number of chunks that are neither in the store nor in the previous store.
+    decimation : dict[str, int]
+        Decimation factor of every array.
+    """
+
+    name: str
+    raw_bytes: int
+    stored_bytes: int
+    new_bytes: int
+    n_chunks: int
+    n_new_chunks: int
+    decimation: dict[str, int]
+
+    @property
+    def compression_ratio(self) -> float:
+        """float: Raw size over stored size."""
+        return self.raw_bytes / max(self.stored_bytes, 1)
+
+
+class ResultStore:
+    """
+    Content-addressed chunk store of named runs.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory of the store. Chunks are written to `chunks/` and manifests to
+        `<name>.json`.
+    previous : str or Path, optional
+        Directory of the store in the output of the previous run, see
+        `previous_store_directory`. Chunks referenced by its manifests are not
+        counted as new.
+    precision : str or None, optional
+        Storage dtype of floating point arrays. If None, the original dtype is
+        kept. The default is 'float32'.
+    compressor : str, optional
+        'zlib' or 'lzma'. The default is 'zlib'.
+    level : int, optional
+        Compression level. The default is 6.
+    chunk_bytes : int, optional
+        Approximate uncompressed size of a chunk. The default is 1 MiB.
+
+    Examples
+    --------
+    >>> store = ResultStore("results", previous_store_directory("results"))
+    >>> report = save_simulation_results(store, "four_zone_binary", simulation_results)
+    >>> arrays = store.read("four_zone_binary")
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        previous: Optional[str | Path] = None,
+        precision: Optional[str] = "float32",
+        compressor: str = "zlib",
+        level: int = 6,
+        chunk_bytes: int = 2**20,
+    ) -> None:
+        if compressor not in _COMPRESSORS:
+            raise CADETProcessError(f"Unknown compressor {compressor}.")
+
+        self.directory = Path(directory)
+        self.previous = None if previous is None else Path(previous)
+        self.precision = precision
+        self.compressor = compressor
+        self.level = level
+        self.chunk_bytes = chunk_bytes
+
+    @property
+    def chunk_directory(self) -> Path:
+        """Path: Directory of the chunk files."""
+        return self.directory / "chunks"
+
+    def _chunk_path(self, key: str) -> Path:
+        return self.chunk_directory / key[:2] / f"{key[2:]}.chunk"
+
+    def _previous_chunks(self) -> set[str]:
+        """Return the chunks referenced by the manifests of the previous store."""
+        if self.previous is None or not self.previous.exists():
+            return set()
+
+        previous = ResultStore(self.previous)
+        return {
+            chunk
+            for name in previous.runs()
+            for entry in previous.manifest(name)["arrays"].values()
+            for chunk in entry["chunks"]
+        }
+
+    def runs(self) -> list[str]:
+        """list[str]: Names of all stored runs."""
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+    def _encode(self, values: np.ndarray) -> tuple[np.ndarray, list[bytes]]:
+        """Convert an array to the storage dtype and compress its chunks."""
+        if self.precision is not None and np.issubdtype(values.dtype, np.floating):
+            values = values.astype(self.precision)
+        rows = np.ascontiguousarray(values.reshape(-1, *values.shape[1:]))
+
+        row_bytes = max(rows[:1].nbytes, 1)
+        n_rows = max(self.chunk_bytes // row_bytes, 1)
+        compress = _COMPRESSORS[self.compressor][0]
+        chunks = [
+            compress(_shuffle(rows[start : start + n_rows]), self.level)
+            for start in range(0, max(len(rows), 1), n_rows)
+        ]
+
+        return values, chunks
+
+    def write(
+        self,
+        name: str,
+        arrays: dict[str, np.ndarray],
+        decimation: int = 1,
+        decimate: Optional[list[str]] = None,
+        size_budget: Optional[int] = None,
+    ) -> WriteReport:
+        """
+        Store a run, replacing an existing run of the same name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the run.
+        arrays : dict[str, np.ndarray]
+            Arrays to store.
+        decimation : int, optional
+            Every `decimation`-th entry along the first axis of the decimated arrays
+            is kept. The default is 1.
+        decimate : list[str], optional
+            Names of the arrays that may be decimated. If None, all arrays with at
+            least one dimension are decimated.
+        size_budget : int, optional
+            Maximum size of the chunks of the run in bytes. The decimation is
+            doubled until the run fits.
+
+        Returns
+        -------
+        WriteReport
+            Sizes of the run.
+
+        Raises
+        ------
+        CADETProcessError
+            If the run does not fit into the size budget.
+        """
+        arrays = {key: np.asarray(value) for key, value in arrays.items()}
+        if decimate is None:
+            decimate = [key for key, value in arrays.items() if value.ndim > 0]
+
+        while True:
+            factors = {key: decimation if key in decimate else 1 for key in arrays}
+            encoded = {
+                key: self._encode(value[:: factors[key]] if value.ndim > 0 else value)
+                for key, value in arrays.items()
+            }
+            stored_bytes = sum(
+                len(chunk) for _, chunks in encoded.values() for chunk in chunks
+            )
+            if size_budget is None or stored_bytes <= size_budget:
+                break
+
+            lengths = [len(arrays[key]) for key in decimate]
+            if not lengths or decimation >= max(lengths):
+                raise CADETProcessError(
+                    f"Run {name} exceeds the size budget of {size_budget} bytes."
+                )
+            decimation *= 2
+
+        manifest = {
+            "compressor": self.compressor,
+            "arrays": {},
+        }
+        previous_chunks = self._previous_chunks()
+        new_bytes = 0
+        n_new_chunks = 0
+        for key, (values, chunks) in encoded.items():
+            keys = []
+            for chunk in chunks:
+                chunk_key = hashlib.sha256(chunk).hexdigest()
+                path = self._chunk_path(chunk_key)
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(chunk)
+                    if chunk_key not in previous_chunks:
+                        new_bytes += len(chunk)
+                        n_new_chunks += 1
+                keys.append(chunk_key)
+
+            manifest["arrays"][key] = {
+                "dtype": arrays[key].dtype.str,
+                "storage_dtype": values.dtype.str,
+                "shape": list(values.shape),
+                "decimation": factors[key],
+                "chunks": keys,
+            }
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        gitattributes = self.directory / ".gitattributes"
+        if not gitattributes.exists():
+            gitattributes.write_text(_GITATTRIBUTES)
+        with open(self.directory / f"{name}.json", "w") as file:
+            json.dump(manifest, file, indent=1)
+
+        return WriteReport(
+            name=name,
+            raw_bytes=sum(value.nbytes for value in arrays.values()),
+            stored_bytes=stored_bytes,
+            new_bytes=new_bytes,
+            n_chunks=sum(len(chunks) for _, chunks in encoded.values()),
+            n_new_chunks=n_new_chunks,
+            decimation=factors,
+        )
+
+    def manifest(self, name: str) -> dict:
+        """
+        Load the manifest of a run.
+
+        Parameters
+        ----------
+        name : str
+            Name of the run.
+
+        Returns
+        -------
+        dict
+            Compressor and chunk list, dtype, shape and decimation of every array.
+
+        Raises
+        ------
+        CADETProcessError
+            If the run does not exist.
+        """
+        path = self.directory / f"{name}.json"
+        if not path.exists():
+            raise CADETProcessError(f"Run {name} not found in {self.directory}.")
+        with open(path) as file:
+            return json.load(file)
+
+    def read(
+        self, name: str, arrays: Optional[list[str]] = None
+    ) -> dict[str, np.ndarray]:
+        """
+        Read the arrays of a run.
+
+        Parameters
+        ----------
+        name : str
+            Name of the run.
+        arrays : list[str], optional
+            Names of the arrays to read. If None, all arrays are read.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            Arrays with their original dtype.
+        """
+        manifest = self.manifest(name)
+        decompress = _COMPRESSORS[manifest["compressor"]][1]
+        if arrays is None:
+            arrays = list(manifest["arrays"])
+
+        result = {}
+        for key in arrays:
+            entry = manifest["arrays"][key]
+            values = np.concatenate(
+                [
+                    _unshuffle(
+                        decompress(self._chunk_path(chunk).read_bytes()),
+                        entry["storage_dtype"],
+                    )
+                    for chunk in entry["chunks"]
+                ]
+            )
+            result[key] = values.reshape(entry["shape"]).astype(entry["dtype"])
+
+        return result
+
+    def prune(self) -> int:
+        """
+        Remove chunks that are not referenced by any run.
+
+        Returns
+        -------
+        int
+            Number of removed chunks.
+        """
+        referenced = {
+            chunk
+            for name in self.runs()
+            for entry in self.manifest(name)["arrays"].values()
+            for chunk in entry["chunks"]
+        }
+        removed = 0
+        if self.chunk_directory.exists():
+            for path in self.chunk_directory.glob("*/*.chunk"):
+                if path.parent.name + path.stem not in referenced:
+                    path.unlink()
+                    removed += 1
+
+        return removed
+
+
+def previous_store_directory(directory: str | Path) -> Optional[Path]:
+    """
+    Return the location of a store in the output of the previous run.
+
+    `main.py` sets `SMB_OUTPUT_DIRECTORY` to the output directory of the current run
+    and `SMB_PREVIOUS_OUTPUT` to the cadet-rdm cache of the previous output branch.
+
+    Parameters
+    ----------
+    directory : str or Path
+        Directory of the store in the current run.
+
+    Returns
+    -------
+    Path or None
+        Directory of the store in the previous run, or None if the notebook does not
+        run through `main.py`, there is no previous run or the store lies outside of
+        the output directory.
+    """
+    output = os.environ.get("SMB_OUTPUT_DIRECTORY")
+    previous = os.environ.get("SMB_PREVIOUS_OUTPUT")
+    if output is None or previous is None:
+        return None
+
+    try:
+        relative = Path(directory).resolve().relative_to(Path(output).resolve())
+    except ValueError:
+        return None
+
+    return Path(previous) / relative
+
+
+def simulation_arrays(
+    simulation_results: SimulationResults,
+    builder: Optional[CarouselBuilder] = None,
+    bulk: bool = True,
+) -> dict[str, np.ndarray]:
+    """
+    Collect the time, outlet profiles and column bulk solutions of a simulation.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the simulation.
+    builder : CarouselBuilder, optional
+        Builder of a carousel process. If given, its switch time and number of
+        columns are stored as well.
+    bulk : bool, optional
+        If True, the bulk solutions of all units that recorded them are included.
+        The default is True.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Arrays named `time`, `<outlet>` and `<unit>.bulk`, all sharing the time
+        axis, plus the carousel parameters.
+    """
+    arrays = {"time": np.asarray(simulation_results.time_complete)}
+    for unit, solution in simulation_results.solution.items():
+        if "outlet" not in solution and "inlet" in solution:
+            arrays[unit] = solution.inlet.solution
+        if bulk and "bulk" in solution:
+            arrays[f"{unit}.bulk"] = solution.bulk.solution
+
+    if builder is not None:
+        arrays["switch_time"] = np.asarray(builder.switch_time, dtype=float)
+        arrays["n_columns"] = np.asarray(builder.n_columns)
+
+    return arrays
+
+
+def save_simulation_results(
+    store: ResultStore,
+    name: str,
+    simulation_results: SimulationResults,
+    builder: Optional[CarouselBuilder] = None,
+    bulk: bool = True,
+    decimation: int = 1,
+    size_budget: Optional[int] = None,
+    prune: bool = True,
+) -> WriteReport:
+    """
+    Store the outputs of a simulation.
+
+    All time series are decimated with the same factor, so they keep sharing the
+    time axis.
+
+    Parameters
+    ----------
+    store : ResultStore
+        Store of the output repository.
+    name : str
+        Name of the run, e.g. the name of the notebook.
+    simulation_results : SimulationResults
+        Results of the simulation.
+    builder : CarouselBuilder, optional
+        Builder of a carousel process.
+    bulk : bool, optional
+        If True, the bulk solutions are stored. The default is True.
+    decimation : int, optional
+        Decimation factor of the time series. The default is 1.
+    size_budget : int, optional
+        Maximum stored size of the run in bytes.
+    prune : bool, optional
+        If True, chunks that are no longer referenced are removed afterwards. This
+        only matters if the store directory is reused, e.g. when the notebook is
+        run outside of `main.py`. The default is True.
+
+    Returns
+    -------
+    WriteReport
+        Sizes of the run.
+    """
+    arrays = simulation_arrays(simulation_results, builder, bulk)
+    decimate = [key for key, value in arrays.items() if np.ndim(value) > 0]
+    report = store.write(name, arrays, decimation, decimate, size_budget)
+    if prune:
+        store.prune()
+
+    return report
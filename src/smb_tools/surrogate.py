@@ -0,0 +1,561 @@
+"""
+Reduced-order surrogate of carousel processes at cyclic steady state.
+
+A snapshot of a process at CSS consists of the axial bulk profiles of all carousel
+positions at the start of the last switch period and the outlet profiles of that
+period. Snapshots are collected over a training design of operating points and
+compressed separately for every field with a proper orthogonal decomposition
+(POD). The POD coefficients are interpolated over the operating parameters with
+radial basis functions, which returns complete profiles for a new operating point in
+milliseconds.
+
+The error of a prediction is estimated from leave-one-out predictions of the
+training points, for which the modes are recomputed without the left-out point, and
+the truncation error of the training snapshots, both relative to the snapshot norm.
+Outside the convex hull of the training points, or above a maximum estimated error,
+the surrogate can fall back to a full simulation.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.log import get_logger
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.modelBuilder.carouselBuilder import CarouselSolutionBulk
+from CADETProcess.simulationResults import SimulationResults
+from scipy.interpolate import RBFInterpolator
+from scipy.spatial import Delaunay, QhullError
+from scipy.stats import qmc
+
+from .case_studies import create_simulator, default_n_threads
+from .snapshots import axial_snapshots
+from .stationarity import _n_complete_switches, simulate_to_css, switch_period_profiles
+from .sweep import _initialize_worker
+
+__all__ = [
+    "training_design",
+    "css_snapshot",
+    "evaluate_snapshot",
+    "collect_snapshots",
+    "SurrogatePrediction",
+    "PODSurrogate",
+]
+
+logger = get_logger("Surrogate")
+
+
+def training_design(
+    bounds: dict[str, tuple[float, float]],
+    n_points: int,
+    seed: Optional[int] = 0,
+    include_corners: bool = True,
+) -> list[dict[str, float]]:
+    """
+    Create a Latin hypercube design of operating points.
+
+    Parameters
+    ----------
+    bounds : dict[str, tuple[float, float]]
+        Lower and upper bound of every factory argument.
+    n_points : int
+        Number of points sampled inside the bounds.
+    seed : int, optional
+        Seed of the design. The default is 0.
+    include_corners : bool, optional
+        If True, the corners of the bounds are added, such that the convex hull of
+        the design covers the complete box. The default is True.
+
+    Returns
+    -------
+    list[dict[str, float]]
+        Keyword arguments of every design point.
+    """
+    names = list(bounds)
+    low = [bounds[name][0] for name in names]
+    high = [bounds[name][1] for name in names]
+
+    samples = qmc.scale(
+        qmc.LatinHypercube(len(names), rng=seed).random(n_points), low, high
+    )
+    if include_corners:
+        corners = np.array(np.meshgrid(*zip(low, high), indexing="ij")).reshape(
+            len(names), -1
+        )
+        samples = np.concatenate((corners.T, samples))
+
+    return [
+        {name: float(value) for name, value in zip(names, sample)} for sample in samples
+    ]
+
+
+def css_snapshot(
+    simulation_results: SimulationResults,
+    builder: CarouselBuilder,
+    outlets: Optional[list[str]] = None,
+    n_points: int = 100,
+) -> dict[str, np.ndarray]:
+    """
+    Extract the snapshot of the last complete switch period.
+
+    Parameters
+    ----------
+    simulation_results : SimulationResults
+        Results of the carousel process at CSS, containing the bulk solution of all
+        columns.
+    builder : CarouselBuilder
+        Builder the process was created with.
+    outlets : list[str], optional
+        Names of the outlet units. If None, all outlets of the flow sheet are used.
+    n_points : int, optional
+        Number of samples of the outlet profiles. The default is 100.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Bulk profiles ('bulk') with shape (n_positions, ncol, n_comp) at the start
+        of the period and the outlet profiles with shape (n_points, n_comp).
+    """
+    n_switches = _n_complete_switches(
+        simulation_results.time_complete, builder.switch_time
+    )
+    t_start = (n_switches - 1) * builder.switch_time
+
+    solution_bulk = CarouselSolutionBulk(builder, simulation_results)
+    snapshot = {"bulk": axial_snapshots(solution_bulk, [t_start])[0]}
+
+    profiles = switch_period_profiles(simulation_results, builder, outlets, n_points)
+    for outlet, profile in profiles.items():
+        snapshot[outlet] = profile[n_switches - 1]
+
+    return snapshot
+
+
+def evaluate_snapshot(
+    factory: Callable,
+    point: dict[str, Any],
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+    n_points: int = 100,
+) -> dict[str, np.ndarray]:
+    """
+    Simulate an operating point and extract its CSS snapshot.
+
+    Parameters
+    ----------
+    factory : Callable
+        Case study factory returning process and builder, e.g. `four_zone_binary`.
+    point : dict[str, Any]
+        Keyword arguments of the factory.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`. If None, the number of cycles of
+        the simulator is simulated.
+    n_points : int, optional
+        Number of samples of the outlet profiles. The default is 100.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Snapshot, see `css_snapshot`.
+    """
+    process, builder = factory(**point)
+    process_simulator = create_simulator(**(simulator_options or {}))
+
+    if css_options is None:
+        simulation_results = process_simulator.simulate(process)
+    else:
+        simulation_results, _ = simulate_to_css(
+            process_simulator, process, builder, **css_options
+        )
+
+    return css_snapshot(simulation_results, builder, n_points=n_points)
+
+
+def collect_snapshots(
+    factory: Callable,
+    points: list[dict[str, Any]],
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+    n_points: int = 100,
+    n_workers: Optional[int] = None,
+) -> list[dict[str, np.ndarray]]:
+    """
+    Simulate all training points in parallel and collect their snapshots.
+
+    Parameters
+    ----------
+    factory : Callable
+        Module-level case study factory, e.g. `four_zone_binary`.
+    points : list[dict[str, Any]]
+        Keyword arguments of the factory for every point.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`. Unless `n_threads` is given, the
+        cores are divided among the workers, see `default_n_threads`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`.
+    n_points : int, optional
+        Number of samples of the outlet profiles. The default is 100.
+    n_workers : int, optional
+        Number of worker processes. If None, all CPUs are used.
+
+    Returns
+    -------
+    list[dict[str, np.ndarray]]
+        Snapshot of every point, in the order of `points`.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    simulator_options = {
+        "n_threads": default_n_threads(n_workers),
+        **(simulator_options or {}),
+    }
+
+    with ProcessPoolExecutor(n_workers, initializer=_initialize_worker) as executor:
+        futures = [
+            executor.submit(
+                evaluate_snapshot,
+                factory,
+                point,
+                simulator_options,
+                css_options,
+                n_points,
+            )
+            for point in points
+        ]
+        return [future.result() for future in futures]
+
+
+@dataclass
+class SurrogatePrediction:
+    """
+    Profiles of an operating point predicted by the surrogate.
+
+    Attributes
+    ----------
+    point : dict[str, float]
+        Operating parameters.
+    profiles : dict[str, np.ndarray]
+        Predicted snapshot, see `css_snapshot`.
+    error : dict[str, float]
+        Estimated relative L2 error of every field. Zero for simulated snapshots.
+    inside : bool
+        True if the point lies inside the convex hull of the training points.
+    simulated : bool
+        True if the snapshot was obtained by a full simulation.
+    time_elapsed : float
+        Wall time of the prediction in s.
+    """
+
+    point: dict[str, float]
+    profiles: dict[str, np.ndarray] = field(repr=False)
+    error: dict[str, float]
+    inside: bool
+    simulated: bool
+    time_elapsed: float
+
+    @property
+    def max_error(self) -> float:
+        """float: Largest estimated error of all fields."""
+        return max(self.error.values())
+
+
+def _pod_basis(data: np.ndarray, energy: float) -> tuple[np.ndarray, np.ndarray]:
+    """Return the mean and the POD modes retaining `energy` of the snapshots."""
+    mean = data.mean(axis=1)
+    u, s, _ = np.linalg.svd(data - mean[:, np.newaxis], full_matrices=False)
+
+    cumulative = np.cumsum(s**2) / max(np.sum(s**2), np.finfo(float).tiny)
+    n_modes = min(int(np.searchsorted(cumulative, energy) + 1), len(s))
+
+    return mean, u[:, :n_modes]
+
+
+class PODSurrogate:
+    """
+    POD surrogate of CSS snapshots with RBF interpolation of the coefficients.
+
+    Parameters
+    ----------
+    factory : Callable
+        Module-level case study factory, e.g. `four_zone_binary`, used for
+        the training and the fallback simulations.
+    parameters : list[str]
+        Names of the factory arguments the surrogate depends on.
+    base_point : dict[str, Any], optional
+        Fixed keyword arguments of the factory.
+    energy : float, optional
+        Fraction of the snapshot energy retained by the modes of every field.
+        The default is 0.99999.
+    kernel : str, optional
+        Kernel of the `RBFInterpolator`. The default is 'thin_plate_spline'.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`.
+    n_points : int, optional
+        Number of samples of the outlet profiles. The default is 100.
+
+    Examples
+    --------
+    >>> surrogate = PODSurrogate(four_zone_binary, ["feed_flow_rate", "w_r"])
+    >>> surrogate.train(training_design(bounds, 30))
+    >>> prediction = surrogate.predict({"feed_flow_rate": 2.2e-8, "w_r": 0.22})
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        parameters: list[str],
+        base_point: Optional[dict[str, Any]] = None,
+        energy: float = 0.99999,
+        kernel: str = "thin_plate_spline",
+        simulator_options: Optional[dict] = None,
+        css_options: Optional[dict] = None,
+        n_points: int = 100,
+    ) -> None:
+        self.factory = factory
+        self.parameters = list(parameters)
+        self.base_point = dict(base_point or {})
+        self.energy = energy
+        self.kernel = kernel
+        self.simulator_options = simulator_options
+        self.css_options = css_options
+        self.n_points = n_points
+
+        self.points: Optional[np.ndarray] = None
+        self.shapes: dict[str, tuple[int, ...]] = {}
+        self.means: dict[str, np.ndarray] = {}
+        self.modes: dict[str, np.ndarray] = {}
+        self.truncation_error: dict[str, float] = {}
+        self.loo_errors: dict[str, np.ndarray] = {}
+        self._interpolators: dict[str, RBFInterpolator] = {}
+        self._hull: Optional[Delaunay] = None
+
+    @property
+    def is_trained(self) -> bool:
+        """bool: True if the surrogate has been fitted."""
+        return self.points is not None
+
+    @property
+    def n_modes(self) -> dict[str, int]:
+        """dict[str, int]: Number of retained modes of every field."""
+        return {name: modes.shape[1] for name, modes in self.modes.items()}
+
+    def _point(self, point: dict[str, Any]) -> dict[str, Any]:
+        """Complete keyword arguments of the factory."""
+        return {**self.base_point, **point}
+
+    def _scale(self, x: np.ndarray) -> np.ndarray:
+        """Scale parameters to the unit box of the training points."""
+        low = self.points.min(axis=0)
+        span = np.ptp(self.points, axis=0)
+        return (x - low) / np.where(span > 0, span, 1)
+
+    def train(self, points: list[dict[str, float]]) -> None:
+        """
+        Simulate the training points and fit the surrogate.
+
+        Parameters
+        ----------
+        points : list[dict[str, float]]
+            Operating parameters of the training points, e.g. from
+            `training_design`.
+        """
+        snapshots = collect_snapshots(
+            self.factory,
+            [self._point(point) for point in points],
+            self.simulator_options,
+            self.css_options,
+            self.n_points,
+        )
+        self.fit(points, snapshots)
+
+    def fit(
+        self,
+        points: list[dict[str, float]],
+        snapshots: list[dict[str, np.ndarray]],
+    ) -> None:
+        """
+        Fit the surrogate to existing snapshots.
+
+        Parameters
+        ----------
+        points : list[dict[str, float]]
+            Operating parameters of every snapshot.
+        snapshots : list[dict[str, np.ndarray]]
+            Snapshots, see `css_snapshot`.
+
+        Raises
+        ------
+        CADETProcessError
+            If there are fewer snapshots than parameters plus two.
+        """
+        n_dim = len(self.parameters)
+        if len(snapshots) < n_dim + 2:
+            raise CADETProcessError(
+                f"At least {n_dim + 2} snapshots are required for {n_dim} parameters."
+            )
+
+        self.points = np.array(
+            [[point[name] for name in self.parameters] for point in points], dtype=float
+        )
+        x = self._scale(self.points)
+
+        self.shapes = {name: value.shape for name, value in snapshots[0].items()}
+        for name in self.shapes:
+            data = np.stack([snapshot[name].ravel() for snapshot in snapshots], axis=1)
+            mean, modes = _pod_basis(data, self.energy)
+            self.means[name] = mean
+            self.modes[name] = modes
+
+            centered = data - mean[:, np.newaxis]
+            coefficients = modes.T @ centered
+            self._interpolators[name] = RBFInterpolator(
+                x, coefficients.T, kernel=self.kernel
+            )
+
+            # Truncation error of the training snapshots, relative to their norm
+            # like the leave-one-out errors.
+            norms = np.maximum(np.linalg.norm(data, axis=0), np.finfo(float).tiny)
+            residuals = np.linalg.norm(centered - modes @ coefficients, axis=0) / norms
+            self.truncation_error[name] = float(np.sqrt(np.mean(residuals**2)))
+
+            # Leave-one-out errors, with modes and interpolation computed without
+            # the left-out snapshot.
+            errors = np.empty(len(snapshots))
+            for i in range(len(snapshots)):
+                keep = np.arange(len(snapshots)) != i
+                loo_mean, loo_modes = _pod_basis(data[:, keep], self.energy)
+                loo_coefficients = loo_modes.T @ (
+                    data[:, keep] - loo_mean[:, np.newaxis]
+                )
+                interpolator = RBFInterpolator(
+                    x[keep], loo_coefficients.T, kernel=self.kernel
+                )
+                predicted = loo_mean + loo_modes @ interpolator(x[i : i + 1])[0]
+                errors[i] = np.linalg.norm(predicted - data[:, i]) / norms[i]
+            self.loo_errors[name] = errors
+
+        try:
+            self._hull = Delaunay(x)
+        except QhullError:
+            self._hull = None
+            logger.warning("Training points are degenerate, using bounding box.")
+
+    def inside(self, point: dict[str, float]) -> bool:
+        """
+        Check whether an operating point lies inside the trained region.
+
+        Parameters
+        ----------
+        point : dict[str, float]
+            Operating parameters.
+
+        Returns
+        -------
+        bool
+            True if the point lies inside the convex hull of the training points.
+        """
+        x = self._scale(
+            np.array([point[name] for name in self.parameters], dtype=float)
+        )
+        if self._hull is None:
+            return bool(np.all((x >= -1e-9) & (x <= 1 + 1e-9)))
+        return bool(self._hull.find_simplex(x) >= 0)
+
+    def _error_estimate(self, x: np.ndarray) -> dict[str, float]:
+        """Inverse-distance weighted leave-one-out errors plus truncation error."""
+        distance = np.linalg.norm(self._scale(self.points) - x, axis=1)
+        if np.min(distance) < 1e-12:
+            weights = (distance < 1e-12).astype(float)
+        else:
+            weights = 1 / distance**2
+
+        return {
+            name: float(
+                np.sum(weights * errors) / np.sum(weights) + self.truncation_error[name]
+            )
+            for name, errors in self.loo_errors.items()
+        }
+
+    def predict(
+        self,
+        point: dict[str, float],
+        fallback: bool = False,
+        max_error: Optional[float] = None,
+    ) -> SurrogatePrediction:
+        """
+        Predict the CSS snapshot of an operating point.
+
+        Parameters
+        ----------
+        point : dict[str, float]
+            Operating parameters.
+        fallback : bool, optional
+            If True, the point is simulated if it lies outside the trained region
+            or its estimated error exceeds `max_error`. The default is False.
+        max_error : float, optional
+            Maximum estimated relative error accepted without fallback.
+
+        Returns
+        -------
+        SurrogatePrediction
+            Predicted or simulated snapshot.
+
+        Raises
+        ------
+        CADETProcessError
+            If the surrogate has not been trained.
+        """
+        if not self.is_trained:
+            raise CADETProcessError("Surrogate has not been trained.")
+
+        start = time.perf_counter()
+        x = self._scale(
+            np.array([point[name] for name in self.parameters], dtype=float)
+        )
+        inside = self.inside(point)
+        error = self._error_estimate(x)
+
+        if fallback and (
+            not inside or (max_error is not None and max(error.values()) > max_error)
+        ):
+            logger.info(f"Point {point} outside trained region, simulating.")
+            profiles = evaluate_snapshot(
+                self.factory,
+                self._point(point),
+                self.simulator_options,
+                self.css_options,
+                self.n_points,
+            )
+            return SurrogatePrediction(
+                point=dict(point),
+                profiles=profiles,
+                error={name: 0.0 for name in error},
+                inside=inside,
+                simulated=True,
+                time_elapsed=time.perf_counter() - start,
+            )
+
+        profiles = {
+            name: (
+                self.means[name]
+                + self.modes[name] @ self._interpolators[name](x[np.newaxis])[0]
+            ).reshape(shape)
+            for name, shape in self.shapes.items()
+        }
+
+        return SurrogatePrediction(
+            point=dict(point),
+            profiles=profiles,
+            error=error,
+            inside=inside,
+            simulated=False,
+            time_elapsed=time.perf_counter() - start,
+        )
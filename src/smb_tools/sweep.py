@@ -0,0 +1,379 @@
+"""
+Parallel operating-point sweeps of carousel processes.
+
+Every point of a parameter grid is built by a case study factory, simulated in a
+worker process and reduced to scalar KPIs. Results are appended to a columnar HDF5
+file as soon as they are available, such that an interrupted sweep still contains
+all finished points. Failed points are retried and finally marked as failed
+instead of aborting the sweep.
+"""
+
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+
+import h5py
+import numpy as np
+from CADETProcess.log import get_logger
+
+from .case_studies import create_simulator, default_n_threads
+from .kpi import carousel_kpis
+from .stationarity import simulate_to_css
+
+__all__ = [
+    "parameter_grid",
+    "evaluate_point",
+    "SweepSummary",
+    "run_sweep",
+    "load_sweep",
+]
+
+logger = get_logger("Sweep")
+
+
+def parameter_grid(parameters: dict[str, Sequence[float]]) -> list[dict[str, float]]:
+    """
+    Return the full factorial grid of the given parameter values.
+
+    Parameters
+    ----------
+    parameters : dict[str, Sequence[float]]
+        Values of every factory argument.
+
+    Returns
+    -------
+    list[dict[str, float]]
+        Keyword arguments of every grid point.
+    """
+    names = list(parameters)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(parameters[name] for name in names))
+    ]
+
+
+def evaluate_point(
+    factory: Callable,
+    point: dict[str, Any],
+    targets: dict[str, str],
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+) -> dict[str, float]:
+    """
+    Simulate a single operating point and compute its KPIs.
+
+    Parameters
+    ----------
+    factory : Callable
+        Case study factory returning process and builder, e.g. `four_zone_binary`.
+    point : dict[str, Any]
+        Keyword arguments of the factory.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`.
+    css_options : dict, optional
+        If given, the process is simulated until cyclic steady state using
+        `simulate_to_css` with these keyword arguments. Otherwise, the number of
+        cycles of the simulator is simulated.
+
+    Returns
+    -------
+    dict[str, float]
+        KPIs of the last cycle, number of simulated cycles and simulation time.
+    """
+    process, builder = factory(**point)
+    process_simulator = create_simulator(**(simulator_options or {}))
+
+    if css_options is None:
+        simulation_results = process_simulator.simulate(process)
+    else:
+        simulation_results, _ = simulate_to_css(
+            process_simulator, process, builder, **css_options
+        )
+
+    kpis = carousel_kpis(simulation_results, builder, targets)
+    kpis["n_cycles"] = float(simulation_results.time_complete[-1] / process.cycle_time)
+    kpis["time_elapsed"] = float(simulation_results.time_elapsed)
+
+    return kpis
+
+
+def _initialize_worker() -> None:
+    """Restrict the numerical libraries of every worker to one thread."""
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = "1"
+
+
+class _ColumnWriter:
+    """Append rows to resizable HDF5 datasets, one dataset per column."""
+
+    def __init__(self, file_path: Path, attrs: dict[str, str]) -> None:
+        self.file = h5py.File(file_path, "w")
+        self.file.attrs.update(attrs)
+        self.n_rows = 0
+
+    def _dataset(self, name: str, value: Any) -> h5py.Dataset:
+        if name not in self.file:
+            is_string = isinstance(value, str)
+            dtype = h5py.string_dtype() if is_string else float
+            fill = "" if is_string else np.nan
+            dataset = self.file.create_dataset(
+                name, shape=(self.n_rows,), maxshape=(None,), dtype=dtype, chunks=True
+            )
+            dataset[:] = fill
+        return self.file[name]
+
+    def append(self, row: dict[str, Any]) -> None:
+        for name, value in row.items():
+            self._dataset(name, value)
+
+        self.n_rows += 1
+        for name, dataset in self.file.items():
+            dataset.resize((self.n_rows,))
+            if name in row:
+                dataset[-1] = row[name]
+            else:
+                dataset[-1] = "" if h5py.check_string_dtype(dataset.dtype) else np.nan
+
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+@dataclass
+class SweepSummary:
+    """
+    Summary of a finished sweep.
+
+    Attributes
+    ----------
+    file_path : Path
+        Path of the result file.
+    n_points : int
+        Number of grid points.
+    n_succeeded : int
+        Number of points that were simulated successfully.
+    n_failed : int
+        Number of points that failed after all retries.
+    n_timed_out : int
+        Number of points that timed out after all retries.
+    time_elapsed : float
+        Wall time of the sweep in s.
+    """
+
+    file_path: Path
+    n_points: int
+    n_succeeded: int
+    n_failed: int
+    n_timed_out: int
+    time_elapsed: float
+
+
+def run_sweep(
+    factory: Callable,
+    points: list[dict[str, Any]],
+    targets: dict[str, str],
+    file_path: str | Path,
+    n_workers: Optional[int] = None,
+    simulator_options: Optional[dict] = None,
+    css_options: Optional[dict] = None,
+    max_retries: int = 1,
+    timeout: Optional[float] = None,
+) -> SweepSummary:
+    """
+    Simulate all operating points in parallel and stream the KPIs to a file.
+
+    Each worker runs one simulation at a time with `default_n_threads(n_workers)`
+    CADET threads, such that the workers share the cores without oversubscribing
+    them. At most two points per worker are queued at
+    any time. Every row of the result file contains the index of the grid point,
+    its parameters, the status ('ok', 'failed' or 'timeout'), the number of
+    attempts, the error message of failed points and the KPIs.
+
+    Parameters
+    ----------
+    factory : Callable
+        Module-level case study factory, e.g. `four_zone_binary`.
+    points : list[dict[str, Any]]
+        Keyword arguments of the factory for every point, e.g. from
+        `parameter_grid`.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    file_path : str or Path
+        Path of the HDF5 result file. An existing file is overwritten.
+    n_workers : int, optional
+        Number of worker processes. If None, all CPUs are used.
+    simulator_options : dict, optional
+        Keyword arguments of `create_simulator`. Unless `n_threads` is given, the
+        cores are divided among the workers, see `default_n_threads`.
+    css_options : dict, optional
+        Keyword arguments of `simulate_to_css`. If None, a fixed number of cycles
+        is simulated.
+    max_retries : int, optional
+        Number of times a failed point is resubmitted. The default is 1.
+    timeout : float, optional
+        Maximum run time of a single simulation in s. If given, CADET is called
+        through its command line interface, which enforces the timeout, even if
+        `simulator_options` requests the DLL. The default is None.
+
+    Returns
+    -------
+    SweepSummary
+        Number of succeeded and failed points.
+
+    See Also
+    --------
+    parameter_grid
+    load_sweep
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    simulator_options = {
+        "n_threads": default_n_threads(n_workers),
+        **(simulator_options or {}),
+    }
+    if timeout is not None:
+        # The DLL interface of CADET-Python does not enforce the timeout, such that a
+        # hanging simulation would block the sweep.
+        simulator_options.update(timeout=timeout, use_dll=False)
+
+    file_path = Path(file_path)
+    writer = _ColumnWriter(
+        file_path, {"factory": factory.__name__, "targets": str(targets)}
+    )
+    counts = {"ok": 0, "failed": 0, "timeout": 0}
+
+    pending = deque((index, 1) for index in range(len(points)))
+    in_flight: dict[Future, tuple[int, int]] = {}
+
+    def record(index: int, attempt: int, status: str, values: dict) -> None:
+        counts[status] += 1
+        writer.append(
+            {
+                "point": index,
+                **points[index],
+                "status": status,
+                "attempts": attempt,
+                **values,
+            }
+        )
+
+    def handle_failure(index: int, attempt: int, error: Exception) -> None:
+        status = "timeout" if "timed out" in str(error) else "failed"
+        if attempt <= max_retries:
+            logger.warning(f"Point {index} {status} ({error}), retrying.")
+            pending.append((index, attempt + 1))
+        else:
+            logger.error(f"Point {index} {status} after {attempt} attempts.")
+            record(index, attempt, status, {"error": str(error)})
+
+    def submit(executor: ProcessPoolExecutor, index: int, attempt: int) -> None:
+        future = executor.submit(
+            evaluate_point,
+            factory,
+            points[index],
+            targets,
+            simulator_options,
+            css_options,
+        )
+        in_flight[future] = (index, attempt)
+
+    # Points that were running when a worker died are rerun one at a time to find
+    # the point that crashed the worker without charging the others.
+    suspects = set()
+
+    start = time.time()
+    executor = ProcessPoolExecutor(n_workers, initializer=_initialize_worker)
+    try:
+        while pending or in_flight:
+            broken = False
+            isolating = any(index in suspects for index, _ in in_flight.values())
+            while pending and len(in_flight) < 2 * n_workers and not isolating:
+                if pending[0][0] in suspects:
+                    if in_flight:
+                        break
+                    isolating = True
+                try:
+                    submit(executor, *pending[0])
+                except BrokenProcessPool:
+                    broken = True
+                    break
+                pending.popleft()
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index, attempt = in_flight.pop(future)
+                try:
+                    kpis = future.result()
+                except BrokenProcessPool as e:
+                    broken = True
+                    if isolating:
+                        handle_failure(index, attempt, e)
+                    else:
+                        suspects.add(index)
+                        pending.appendleft((index, attempt))
+                except Exception as e:
+                    handle_failure(index, attempt, e)
+                else:
+                    suspects.discard(index)
+                    record(index, attempt, "ok", kpis)
+
+            if broken:
+                logger.warning("Worker process died, restarting process pool.")
+                for index, attempt in in_flight.values():
+                    suspects.add(index)
+                    pending.appendleft((index, attempt))
+                in_flight.clear()
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(
+                    n_workers, initializer=_initialize_worker
+                )
+    finally:
+        executor.shutdown(cancel_futures=True)
+        writer.close()
+
+    return SweepSummary(
+        file_path=file_path,
+        n_points=len(points),
+        n_succeeded=counts["ok"],
+        n_failed=counts["failed"],
+        n_timed_out=counts["timeout"],
+        time_elapsed=time.time() - start,
+    )
+
+
+def load_sweep(file_path: str | Path) -> dict[str, np.ndarray]:
+    """
+    Load the result file of a sweep, sorted by grid point.
+
+    Parameters
+    ----------
+    file_path : str or Path
+        Path of the HDF5 result file.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Values of every column.
+    """
+    with h5py.File(file_path, "r") as file:
+        order = np.argsort(file["point"][()], kind="stable")
+        columns = {}
+        for name, dataset in file.items():
+            if h5py.check_string_dtype(dataset.dtype):
+                values = dataset.asstr()[()]
+            else:
+                values = dataset[()]
+            columns[name] = values[order]
+
+    return columns
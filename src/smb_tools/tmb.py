@@ -0,0 +1,486 @@
+"""
+True moving bed (TMB) equivalent of carousel processes with linear isotherms.
+
+In the TMB model, the columns of a carousel are replaced by a stationary phase that
+moves counter-currently to the liquid with velocity `u_s = L / t_s`. The liquid flow
+rate of every zone is reduced by the liquid carried along with the columns, i.e.
+`Q_TMB = Q_SMB - eps * V / t_s`, while the external streams are unchanged. For
+linear isotherms, the steady state of the TMB is the solution of one sparse linear
+system per component, which is solved in milliseconds. The result approximates the
+cyclic steady state of the carousel: the outlet concentrations correspond to the
+mean concentrations over a switch period, and the internal profiles can be used to
+initialize the full simulation close to CSS.
+
+The bulk liquid is discretized with a finite volume scheme (upwind convection and
+central axial dispersion with Danckwerts boundary conditions). Mass transfer into
+the particles is approximated by a linear driving force, with the pore diffusion
+resistance of the `GeneralRateModel` lumped into the film coefficient.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import spsolve
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import (
+    Cstr,
+    GeneralRateModel,
+    Inlet,
+    Linear,
+    LumpedRateModelWithoutPores,
+    LumpedRateModelWithPores,
+    Process,
+)
+
+from .carousel import ZoneLayout, zone_layouts
+from .state import (
+    _column_indices,
+    _column_segments,
+    _interpolate_cells,
+    coupling_state_size,
+    join_state,
+    split_state,
+    unit_state_sizes,
+)
+
+__all__ = ["TMBResults", "tmb_flow_rates", "solve_tmb"]
+
+
+@dataclass
+class TMBResults:
+    """
+    Steady state of the TMB equivalent of a carousel process.
+
+    The cells are ordered along the carousel positions, i.e. in the direction of
+    the liquid flow, starting at the inlet of the first zone.
+
+    Attributes
+    ----------
+    components : list[str]
+        Names of the components.
+    z : np.ndarray
+        Axial coordinate of the cell centers in m.
+    zone_indices : np.ndarray
+        Zone index of every cell.
+    c : np.ndarray
+        Bulk liquid concentration with shape (n_cells, n_comp).
+    cp : np.ndarray or None
+        Particle liquid concentration with shape (n_cells, n_comp). None for the
+        `LumpedRateModelWithoutPores`.
+    q : np.ndarray
+        Bound concentration with shape (n_cells, n_comp).
+    c_inlet : np.ndarray
+        Liquid concentration entering every cell with shape (n_cells, n_comp).
+    flow_rates : dict[str, float]
+        TMB liquid flow rate of every zone.
+    outlets : dict[str, np.ndarray]
+        Concentration of every external outlet.
+    outlet_flow_rates : dict[str, float]
+        Flow rate of every external outlet.
+    ncol : int
+        Number of cells per column.
+    time_elapsed : float
+        Time required for assembling and solving the linear systems in s.
+    """
+
+    components: list[str]
+    z: np.ndarray
+    zone_indices: np.ndarray
+    c: np.ndarray
+    cp: Optional[np.ndarray]
+    q: np.ndarray
+    c_inlet: np.ndarray
+    flow_rates: dict[str, float]
+    outlets: dict[str, np.ndarray]
+    outlet_flow_rates: dict[str, float]
+    ncol: int
+    time_elapsed: float = 0.0
+
+    @property
+    def n_positions(self) -> int:
+        """int: Number of carousel positions."""
+        return len(self.z) // self.ncol
+
+    def position_profiles(self, values: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Return cell values sorted by carousel position.
+
+        Parameters
+        ----------
+        values : np.ndarray, optional
+            Values of every cell. The default is the bulk concentration.
+
+        Returns
+        -------
+        np.ndarray
+            Values with shape (n_positions, ncol, ...).
+        """
+        values = self.c if values is None else values
+        return values.reshape(self.n_positions, self.ncol, *values.shape[1:])
+
+    def purity(self, targets: dict[str, str]) -> dict[str, float]:
+        """
+        Return the purity of the target component in the product outlets.
+
+        Parameters
+        ----------
+        targets : dict[str, str]
+            Name of the target component of every product outlet.
+
+        Returns
+        -------
+        dict[str, float]
+            Purity of every product outlet.
+        """
+        purity = {}
+        for outlet, target in targets.items():
+            i_comp = self.components.index(target)
+            c = self.outlets[outlet]
+            total = np.sum(c)
+            purity[outlet] = float(c[i_comp] / total) if total > 0 else np.nan
+
+        return purity
+
+    def initial_state(self, process: Process, builder: CarouselBuilder) -> np.ndarray:
+        """
+        Build a state vector of the carousel process from the TMB profiles.
+
+        Every carousel position is initialized with the TMB profiles of its axial
+        section, interpolated onto the discretization of the process if required.
+        The zone valves, if any, are initialized with the concentrations at the
+        zone boundaries. The state derivative is left to the consistent initialization
+        of CADET.
+
+        Parameters
+        ----------
+        process : Process
+            Process created by `builder.build_process()`.
+        builder : CarouselBuilder
+            Builder the process was created with.
+
+        Returns
+        -------
+        np.ndarray
+            State vector, e.g. for `process.system_state`.
+        """
+        flow_sheet = process.flow_sheet
+        n_comp = builder.component_system.n_comp
+        n_state = sum(unit_state_sizes(flow_sheet).values())
+        n_state += coupling_state_size(flow_sheet)
+        blocks, _ = split_state(flow_sheet, np.zeros(n_state))
+
+        c = self.position_profiles(self.c)
+        cp = self.position_profiles(self.c if self.cp is None else self.cp)
+        q = self.position_profiles(self.q)
+        c_inlet = self.position_profiles(self.c_inlet)[:, 0]
+
+        col_indices = _column_indices(builder, 0)
+        for position, i_col in enumerate(col_indices):
+            unit = flow_sheet[f"column_{i_col}"]
+            blocks[unit.name] = _column_state(
+                unit, c[position], cp[position], q[position], c_inlet[position]
+            )
+
+        for i_zone, zone in enumerate(builder.zones):
+            in_zone = np.flatnonzero(self.zone_indices == i_zone)
+            c_zone = {
+                f"{zone.name}_inlet": self.c_inlet[in_zone[0]],
+                f"{zone.name}_outlet": self.c[in_zone[-1]],
+            }
+            for name, c_valve in c_zone.items():
+                if name not in flow_sheet.unit_names:
+                    continue
+                unit = flow_sheet[name]
+                if not isinstance(unit, Cstr):
+                    continue
+                blocks[name] = np.concatenate(
+                    [
+                        c_valve,
+                        c_valve,
+                        np.zeros(unit.n_bound_states),
+                        [unit.init_liquid_volume],
+                    ]
+                )
+
+        coupling = np.concatenate(
+            [
+                blocks[unit.name][:n_comp]
+                for unit in flow_sheet.units
+                if not isinstance(unit, Inlet)
+            ]
+        )
+
+        return join_state(flow_sheet, blocks, coupling)
+
+
+def _column_state(
+    unit,
+    c: np.ndarray,
+    cp: np.ndarray,
+    q: np.ndarray,
+    c_inlet: np.ndarray,
+) -> np.ndarray:
+    """Return the state block of a column from profiles with shape (ncol, n_comp)."""
+    segments = _column_segments(unit)
+    n_col = segments[0][0]
+    c, cp, q = (_interpolate_cells(values, n_col, axis=0) for values in (c, cp, q))
+
+    if isinstance(unit, LumpedRateModelWithoutPores):
+        values = [np.concatenate([c, q], axis=1)]
+    else:
+        particle = np.concatenate([cp, q], axis=1)
+        if isinstance(unit, GeneralRateModel):
+            particle = np.repeat(particle[:, None, :], segments[1][1], axis=1)
+        flux = np.asarray(unit.film_diffusion, dtype=float) * (c - cp)
+        values = [c, particle, flux]
+
+    return np.concatenate([c_inlet] + [v.ravel() for v in values])
+
+
+def _column_parameters(column) -> dict:
+    """
+    Return the parameters of the TMB model of a column.
+
+    Raises
+    ------
+    CADETProcessError
+        If the column model or binding model is not supported.
+    """
+    n_comp = column.n_comp
+    binding_model = column.binding_model
+    if not isinstance(binding_model, Linear):
+        raise CADETProcessError("The TMB solver requires a Linear binding model.")
+    if any(n != 1 for n in binding_model.bound_states):
+        raise CADETProcessError(
+            "The TMB solver requires one bound state per component."
+        )
+
+    parameters = {
+        "axial_dispersion": np.broadcast_to(
+            np.asarray(column.axial_dispersion, dtype=float), (n_comp,)
+        ),
+        "adsorption_rate": np.asarray(binding_model.adsorption_rate, dtype=float),
+        "desorption_rate": np.asarray(binding_model.desorption_rate, dtype=float),
+        "is_kinetic": bool(binding_model.is_kinetic),
+    }
+
+    if isinstance(column, LumpedRateModelWithoutPores):
+        parameters.update(porosity=column.total_porosity, particle=False)
+        return parameters
+    if not isinstance(column, (LumpedRateModelWithPores, GeneralRateModel)):
+        raise CADETProcessError(
+            f"The TMB solver does not support {type(column).__name__}."
+        )
+
+    particle_porosity = column.particle_porosity
+    film_diffusion = np.asarray(column.film_diffusion, dtype=float)
+    resistance = 1 / film_diffusion
+    if isinstance(column, GeneralRateModel):
+        # Glueckauf approximation of the intraparticle diffusion resistance.
+        pore_diffusion = np.asarray(column.pore_diffusion, dtype=float)
+        resistance = resistance + column.particle_radius / (
+            5 * particle_porosity * pore_diffusion
+        )
+
+    parameters.update(
+        porosity=column.bed_porosity,
+        particle=True,
+        particle_porosity=particle_porosity,
+        transfer_rate=3 / column.particle_radius / resistance,
+    )
+
+    return parameters
+
+
+def tmb_flow_rates(
+    builder: CarouselBuilder,
+    layouts: Optional[list[ZoneLayout]] = None,
+) -> dict[str, float]:
+    """
+    Return the liquid flow rates of the TMB equivalent of every zone.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+    layouts : list[ZoneLayout], optional
+        Zone layouts of the builder. If None, they are computed.
+
+    Returns
+    -------
+    dict[str, float]
+        TMB flow rate `Q_SMB - eps * V / t_s` of every zone.
+    """
+    layouts = zone_layouts(builder) if layouts is None else layouts
+    porosity = _column_parameters(builder.column)["porosity"]
+    carried = porosity * builder.column.volume / builder.switch_time
+
+    return {layout.name: layout.flow_rate - carried for layout in layouts}
+
+
+def solve_tmb(builder: CarouselBuilder, ncol: Optional[int] = None) -> TMBResults:
+    """
+    Compute the steady state of the TMB equivalent of a carousel process.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder. Only serial zones connected in a ring with
+        forward flow are supported.
+    ncol : int, optional
+        Number of cells per column. If None, the axial discretization of the
+        column of the builder is used.
+
+    Returns
+    -------
+    TMBResults
+        Steady-state profiles and outlet concentrations.
+
+    Raises
+    ------
+    CADETProcessError
+        If the liquid does not move forward relative to the stationary phase in
+        every zone, or if the column or binding model is not supported.
+    """
+    start = time.perf_counter()
+
+    column = builder.column
+    parameters = _column_parameters(column)
+    layouts = zone_layouts(builder)
+    flow_rates = tmb_flow_rates(builder, layouts)
+    n_comp = builder.component_system.n_comp
+    if ncol is None:
+        ncol = column.discretization.ncol
+
+    for layout in layouts:
+        if layout.flow_direction != 1:
+            raise CADETProcessError(
+                "The TMB solver requires forward flow in all zones."
+            )
+        if flow_rates[layout.name] <= 0:
+            raise CADETProcessError(
+                f"Liquid does not move forward relative to the solid in {layout.name}."
+            )
+
+    area = column.cross_section_area
+    porosity = parameters["porosity"]
+    h = column.length / ncol
+    solid_velocity = column.length / builder.switch_time
+
+    # Properties of every cell along the ring.
+    n_cells_zone = [layout.n_columns * ncol for layout in layouts]
+    n_cells = sum(n_cells_zone)
+    zone_indices = np.repeat(np.arange(len(layouts)), n_cells_zone)
+    cell = np.arange(n_cells)
+    prev_cell = np.roll(cell, 1)
+    next_cell = np.roll(cell, -1)
+    offsets = np.cumsum([0, *n_cells_zone])
+    first = np.zeros(n_cells, dtype=bool)
+    first[offsets[:-1]] = True
+    last = np.zeros(n_cells, dtype=bool)
+    last[offsets[1:] - 1] = True
+
+    liquid = np.array([flow_rates[layout.name] for layout in layouts])[zone_indices]
+    liquid /= area
+    upstream = liquid.copy()
+    source = np.zeros((n_cells, n_comp))
+    for i_zone, layout in enumerate(layouts):
+        i_first = offsets[i_zone]
+        upstream[i_first] = (flow_rates[layout.name] - layout.inlet_flow_rate) / area
+        source[i_first] = layout.inlet_mass_flow(n_comp) / area
+    solid = (1 - porosity) * solid_velocity
+
+    n_vars = 3 if parameters["particle"] else 2
+    c_index = cell
+    cp_index = cell + n_cells if parameters["particle"] else cell
+    q_index = cell + (n_vars - 1) * n_cells
+    solid_porosity = parameters.get("particle_porosity", 0.0)
+
+    solutions = []
+    for i_comp in range(n_comp):
+        dispersion = porosity * parameters["axial_dispersion"][i_comp] / h
+        k_a = parameters["adsorption_rate"][i_comp]
+        k_d = parameters["desorption_rate"][i_comp]
+
+        rows, cols, values = [], [], []
+
+        def add(row, col, value):
+            row, col, value = np.broadcast_arrays(row, col, value)
+            rows.append(row.ravel())
+            cols.append(col.ravel())
+            values.append(value.astype(float).ravel())
+
+        # Total mass balance: liquid flux in - out + solid flux in - out.
+        add(c_index, prev_cell, np.where(first, upstream, liquid + dispersion))
+        add(c_index, c_index, -liquid - dispersion * (2 - first.astype(int) - last))
+        add(c_index, next_cell, np.where(last, 0, dispersion))
+
+        solid_holdup = [(q_index, 1 - solid_porosity)]
+        if parameters["particle"]:
+            solid_holdup.append((cp_index, solid_porosity))
+        for index, fraction in solid_holdup:
+            add(c_index, index - cell + next_cell, solid * fraction)
+            add(c_index, index, -solid * fraction)
+
+        # Particle balance: solid flux in - out + film transfer.
+        if parameters["particle"]:
+            transfer = h * parameters["transfer_rate"][i_comp]
+            for index, fraction in solid_holdup:
+                add(cp_index, index - cell + next_cell, solid_velocity * fraction)
+                add(cp_index, index, -solid_velocity * fraction)
+            add(cp_index, c_index, transfer)
+            add(cp_index, cp_index, -transfer)
+
+        # Binding.
+        if parameters["is_kinetic"]:
+            add(q_index, q_index - cell + next_cell, solid_velocity)
+            add(q_index, q_index, -solid_velocity - h * k_d)
+            add(q_index, cp_index, h * k_a)
+        else:
+            add(q_index, q_index, -k_d)
+            add(q_index, cp_index, k_a)
+
+        matrix = sp.csc_matrix(
+            (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_vars * n_cells, n_vars * n_cells),
+        )
+        rhs = np.zeros(n_vars * n_cells)
+        rhs[c_index] = -source[:, i_comp]
+
+        solutions.append(spsolve(matrix, rhs).reshape(n_vars, n_cells))
+
+    solution = np.stack(solutions, axis=-1)
+    c = solution[0]
+    q = solution[-1]
+    cp = solution[1] if parameters["particle"] else None
+
+    c_inlet = c[prev_cell].copy()
+    c_inlet[first] = (upstream[first, None] * c[prev_cell][first] + source[first]) / (
+        liquid[first, None]
+    )
+
+    outlets = {}
+    outlet_flow_rates = {}
+    for i_zone, layout in enumerate(layouts):
+        for outlet, flow_rate in layout.outlets.items():
+            outlets[outlet] = c[offsets[i_zone + 1] - 1].copy()
+            outlet_flow_rates[outlet] = flow_rate
+
+    return TMBResults(
+        components=list(builder.component_system.names),
+        z=(cell + 0.5) * h,
+        zone_indices=zone_indices,
+        c=c,
+        cp=cp,
+        q=q,
+        c_inlet=c_inlet,
+        flow_rates=flow_rates,
+        outlets=outlets,
+        outlet_flow_rates=outlet_flow_rates,
+        ncol=ncol,
+        time_elapsed=time.perf_counter() - start,
+    )
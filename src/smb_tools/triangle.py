@@ -0,0 +1,400 @@
+"""
+Triangle theory for carousel processes with linear isotherms.
+
+Within the equilibrium theory of the true moving bed, the operating point of every
+zone `j` is characterized by its flow rate ratio
+
+    m_j = (Q_j * t_s - V * eps_t) / (V * (1 - eps_t)),
+
+i.e. the ratio of the net liquid flow to the solid flow. For a linear isotherm, a
+component with Henry coefficient `H_i` is transported with the liquid where
+`m_j > H_i` and with the solid where `m_j < H_i`. A component is completely
+recovered at its target outlet if the transport directions around the ring only
+converge at that outlet. For the four-zone process, this yields the well-known
+triangle `H_A <= m_II <= m_III <= H_B` with `m_I >= H_B` and `m_IV <= H_A`. The same
+rule applies to any number of zones and components, e.g. the five-zone ternary
+separation.
+
+The functions in this module are vectorised over arbitrary arrays of operating
+points such that large grids can be pruned before simulating them.
+"""
+
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder
+from CADETProcess.processModel import Linear
+
+from .carousel import zone_layouts
+
+__all__ = [
+    "henry_coefficients",
+    "zone_flow_rates",
+    "flow_rate_ratios",
+    "complete_separation",
+    "feasible_points",
+    "prune_points",
+]
+
+
+def henry_coefficients(builder: CarouselBuilder) -> np.ndarray:
+    """
+    Return the Henry coefficients of the binding model of the columns.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+
+    Returns
+    -------
+    np.ndarray
+        Ratio of adsorption and desorption rate of every component.
+
+    Raises
+    ------
+    CADETProcessError
+        If the binding model is not `Linear`.
+    """
+    binding_model = builder.column.binding_model
+    if not isinstance(binding_model, Linear):
+        raise CADETProcessError("Triangle theory requires a Linear binding model.")
+
+    return np.asarray(binding_model.adsorption_rate, dtype=float) / np.asarray(
+        binding_model.desorption_rate, dtype=float
+    )
+
+
+def zone_flow_rates(
+    builder: CarouselBuilder,
+    inlet_flow_rates: Optional[dict[str, npt.ArrayLike]] = None,
+    split_fractions: Optional[dict[str, npt.ArrayLike]] = None,
+) -> np.ndarray:
+    """
+    Compute the zone flow rates for arrays of operating points.
+
+    The flow rate entering zone `j + 1` is `(1 - w_j) * Q_j + F_{j + 1}`, where
+    `w_j` is the fraction of the outlet of zone `j` leaving through its external
+    outlets and `F_{j + 1}` is the flow rate of the external inlets of zone
+    `j + 1`. Closing this recurrence around the ring yields the flow rates of all
+    zones. All arguments are broadcast against each other.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder. Its flow rates and split fractions are used
+        for all values that are not given.
+    inlet_flow_rates : dict[str, npt.ArrayLike], optional
+        Flow rates of external inlets by inlet name.
+    split_fractions : dict[str, npt.ArrayLike], optional
+        Fraction of the zone outlet leaving through the external outlets by zone
+        name.
+
+    Returns
+    -------
+    np.ndarray
+        Flow rates with shape (..., n_zones).
+    """
+    layouts = zone_layouts(builder)
+    inlet_flow_rates = inlet_flow_rates or {}
+    split_fractions = split_fractions or {}
+
+    external = []
+    fractions = []
+    for layout in layouts:
+        external.append(
+            sum(
+                np.asarray(inlet_flow_rates.get(name, flow_rate), dtype=float)
+                for name, (flow_rate, c) in layout.inlets.items()
+            )
+        )
+        default_fraction = sum(layout.outlets.values()) / layout.flow_rate
+        fractions.append(
+            np.asarray(split_fractions.get(layout.name, default_fraction), dtype=float)
+        )
+
+    # Q_j = a_j + b_j * Q_0
+    a = [np.zeros(())]
+    b = [np.ones(())]
+    for j in range(1, len(layouts)):
+        a.append((1 - fractions[j - 1]) * a[-1] + external[j])
+        b.append((1 - fractions[j - 1]) * b[-1])
+
+    q_0 = ((1 - fractions[-1]) * a[-1] + external[0]) / (
+        1 - (1 - fractions[-1]) * b[-1]
+    )
+
+    return np.stack(
+        np.broadcast_arrays(*(a_j + b_j * q_0 for a_j, b_j in zip(a, b))), axis=-1
+    )
+
+
+def flow_rate_ratios(
+    builder: CarouselBuilder,
+    switch_time: Optional[npt.ArrayLike] = None,
+    inlet_flow_rates: Optional[dict[str, npt.ArrayLike]] = None,
+    split_fractions: Optional[dict[str, npt.ArrayLike]] = None,
+) -> np.ndarray:
+    """
+    Compute the flow rate ratios of all zones for arrays of operating points.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder, providing the column geometry and all
+        operating parameters that are not given.
+    switch_time : npt.ArrayLike, optional
+        Switch times in s.
+    inlet_flow_rates : dict[str, npt.ArrayLike], optional
+        Flow rates of external inlets by inlet name.
+    split_fractions : dict[str, npt.ArrayLike], optional
+        Fraction of the zone outlet leaving through the external outlets by zone
+        name.
+
+    Returns
+    -------
+    np.ndarray
+        Flow rate ratios with shape (..., n_zones).
+
+    See Also
+    --------
+    zone_flow_rates
+    """
+    column = builder.column
+    porosity = column.total_porosity
+    volume = column.volume
+    if switch_time is None:
+        switch_time = builder.switch_time
+    switch_time = np.asarray(switch_time, dtype=float)[..., None]
+
+    flow_rates = zone_flow_rates(builder, inlet_flow_rates, split_fractions)
+
+    return (flow_rates * switch_time - volume * porosity) / (volume * (1 - porosity))
+
+
+def complete_separation(
+    builder: CarouselBuilder,
+    targets: dict[str, str],
+    m: npt.ArrayLike,
+    margin: float = 0.0,
+) -> np.ndarray:
+    """
+    Check which operating points achieve complete separation.
+
+    Going around the ring in the direction of the liquid, the transport direction
+    of every target component must switch from the liquid to the solid exactly once,
+    namely at its target outlet. Components without a target outlet are not
+    checked.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    m : npt.ArrayLike
+        Flow rate ratios with shape (..., n_zones).
+    margin : float, optional
+        Relative tolerance on the Henry coefficients. Zones with
+        `|m_j - H_i| <= margin * H_i` may transport the component in either
+        direction, which enlarges the feasible region. The default is 0.
+
+    Returns
+    -------
+    np.ndarray
+        True for every operating point with complete separation.
+
+    Raises
+    ------
+    CADETProcessError
+        If a product outlet does not belong to a zone.
+    """
+    m = np.asarray(m, dtype=float)
+    layouts = zone_layouts(builder)
+    n_zones = len(layouts)
+    if m.shape[-1] != n_zones:
+        raise CADETProcessError(f"Expected flow rate ratios of {n_zones} zones.")
+
+    henry = henry_coefficients(builder)
+    components = list(builder.component_system.names)
+
+    feasible = np.ones(m.shape[:-1], dtype=bool)
+    for outlet, target in targets.items():
+        zone = [i for i, layout in enumerate(layouts) if outlet in layout.outlets]
+        if len(zone) != 1:
+            raise CADETProcessError(f"Outlet {outlet} does not belong to a zone.")
+
+        # Start with the zone downstream of the target outlet.
+        h = henry[components.index(target)]
+        ordered = np.roll(m, -(zone[0] + 1), axis=-1)
+        solid = ordered <= h * (1 + margin)
+        liquid = ordered >= h * (1 - margin)
+
+        # Solid transport in the first k zones and liquid transport in the rest.
+        solid_prefix = np.cumprod(solid, axis=-1, dtype=bool)[..., :-1]
+        liquid_suffix = np.cumprod(liquid[..., ::-1], axis=-1, dtype=bool)[..., ::-1]
+        feasible &= np.any(solid_prefix & liquid_suffix[..., 1:], axis=-1)
+
+    return feasible
+
+
+_IGNORED_ARGUMENTS = {"ncol", "npar", "write_solution_bulk", "eliminate_valves"}
+"""set: Factory arguments that do not change the flow rate ratios."""
+
+
+def _check_arguments(
+    builder: CarouselBuilder,
+    names: list[str],
+    split_parameters: dict[str, str],
+) -> None:
+    """Raise if an argument is neither an operating parameter nor ignored."""
+    inlets = {name for layout in zone_layouts(builder) for name in layout.inlets}
+    known = {
+        "switch_time",
+        *(f"{name}_flow_rate" for name in inlets),
+        *split_parameters,
+        *_IGNORED_ARGUMENTS,
+    }
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise CADETProcessError(
+            f"Unknown operating parameters {unknown}. Split fractions must be listed "
+            "in `split_parameters`."
+        )
+
+
+def _operating_arrays(
+    builder: CarouselBuilder,
+    points: dict[str, npt.ArrayLike],
+    split_parameters: dict[str, str],
+) -> tuple[Optional[np.ndarray], dict, dict]:
+    """Split factory arguments into switch times, inlet flow rates and splits."""
+    inlets = {name for layout in zone_layouts(builder) for name in layout.inlets}
+    inlet_flow_rates = {
+        name: points[f"{name}_flow_rate"]
+        for name in inlets
+        if f"{name}_flow_rate" in points
+    }
+    split_fractions = {
+        zone: points[name] for name, zone in split_parameters.items() if name in points
+    }
+
+    return points.get("switch_time"), inlet_flow_rates, split_fractions
+
+
+def feasible_points(
+    builder: CarouselBuilder,
+    targets: dict[str, str],
+    points: dict[str, npt.ArrayLike],
+    split_parameters: dict[str, str],
+    margin: float = 0.0,
+    chunk_size: int = 1_000_000,
+) -> np.ndarray:
+    """
+    Check arrays of factory arguments for complete separation.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Builder of the case study with the default operating point.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    points : dict[str, npt.ArrayLike]
+        Values of the factory arguments, e.g. `switch_time`, `eluent_flow_rate`,
+        `feed_flow_rate` and the split fractions. Inlet flow rates are matched by
+        the name `<inlet>_flow_rate`. The arrays are broadcast against each other.
+        Discretization arguments such as `ncol` are ignored.
+    split_parameters : dict[str, str]
+        Zone split by every split fraction argument, see `SPLIT_FRACTIONS`.
+    margin : float, optional
+        Relative tolerance on the Henry coefficients. The default is 0.
+    chunk_size : int, optional
+        Number of points evaluated at once to limit the memory usage.
+        The default is 1e6.
+
+    Returns
+    -------
+    np.ndarray
+        True for every point with complete separation, with the broadcast shape of
+        the arguments.
+
+    Raises
+    ------
+    CADETProcessError
+        If an argument is not recognised.
+    """
+    _check_arguments(builder, list(points), split_parameters)
+    arrays = np.broadcast_arrays(
+        *(np.asarray(values, dtype=float) for values in points.values())
+    )
+    shape = arrays[0].shape if arrays else ()
+    flat = {name: values.ravel() for name, values in zip(points, arrays)}
+
+    n_points = int(np.prod(shape))
+    feasible = np.empty(n_points, dtype=bool)
+    for start in range(0, n_points, chunk_size):
+        chunk = {
+            name: values[start : start + chunk_size] for name, values in flat.items()
+        }
+        m = flow_rate_ratios(
+            builder, *_operating_arrays(builder, chunk, split_parameters)
+        )
+        feasible[start : start + chunk_size] = complete_separation(
+            builder, targets, m, margin
+        )
+
+    return feasible.reshape(shape)
+
+
+def prune_points(
+    builder: CarouselBuilder,
+    targets: dict[str, str],
+    points: list[dict[str, float]],
+    split_parameters: dict[str, str],
+    margin: float = 0.0,
+) -> list[dict[str, float]]:
+    """
+    Remove operating points outside of the complete separation region.
+
+    Since dispersion and mass transfer resistances shrink the region of complete
+    separation, the points removed with `margin=0` cannot achieve complete
+    separation in the full model either. A positive margin additionally keeps
+    points close to the boundary, which may still reach high purities.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Builder of the case study with the default operating point.
+    targets : dict[str, str]
+        Name of the target component of every product outlet.
+    points : list[dict[str, float]]
+        Keyword arguments of the factory, e.g. from `parameter_grid`.
+    split_parameters : dict[str, str]
+        Zone split by every split fraction argument, see `SPLIT_FRACTIONS`.
+    margin : float, optional
+        Relative tolerance on the Henry coefficients. The default is 0.
+
+    Returns
+    -------
+    list[dict[str, float]]
+        Points with complete separation, in their original order.
+
+    Raises
+    ------
+    CADETProcessError
+        If an argument is not recognised.
+    """
+    if len(points) == 0:
+        return []
+
+    names = list(points[0])
+    _check_arguments(builder, names, split_parameters)
+    names = [name for name in names if name not in _IGNORED_ARGUMENTS]
+
+    arrays = {name: np.array([point[name] for point in points]) for name in names}
+    feasible = feasible_points(builder, targets, arrays, split_parameters, margin)
+    feasible = np.broadcast_to(feasible, (len(points),))
+
+    return [point for point, keep in zip(points, feasible) if keep]
@@ -0,0 +1,202 @@
+"""
+Carousel processes without valve units.
+
+The `CarouselBuilder` connects the columns of every zone through two mixer/splitter
+units, each with a dead volume of `valve_dead_volume`. With the default of 1e-9
+m^3, their residence time is in the order of milliseconds, many orders of magnitude
+below the switch time. These states are very stiff and limit the step size of the
+time integrator, although they hardly affect the outlet profiles.
+
+Here, the same carousel is built with the columns connected directly to each other
+and to the external units. The mixing of streams at a column inlet and the
+splitting of a column outlet are then purely algebraic, which is the limit of a
+vanishing valve volume.
+"""
+
+from typing import Optional
+
+import numpy as np
+from CADETProcess import CADETProcessError
+from CADETProcess.modelBuilder import CarouselBuilder, SerialZone
+from CADETProcess.modelBuilder.carouselBuilder import _copy_column
+from CADETProcess.processModel import FlowSheet, Process
+
+from .carousel import zone_layouts
+
+__all__ = ["valve_residence_times", "build_process_without_valves"]
+
+
+def valve_residence_times(builder: CarouselBuilder) -> dict[str, float]:
+    """
+    Return the residence time of the liquid in every valve unit.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder.
+
+    Returns
+    -------
+    dict[str, float]
+        Dead volume over zone flow rate in s for every valve.
+    """
+    residence_times = {}
+    for zone, layout in zip(builder.zones, zone_layouts(builder)):
+        for valve in (zone.inlet_unit, zone.outlet_unit):
+            volume = getattr(valve, "init_liquid_volume", None)
+            if volume is None:
+                volume = valve.volume
+            residence_times[valve.name] = volume / layout.flow_rate
+
+    return residence_times
+
+
+def build_process_without_valves(
+    builder: CarouselBuilder,
+    max_residence_fraction: Optional[float] = 1e-3,
+) -> Process:
+    """
+    Build the carousel process with the valve volumes eliminated.
+
+    The columns keep their names and their order in the ring, such that results
+    can be evaluated with the same tools as the process of `builder.build_process`.
+    External inlets are connected to all columns and all columns are connected to
+    the external outlets; the output states of the inlets and columns are switched
+    with the carousel state.
+
+    Parameters
+    ----------
+    builder : CarouselBuilder
+        Configured carousel builder. Only serial zones connected in a ring are
+        supported.
+    max_residence_fraction : float, optional
+        Maximum residence time of a valve relative to the switch time up to which
+        its volume is considered negligible. If None, volumes are always
+        eliminated. The default is 1e-3.
+
+    Returns
+    -------
+    Process
+        Carousel process without valve units.
+
+    Raises
+    ------
+    CADETProcessError
+        If a valve volume is not negligible.
+    """
+    layouts = zone_layouts(builder)
+    if max_residence_fraction is not None:
+        for valve, residence_time in valve_residence_times(builder).items():
+            if residence_time > max_residence_fraction * builder.switch_time:
+                raise CADETProcessError(
+                    f"Dead volume of {valve} is not negligible "
+                    f"(residence time {residence_time:.3g} s)."
+                )
+
+    source_flow_sheet = builder.flow_sheet
+    zones = builder.zones
+    n_columns = builder.n_columns
+    flow_sheet = FlowSheet(builder.component_system, builder.name)
+
+    external_units = [
+        unit for unit in source_flow_sheet.units if unit not in builder.zones
+    ]
+    for unit in external_units:
+        flow_sheet.add_unit(
+            unit,
+            feed_inlet=unit in source_flow_sheet.feed_inlets,
+            eluent_inlet=unit in source_flow_sheet.eluent_inlets,
+            product_outlet=unit in source_flow_sheet.product_outlets,
+        )
+
+    columns = []
+    for i_col in range(n_columns):
+        column = _copy_column(builder.column, False)
+        column.name = f"column_{i_col}"
+        flow_sheet.add_unit(column)
+        columns.append(column)
+
+    # Columns feed the next column in the ring and all outlets of the zones.
+    zone_outlets = [
+        destination
+        for zone in zones
+        for destination in source_flow_sheet.connections[zone].destinations[None]
+        if destination not in zones
+    ]
+    for i_col, column in enumerate(columns):
+        flow_sheet.add_connection(column, columns[(i_col + 1) % n_columns])
+        for outlet in zone_outlets:
+            flow_sheet.add_connection(column, outlet)
+
+    # External units feed all columns or other external units.
+    for unit in external_units:
+        if not source_flow_sheet.connections[unit].destinations:
+            continue
+        for destination in source_flow_sheet.connections[unit].destinations[None]:
+            if destination in zones:
+                for column in columns:
+                    if column not in flow_sheet.connections[unit].destinations[None]:
+                        flow_sheet.add_connection(unit, column)
+            else:
+                flow_sheet.add_connection(unit, destination)
+
+    process = Process(flow_sheet, builder.name)
+    process.cycle_time = builder.cycle_time
+    process.add_duration("switch_time", builder.switch_time)
+
+    first_positions = [int(layout.positions[0]) for layout in layouts]
+    for carousel_state in range(n_columns):
+        # Column at the first position of every zone
+        first_columns = builder.column_indices_at_state(first_positions, carousel_state)
+        output_states = {}
+
+        for unit in external_units:
+            if not source_flow_sheet.connections[unit].destinations:
+                continue
+            fractions = source_flow_sheet.output_states[unit]
+            targets = list(source_flow_sheet.connections[unit].destinations[None])
+            destinations = list(flow_sheet.connections[unit].destinations[None])
+            state = np.zeros(len(destinations))
+            for fraction, target in zip(fractions, targets):
+                if target in zones:
+                    target = columns[first_columns[zones.index(target)]]
+                state[destinations.index(target)] += fraction
+            output_states[unit.name] = state.tolist()
+
+        for i_zone, (zone, layout) in enumerate(zip(zones, layouts)):
+            if not isinstance(zone, SerialZone):
+                raise CADETProcessError("Only serial zones are supported.")
+            col_indices = builder.column_indices_at_state(
+                layout.positions, carousel_state
+            )
+            fractions = source_flow_sheet.output_states[zone]
+            targets = list(source_flow_sheet.connections[zone].destinations[None])
+            for i, i_col in enumerate(col_indices):
+                destinations = list(
+                    flow_sheet.connections[columns[i_col]].destinations[None]
+                )
+                state = np.zeros(len(destinations))
+                if i < len(col_indices) - 1:
+                    state[0] = 1
+                else:
+                    for fraction, target in zip(fractions, targets):
+                        index = 0 if target in zones else destinations.index(target)
+                        state[index] += fraction
+                output_states[f"column_{i_col}"] = state.tolist()
+
+                evt = process.add_event(
+                    f"column_{i_col}_{carousel_state}_velocity",
+                    f"flow_sheet.column_{i_col}.flow_direction",
+                    zone.flow_direction,
+                )
+                process.add_event_dependency(evt.name, "switch_time", [carousel_state])
+
+        for name, state in output_states.items():
+            evt = process.add_event(
+                f"{name}_{carousel_state}",
+                f"flow_sheet.output_states.{name}",
+                state,
+            )
+            process.add_event_dependency(evt.name, "switch_time", [carousel_state])
+
+    return process